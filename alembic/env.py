@@ -20,6 +20,7 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 from src.database.connection import Base
 from src.models.order import OrderDB, StartLocationDB, RouteDataDB, CallStatusDB, UserSettingsDB  # noqa: F401
+from src.models.geocache import GeocodeCacheDB, DistanceCacheDB  # noqa: F401
 
 target_metadata = Base.metadata
 
@@ -0,0 +1,45 @@
+"""Add distance_cache table
+
+Revision ID: 001
+Revises: 000
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# revision identifiers, used by Alembic.
+revision = '001'
+down_revision = '000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    logger.info("📋 Проверка таблицы 'distance_cache'...")
+    if not inspector.has_table('distance_cache'):
+        logger.info("📝 Создание таблицы 'distance_cache'...")
+        op.create_table(
+        'distance_cache',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('coord_a', sa.String(), nullable=False),
+        sa.Column('coord_b', sa.String(), nullable=False),
+        sa.Column('distance_km', sa.Float(), nullable=False),
+        sa.Column('time_minutes', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id', 'coord_a', 'coord_b')
+    )
+        logger.info("✅ Таблица 'distance_cache' создана")
+    else:
+        logger.info("⏭️ Таблица 'distance_cache' уже существует, пропускаем создание")
+
+
+def downgrade():
+    op.drop_table('distance_cache')
@@ -0,0 +1,44 @@
+"""Add composite indexes for call scheduler and order lookups
+
+Revision ID: 003
+Revises: 001
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+# '002' не используем: так называлась старая удаленная миграция (см. migrate.py)
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+_INDEXES = [
+    ('idx_status_date_call_time', 'call_status', ['status', 'call_date', 'call_time']),
+    ('idx_status_date_next_attempt', 'call_status', ['status', 'call_date', 'next_attempt_time']),
+    ('idx_order_user_date_number', 'orders', ['user_id', 'order_date', 'order_number']),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for name, table, columns in _INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name in existing:
+            logger.info(f"⏭️ Индекс '{name}' уже существует, пропускаем создание")
+            continue
+        logger.info(f"📝 Создание индекса '{name}' на {table}({', '.join(columns)})...")
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(_INDEXES):
+        op.drop_index(name, table_name=table)
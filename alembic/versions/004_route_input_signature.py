@@ -0,0 +1,35 @@
+"""Add input_signature to route_data
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    columns = {column['name'] for column in inspector.get_columns('route_data')}
+    if 'input_signature' in columns:
+        logger.info("⏭️ Колонка 'route_data.input_signature' уже существует, пропускаем")
+        return
+    logger.info("📝 Добавление колонки 'route_data.input_signature'...")
+    op.add_column('route_data', sa.Column('input_signature', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('route_data', 'input_signature')
@@ -0,0 +1,56 @@
+"""Renormalize geocode_cache addresses with ё to е
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # MapsService.normalize_address заменяет ё на е; строки, сохраненные со старым ключом,
+    # иначе не находятся в кэше и геокодируются заново
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.text("SELECT id, address FROM geocode_cache WHERE address LIKE :pattern"),
+        {"pattern": "%ё%"}
+    ).fetchall()
+    if not rows:
+        logger.info("⏭️ В 'geocode_cache' нет адресов с ё, пропускаем")
+        return
+
+    renamed = removed = 0
+    for row_id, address in rows:
+        new_address = address.replace("ё", "е")
+        duplicate = bind.execute(
+            sa.text("SELECT id FROM geocode_cache WHERE address = :address LIMIT 1"),
+            {"address": new_address}
+        ).first()
+        if duplicate:
+            # Адрес уже есть под новым ключом - старая запись лишняя
+            bind.execute(sa.text("DELETE FROM geocode_cache WHERE id = :id"), {"id": row_id})
+            removed += 1
+        else:
+            bind.execute(
+                sa.text("UPDATE geocode_cache SET address = :address WHERE id = :id"),
+                {"address": new_address, "id": row_id}
+            )
+            renamed += 1
+    logger.info(f"✅ geocode_cache: обновлено ключей {renamed}, удалено дубликатов {removed}")
+
+
+def downgrade():
+    # Исходное написание адресов не восстановить - ключи с е остаются валидными
+    pass
@@ -3,6 +3,8 @@
 """
 import telebot
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from src.services.maps_service import MapsService
 from src.services.route_optimizer import RouteOptimizer
 from src.services.traffic_monitor import TrafficMonitor
@@ -14,6 +16,66 @@ from src.services.credentials_service import CredentialsService
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=2)
+def _main_menu_markup_json(has_route: bool) -> str:
+    """JSON клавиатуры главного меню (всего два варианта - с маршрутом и без)"""
+    from telebot import types
+    
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    
+    # Добавляем кнопку "Текущий заказ" только если маршрут оптимизирован (вверху)
+    if has_route:
+        markup.row("📋 Текущий заказ")
+    
+    markup.row("📦 Заказы", "🗺️ Маршрут")
+    markup.row("⚙️ Настройки")
+    return markup.to_json()
+
+
+@lru_cache(maxsize=2)
+def _orders_menu_markup_json(has_import: bool) -> str:
+    """JSON клавиатуры меню заказов (с кнопкой импорта из ШефМаркет и без)"""
+    from telebot import types
+    
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row("➕ Добавить заказы")
+    markup.row("📸 Загрузить из скриншота")
+    
+    # Кнопка импорта из ШефМаркет - только если есть учетные данные
+    if has_import:
+        markup.row("📲 Импорт из ШефМаркет")
+    
+    markup.row("✏️ Редактирование заказов")
+    markup.row("✅ Доставленные")
+    markup.row("⬅️ Главное меню")
+    return markup.to_json()
+
+
+@lru_cache(maxsize=1)
+def _route_menu_markup_json() -> str:
+    """JSON клавиатуры меню маршрута (статичная)"""
+    from telebot import types
+    
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row("📋 Показать маршрут")
+    markup.row("📍 Точка старта", "▶️ Оптимизировать")
+    markup.row("📞 Звонки")
+    markup.row("🚦 Мониторинг", "🛑 Стоп мониторинг")
+    markup.row("⬅️ Главное меню")
+    return markup.to_json()
+
+
+@lru_cache(maxsize=1)
+def _add_orders_menu_markup_json() -> str:
+    """JSON клавиатуры меню добавления заказов (статичная)"""
+    from telebot import types
+    
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row("✅ Готово")
+    markup.row("⬅️ Главное меню")
+    return markup.to_json()
+
+
 class CourierBot:
     """Главный класс бота курьера"""
     
@@ -23,14 +85,22 @@ class CourierBot:
         
         # Инициализация сервисов
         self.maps_service = MapsService()
+        self.maps_service.preload_geocode_cache()
         self.traffic_monitor = TrafficMonitor(self.maps_service)
         self.db_service = DatabaseService()
         self.call_notifier = CallNotifier(bot, self)
         self.settings_service = UserSettingsService()
         self.credentials_service = CredentialsService()
+        # Пул для долгих операций (оптимизация маршрута), чтобы не блокировать поток polling
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="courier-worker")
         
         # Состояния пользователей
         self.user_states = {}  # user_id -> state data
+        # Кэш наличия маршрута для главного меню: user_id -> (date, has_route)
+        self._route_flags = {}
+        # Кнопки меню с точным текстом: text -> handler (один диспетчер вместо лямбды на кнопку)
+        self._text_handlers = {}
+        self._menu_texts = frozenset()
         
         # Инициализация хендлеров (импортируем только при инициализации чтобы избежать циклических импортов)
         from .base_handlers import BaseHandlers
@@ -62,6 +132,13 @@ class CourierBot:
     
     def register_handlers(self):
         """Регистрация всех обработчиков сообщений"""
+        # Диспетчер кнопок меню регистрируется первым: сообщение-кнопка проверяется
+        # одним поиском во frozenset, не проходя через предикаты остальных хендлеров
+        self.bot.register_message_handler(
+            self._dispatch_text,
+            func=lambda m: m.text in self._menu_texts
+        )
+        
         # Регистрируем хендлеры из всех модулей
         self.base.register()
         self.orders.register()
@@ -71,6 +148,9 @@ class CourierBot:
         self.imports.register()
         self.traffic.register()
         
+        # Набор текстов кнопок фиксируется после регистрации всех модулей
+        self._menu_texts = frozenset(self._text_handlers)
+        
         # Регистрируем главный обработчик сообщений (для обработки состояний)
         self.bot.register_message_handler(
             self._handle_message_with_state,
@@ -80,6 +160,14 @@ class CourierBot:
         
         logger.info("✅ Все обработчики зарегистрированы")
     
+    def register_text_handler(self, text: str, handler):
+        """Зарегистрировать обработчик кнопки меню по точному тексту"""
+        self._text_handlers[text] = handler
+    
+    def _dispatch_text(self, message):
+        """Вызвать обработчик кнопки меню по тексту сообщения"""
+        self._text_handlers[message.text](message)
+    
     def _handle_message_with_state(self, message):
         """
         Главный обработчик сообщений для обработки состояний пользователя.
@@ -171,81 +259,65 @@ class CourierBot:
     
     def update_user_state(self, user_id: int, key: str, value):
         """Обновить состояние пользователя"""
-        if user_id not in self.user_states:
-            self.user_states[user_id] = {}
-        self.user_states[user_id][key] = value
+        self.user_states.setdefault(user_id, {})[key] = value
+    
+    def update_user_state_many(self, user_id: int, mapping: dict):
+        """Обновить несколько ключей состояния пользователя за одну запись"""
+        self.user_states.setdefault(user_id, {}).update(mapping)
     
     def clear_user_state(self, user_id: int):
         """Очистить состояние пользователя"""
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        self.user_states.pop(user_id, None)
     
     # === Общие вспомогательные методы ===
     
     def _main_menu_markup(self, user_id: int = None):
-        """Разметка главного меню
+        """Разметка главного меню (готовый JSON, telebot принимает reply_markup строкой)
         
         Args:
             user_id: ID пользователя для проверки наличия оптимизированного маршрута.
                      Если передан и маршрут оптимизирован, добавляется кнопка "📋 Текущий заказ"
         """
-        from telebot import types
+        has_route = user_id is not None and self._has_route_today(user_id)
+        return _main_menu_markup_json(has_route)
+    
+    def _has_route_today(self, user_id: int) -> bool:
+        """Есть ли у пользователя оптимизированный маршрут на сегодня (с кэшем на день)"""
         from datetime import date
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        
-        # Добавляем кнопку "Текущий заказ" только если маршрут оптимизирован (вверху)
-        if user_id is not None:
-            today = date.today()
-            route_data = self.db_service.get_route_data(user_id, today)
-            if route_data and route_data.get('route_points_data'):
-                markup.row("📋 Текущий заказ")
+        today = date.today()
+        cached = self._route_flags.get(user_id)
+        if cached is not None and cached[0] == today:
+            return cached[1]
         
-        markup.row("📦 Заказы", "🗺️ Маршрут")
-        markup.row("⚙️ Настройки")
-        return markup
+        route_data = self.db_service.get_route_data(user_id, today)
+        has_route = bool(route_data and route_data.get('route_points_data'))
+        self._route_flags[user_id] = (today, has_route)
+        return has_route
+    
+    def invalidate_route_cache(self, user_id: int):
+        """Сбросить кэш наличия маршрута (после сохранения/удаления маршрута)"""
+        self._route_flags.pop(user_id, None)
     
     def _orders_menu_markup(self, user_id: int = None):
-        """Разметка меню заказов
+        """Разметка меню заказов (готовый JSON)
         
         Args:
             user_id: ID пользователя для проверки наличия учетных данных ШефМаркет.
                      Если передан и учетные данные есть, добавляется кнопка "📲 Импорт из ШефМаркет"
         """
-        from telebot import types
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("➕ Добавить заказы")
-        markup.row("📸 Загрузить из скриншота")
-        
-        # Добавляем кнопку импорта из ШефМаркет, если есть учетные данные
-        if user_id is not None and self.credentials_service.has_credentials(user_id, "chefmarket"):
-            markup.row("📲 Импорт из ШефМаркет")
-        
-        markup.row("✏️ Редактирование заказов")
-        markup.row("✅ Доставленные")
-        markup.row("⬅️ Главное меню")
-        return markup
+        has_import = user_id is not None and self.credentials_service.has_credentials(user_id, "chefmarket")
+        return _orders_menu_markup_json(has_import)
     
     @staticmethod
     def _route_menu_markup():
-        """Разметка меню маршрута"""
-        from telebot import types
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("📋 Показать маршрут")
-        markup.row("📍 Точка старта", "▶️ Оптимизировать")
-        markup.row("📞 Звонки")
-        markup.row("🚦 Мониторинг", "🛑 Стоп мониторинг")
-        markup.row("⬅️ Главное меню")
-        return markup
+        """Разметка меню маршрута (готовый JSON)"""
+        return _route_menu_markup_json()
     
     @staticmethod
     def _add_orders_menu_markup():
-        """Разметка меню добавления заказов"""
-        from telebot import types
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("✅ Готово")
-        markup.row("⬅️ Главное меню")
-        return markup
+        """Разметка меню добавления заказов (готовый JSON)"""
+        return _add_orders_menu_markup_json()
 
 
 # Экспортируем главный класс
@@ -21,22 +21,10 @@ class BaseHandlers:
         self.bot.register_message_handler(self.handle_help, commands=['help'])
         
         # Главное меню
-        self.bot.register_message_handler(
-            self.handle_orders_menu,
-            func=lambda m: m.text == "📦 Заказы"
-        )
-        self.bot.register_message_handler(
-            self.handle_route_menu,
-            func=lambda m: m.text == "🗺️ Маршрут"
-        )
-        self.bot.register_message_handler(
-            self.handle_settings_menu,
-            func=lambda m: m.text == "⚙️ Настройки"
-        )
-        self.bot.register_message_handler(
-            self.handle_back_to_main,
-            func=lambda m: m.text == "⬅️ Главное меню"
-        )
+        self.parent.register_text_handler("📦 Заказы", self.handle_orders_menu)
+        self.parent.register_text_handler("🗺️ Маршрут", self.handle_route_menu)
+        self.parent.register_text_handler("⚙️ Настройки", self.handle_settings_menu)
+        self.parent.register_text_handler("⬅️ Главное меню", self.handle_back_to_main)
         
         # Callback queries (роутинг)
         self.bot.register_callback_query_handler(
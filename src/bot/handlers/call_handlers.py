@@ -7,10 +7,31 @@ from sqlalchemy import and_
 from telebot import types
 from src.database.connection import get_db_session
 from src.models.order import CallStatusDB
-from src.services.call_notifier import get_local_now
+from src.services.call_notifier import get_local_now, GROUP_NOTIFICATION_TITLE
 
 logger = logging.getLogger(__name__)
 
+# Уведомление о звонке после ответа курьера (результат подставляется в конце)
+_CALL_RESULT_TEMPLATE = (
+    "📞 <b>Время звонка!</b>\n\n"
+    "👤 {name}\n"
+    "📦 {order}\n"
+    "📱 {phone}\n"
+    "🕐 Время: {time}\n\n"
+    "{result}"
+)
+
+
+def _format_call_result(call_status: CallStatusDB, result: str) -> str:
+    """Текст уведомления о звонке с итогом ответа"""
+    return _CALL_RESULT_TEMPLATE.format(
+        name=call_status.customer_name or "Клиент",
+        order=f"Заказ №{call_status.order_number}" if call_status.order_number else "Заказ",
+        phone=call_status.phone,
+        time=call_status.call_time.strftime('%H:%M'),
+        result=result
+    )
+
 
 class CallHandlers:
     """Обработчики звонков"""
@@ -35,6 +56,35 @@ class CallHandlers:
             call_status_id = int(callback_data.replace("call_reject_", ""))
             self.handle_call_reject(call, call_status_id)
     
+    def _update_notification_message(self, call, call_status_id: int, updated_text: str):
+        """Отразить ответ по звонку в сообщении-уведомлении
+        
+        В сводном уведомлении (несколько звонков) убираем только строку кнопок
+        этого звонка, чтобы не потерять остальные; одиночное заменяем текстом.
+        """
+        try:
+            if GROUP_NOTIFICATION_TITLE in (call.message.text or ""):
+                rows = call.message.reply_markup.keyboard if call.message.reply_markup else []
+                callback_suffix = f"_{call_status_id}"
+                markup = types.InlineKeyboardMarkup()
+                for row in rows:
+                    if not any(button.callback_data.endswith(callback_suffix) for button in row):
+                        markup.row(*row)
+                self.bot.edit_message_reply_markup(
+                    call.message.chat.id,
+                    call.message.message_id,
+                    reply_markup=markup
+                )
+            else:
+                self.bot.edit_message_text(
+                    updated_text,
+                    call.message.chat.id,
+                    call.message.message_id,
+                    parse_mode='HTML'
+                )
+        except Exception as edit_error:
+            logger.warning(f"Ошибка обновления сообщения: {edit_error}")
+    
     def handle_call_confirm(self, call, call_status_id: int):
         """Обработка подтверждения звонка"""
         user_id = call.from_user.id
@@ -57,27 +107,12 @@ class CallHandlers:
                 session.commit()
                 
                 # Обновляем сообщение, убирая кнопки
-                customer_info = call_status.customer_name or "Клиент"
-                order_info = f"Заказ №{call_status.order_number}" if call_status.order_number else "Заказ"
-                
-                updated_text = (
-                    f"📞 <b>Время звонка!</b>\n\n"
-                    f"👤 {customer_info}\n"
-                    f"📦 {order_info}\n"
-                    f"📱 {call_status.phone}\n"
-                    f"🕐 Время: {call_status.call_time.strftime('%H:%M')}\n\n"
-                    f"✅ <b>Подтверждено</b>"
+                updated_text = _format_call_result(
+                    call_status,
+                    "✅ <b>Подтверждено</b>"
                 )
                 
-                try:
-                    self.bot.edit_message_text(
-                        updated_text,
-                        call.message.chat.id,
-                        call.message.message_id,
-                        parse_mode='HTML'
-                    )
-                except Exception as edit_error:
-                    logger.warning(f"Ошибка обновления сообщения: {edit_error}")
+                self._update_notification_message(call, call_status_id, updated_text)
                 
                 # Запрашиваем комментарий
                 self.bot.answer_callback_query(call.id, "✅ Звонок подтвержден")
@@ -118,9 +153,6 @@ class CallHandlers:
                 # Получаем настройки пользователя
                 user_settings = self.parent.settings_service.get_settings(user_id)
                 
-                customer_info = call_status.customer_name or "Клиент"
-                order_info = f"Заказ №{call_status.order_number}" if call_status.order_number else "Заказ"
-                
                 # Проверяем количество попыток
                 if call_status.attempts >= user_settings.call_max_attempts:
                     # Превышено максимальное количество попыток
@@ -128,24 +160,12 @@ class CallHandlers:
                     call_status.next_attempt_time = None
                     session.commit()
                     
-                    updated_text = (
-                        f"📞 <b>Время звонка!</b>\n\n"
-                        f"👤 {customer_info}\n"
-                        f"📦 {order_info}\n"
-                        f"📱 {call_status.phone}\n"
-                        f"🕐 Время: {call_status.call_time.strftime('%H:%M')}\n\n"
+                    updated_text = _format_call_result(
+                        call_status,
                         f"❌ <b>Недозвон</b>\nПревышено количество попыток ({user_settings.call_max_attempts})"
                     )
                     
-                    try:
-                        self.bot.edit_message_text(
-                            updated_text,
-                            call.message.chat.id,
-                            call.message.message_id,
-                            parse_mode='HTML'
-                        )
-                    except Exception as edit_error:
-                        logger.warning(f"Ошибка обновления сообщения: {edit_error}")
+                    self._update_notification_message(call, call_status_id, updated_text)
                     
                     self.bot.answer_callback_query(call.id, f"❌ Превышено количество попыток ({user_settings.call_max_attempts})")
                     self.bot.send_message(
@@ -163,24 +183,12 @@ class CallHandlers:
                     call_status.next_attempt_time = now + timedelta(minutes=user_settings.call_retry_interval_minutes)
                     session.commit()
                     
-                    updated_text = (
-                        f"📞 <b>Время звонка!</b>\n\n"
-                        f"👤 {customer_info}\n"
-                        f"📦 {order_info}\n"
-                        f"📱 {call_status.phone}\n"
-                        f"🕐 Время: {call_status.call_time.strftime('%H:%M')}\n\n"
+                    updated_text = _format_call_result(
+                        call_status,
                         f"❌ <b>Отклонено</b>\nПовтор через {user_settings.call_retry_interval_minutes} мин (попытка {call_status.attempts}/{user_settings.call_max_attempts})"
                     )
                     
-                    try:
-                        self.bot.edit_message_text(
-                            updated_text,
-                            call.message.chat.id,
-                            call.message.message_id,
-                            parse_mode='HTML'
-                        )
-                    except Exception as edit_error:
-                        logger.warning(f"Ошибка обновления сообщения: {edit_error}")
+                    self._update_notification_message(call, call_status_id, updated_text)
                     
                     self.bot.answer_callback_query(call.id, f"❌ Отклонено. Повтор через {user_settings.call_retry_interval_minutes} мин (попытка {call_status.attempts}/{user_settings.call_max_attempts})")
                     self.bot.send_message(
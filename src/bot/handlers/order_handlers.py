@@ -10,6 +10,7 @@
 """
 import logging
 import re
+import threading
 from typing import Dict, List
 from datetime import datetime, time, timedelta, date
 from telebot import types
@@ -27,14 +28,27 @@ class OrderHandlers:
         self.bot = bot_instance.bot
         self.parent = bot_instance
         
-        # Инициализируем парсер изображений один раз
-        try:
-            from src.services.image_parser import ImageOrderParser
-            self.image_parser = ImageOrderParser()
-            logger.info("✅ Парсер изображений инициализирован")
-        except Exception as e:
-            logger.warning(f"⚠️ Не удалось инициализировать парсер изображений: {e}")
-            self.image_parser = None
+        # Парсер изображений (и проверка Tesseract) создается при первом скриншоте,
+        # чтобы не задерживать запуск бота
+        self.image_parser = None
+        self._image_parser_checked = False
+        self._image_parser_lock = threading.Lock()
+    
+    def _get_image_parser(self):
+        """Получить парсер изображений, инициализировав его при первом вызове"""
+        if self._image_parser_checked:
+            return self.image_parser
+        with self._image_parser_lock:
+            if not self._image_parser_checked:
+                try:
+                    from src.services.image_parser import ImageOrderParser
+                    self.image_parser = ImageOrderParser()
+                    logger.info("✅ Парсер изображений инициализирован")
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось инициализировать парсер изображений: {e}")
+                    self.image_parser = None
+                self._image_parser_checked = True
+        return self.image_parser
     
     def register(self):
         """Регистрация обработчиков заказов"""
@@ -52,52 +66,19 @@ class OrderHandlers:
             self.handle_load_from_screenshot,
             func=lambda m: m.text and "Загрузить из скриншота" in m.text
         )
-        self.bot.register_message_handler(
-            self.handle_order_details_start,
-            func=lambda m: m.text == "✏️ Редактирование заказов"
-        )
-        self.bot.register_message_handler(
-            self.handle_delivered_orders,
-            func=lambda m: m.text == "✅ Доставленные"
-        )
+        self.parent.register_text_handler("✏️ Редактирование заказов", self.handle_order_details_start)
+        self.parent.register_text_handler("✅ Доставленные", self.handle_delivered_orders)
         
         # Кнопки редактирования полей заказа
-        self.bot.register_message_handler(
-            self.handle_edit_phone,
-            func=lambda m: m.text == "📞 Телефон"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_name,
-            func=lambda m: m.text == "👤 ФИО"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_comment,
-            func=lambda m: m.text == "💬 Комментарий"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_entrance,
-            func=lambda m: m.text == "🏢 Подъезд"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_apartment,
-            func=lambda m: m.text == "🚪 Квартира"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_delivery_time,
-            func=lambda m: m.text == "🕐 Время доставки"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_arrival_time,
-            func=lambda m: m.text == "⏰ Время прибытия"
-        )
-        self.bot.register_message_handler(
-            self.handle_edit_call_time,
-            func=lambda m: m.text == "📞⏰ Время звонка"
-        )
-        self.bot.register_message_handler(
-            self.handle_back_to_orders_list,
-            func=lambda m: m.text == "⬅️ К списку заказов"
-        )
+        self.parent.register_text_handler("📞 Телефон", self.handle_edit_phone)
+        self.parent.register_text_handler("👤 ФИО", self.handle_edit_name)
+        self.parent.register_text_handler("💬 Комментарий", self.handle_edit_comment)
+        self.parent.register_text_handler("🏢 Подъезд", self.handle_edit_entrance)
+        self.parent.register_text_handler("🚪 Квартира", self.handle_edit_apartment)
+        self.parent.register_text_handler("🕐 Время доставки", self.handle_edit_delivery_time)
+        self.parent.register_text_handler("⏰ Время прибытия", self.handle_edit_arrival_time)
+        self.parent.register_text_handler("📞⏰ Время звонка", self.handle_edit_call_time)
+        self.parent.register_text_handler("⬅️ К списку заказов", self.handle_back_to_orders_list)
         
         logger.info("✅ Order handlers зарегистрированы")
     
@@ -459,11 +440,12 @@ class OrderHandlers:
             # Парсим изображение
             logger.info(f"🔍 Начало парсинга изображения для user_id={user_id}")
             
-            if not self.image_parser:
+            image_parser = self._get_image_parser()
+            if not image_parser:
                 logger.error("❌ Парсер изображений не инициализирован")
                 self.bot.edit_message_text(
                     "❌ <b>Парсер изображений недоступен</b>\n\n"
-                    "Парсер изображений не был инициализирован при запуске бота.\n"
+                    "Не удалось инициализировать парсер изображений.\n"
                     "Проверьте, что Tesseract OCR установлен и доступен.",
                     message.chat.id,
                     status_msg.message_id,
@@ -471,7 +453,7 @@ class OrderHandlers:
                 )
                 return
             
-            order_data = self.image_parser.parse_order_from_image(image_data)
+            order_data = image_parser.parse_order_from_image(image_data)
             
             if not order_data:
                 logger.warning(f"⚠️ Не удалось извлечь данные из изображения user_id={user_id}")
@@ -1251,11 +1233,6 @@ class OrderHandlers:
         )
         
         if updated:
-            # Очищаем маршрут из state (но оставляем в БД)
-            self.parent.update_user_state(user_id, 'route_summary', [])
-            self.parent.update_user_state(user_id, 'call_schedule', [])
-            self.parent.update_user_state(user_id, 'route_order', [])
-            
             # Отправляем подтверждение
             self.bot.send_message(
                 chat_id,
@@ -1480,19 +1457,6 @@ class OrderHandlers:
         
         # Обновляем время доставки
         self._update_order_field(user_id, order_number, 'delivery_time_window', text, message)
-        
-        # Пересчитываем время звонков для этого заказа
-        state_data = self.parent.get_user_state(user_id)
-        route_summary = state_data.get('route_summary', [])
-        if route_summary:
-            from src.services.maps import MapsService
-            orders = state_data.get('orders', [])
-            for order_data in orders:
-                if order_data.get('order_number') == order_number:
-                    updated_order = Order(**order_data)
-                    # Вызываем метод из route_handlers для обновления маршрута
-                    # Пропускаем пересчет здесь, так как он выполняется в _update_order_field
-                    break
     
     def process_manual_arrival_time(self, message, state_data):
         """Обработка ввода ручного времени прибытия"""
@@ -7,17 +7,259 @@
 - Показа маршрута и графика звонков
 - Сброса данных за день
 """
+import copy
+import hashlib
+import json
 import logging
-from typing import Dict, List
+import threading
+import time as time_module
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, List, Optional
 from datetime import datetime, time, timedelta, date
+from sqlalchemy import and_, or_
 from telebot import types
-from src.models.order import Order, CallStatusDB
-from src.services.maps_service import MapsService
+from telebot.apihelper import ApiTelegramException
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from src.models.order import Order, OrderDB, CallStatusDB, RoutePoint, OptimizedRoute
 from src.services.route_optimizer import RouteOptimizer
 from src.database.connection import get_db_session
 
 logger = logging.getLogger(__name__)
 
+# Минимальный интервал между отрисовками карточки заказа в одном чате (сек)
+CHAT_THROTTLE_INTERVAL = 1.05
+# Если ждать меньше - просто ждем, иначе откладываем отрисовку (сек)
+CHAT_THROTTLE_MAX_SLEEP = 0.25
+# Сколько последних отрисованных карточек заказа помнить (по всем чатам)
+LAST_RENDER_CACHE_SIZE = 1024
+# Окно, в котором повторное нажатие 'Доставлен' по тому же заказу игнорируется (сек)
+DELIVERY_DEDUP_TTL = 2.0
+# Минимальный интервал между промежуточными обновлениями статуса оптимизации (сек)
+PROGRESS_EDIT_INTERVAL = 0.5
+# Период фонового обновления счетчика геокодирования в статусе (сек)
+PROGRESS_TICK_INTERVAL = 1.0
+
+# Пул для фоновых ответов на callback (ответ не блокирует перерисовку)
+_CALLBACK_ACK_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="route-callback-ack")
+
+# Смещение индекса для callback навигации current_order_[next_|prev_]<index>
+CURRENT_ORDER_NAV_STEPS = {
+    "current_order": 0,
+    "current_order_next": 1,
+    "current_order_prev": -1,
+}
+
+
+# Кнопки меню маршрутов: текст -> имя метода RouteHandlers
+ROUTE_MENU_HANDLERS = {
+    "📍 Точка старта": "handle_set_start",
+    "▶️ Оптимизировать": "handle_optimize_route",
+    "📋 Показать маршрут": "handle_show_route",
+    "📋 Текущий заказ": "handle_current_order",
+    "📞 Звонки": "handle_show_calls",
+    "🗑️ Сбросить день": "handle_reset_day",
+    # Под-меню точки старта
+    "📍 Геопозиция": "handle_set_start_location_geo",
+    "✍️ Адрес": "handle_set_start_location_address",
+    "⏰ Время старта": "handle_set_start_time_change",
+}
+BTN_BACK = "⬅️ Назад"
+BTN_MAIN_MENU = "⬅️ Главное меню"
+
+# Лимит длины текста одного сообщения Telegram
+MESSAGE_TEXT_LIMIT = 4096
+
+_route_point_arrival_ts = itemgetter('estimated_arrival_ts')
+
+# Поля заказа, не влияющие на подпись входных данных оптимизации
+_SIGNATURE_EXCLUDED_FIELDS = {'latitude', 'longitude', 'gis_id'}
+
+
+def _sort_route_points(route_points_data: List[Dict]) -> List[Dict]:
+    """Отсортировать точки маршрута по времени прибытия"""
+    try:
+        return sorted(route_points_data, key=_route_point_arrival_ts)
+    except KeyError:
+        # Маршрут сохранен до появления estimated_arrival_ts
+        return sorted(route_points_data, key=lambda pd: datetime.fromisoformat(pd.get("estimated_arrival")))
+
+
+# Шаблоны строк карточки точки маршрута (_format_route_summary)
+_ROUTE_ARRIVAL_TEMPLATE = "🕐 {window} | Прибытие: {arrival}{status}"
+_ROUTE_LEG_TEMPLATE = "{call} | 📏 {distance:.1f} км | ⏱️ {minutes:.0f} мин"
+_ROUTE_LINKS_TEMPLATE = (
+    "🔗 <a href=\"{dg}\">Маршрут 2ГИС</a> | <a href=\"{ya}\">Яндекс</a> | "
+    "<a href=\"{pdg}\">Точка 2ГИС</a> | <a href=\"{pya}\">Яндекс</a>"
+)
+
+
+def _pack_messages(header: str, texts: List[str], limit: int = MESSAGE_TEXT_LIMIT) -> List[str]:
+    """Упаковать тексты в минимальное число сообщений не длиннее limit (порядок сохраняется)"""
+    messages = []
+    current = header
+    has_items = False
+    for text in texts:
+        candidate = current + "\n\n" + text if has_items else current + text
+        if has_items and len(candidate) > limit:
+            messages.append(current)
+            current, has_items = text, True
+        else:
+            current, has_items = candidate, True
+    messages.append(current)
+    return messages
+
+
+@lru_cache(maxsize=2)
+def _start_menu_markup_json(has_start_time: bool) -> str:
+    """JSON клавиатуры меню точки старта"""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row("📍 Геопозиция", "✍️ Адрес")
+    if has_start_time:
+        markup.row("⏰ Время старта")
+    markup.row(BTN_MAIN_MENU)
+    return markup.to_json()
+
+
+@lru_cache(maxsize=1)
+def _geo_request_markup_json() -> str:
+    """JSON клавиатуры запроса геопозиции"""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    markup.add(types.KeyboardButton("📍 Отправить геопозицию", request_location=True))
+    markup.row(BTN_BACK)
+    return markup.to_json()
+
+
+@lru_cache(maxsize=1)
+def _back_markup_json() -> str:
+    """JSON клавиатуры с единственной кнопкой «Назад»"""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row(BTN_BACK)
+    return markup.to_json()
+
+
+# Шаблон клавиатуры карточки заказа: [⬅️, ➡️], [✏️, ✅]; callback_data подставляется при рендере
+_ORDER_NAV_MARKUP_TEMPLATE = types.InlineKeyboardMarkup()
+_ORDER_NAV_MARKUP_TEMPLATE.row(
+    types.InlineKeyboardButton("⬅️ Предыдущий", callback_data="_"),
+    types.InlineKeyboardButton("➡️ Следующий", callback_data="_"),
+)
+_ORDER_NAV_MARKUP_TEMPLATE.row(
+    types.InlineKeyboardButton("✏️ Отредактировать", callback_data="_"),
+    types.InlineKeyboardButton("✅ Доставлен", callback_data="_"),
+)
+
+
+@lru_cache(maxsize=1024)
+def _order_nav_markup_json(index: int, has_next: bool, order_number: str) -> str:
+    """JSON клавиатуры карточки текущего заказа (навигация + действия).
+    
+    telebot принимает reply_markup строкой, поэтому сериализуем клавиатуру один раз.
+    """
+    markup = copy.deepcopy(_ORDER_NAV_MARKUP_TEMPLATE)
+    prev_button, next_button = markup.keyboard[0]
+    edit_button, delivered_button = markup.keyboard[1]
+    
+    # Кнопки навигации
+    prev_button.callback_data = f"current_order_prev_{index}"
+    next_button.callback_data = f"current_order_next_{index}"
+    nav_buttons = []
+    if index > 0:
+        nav_buttons.append(prev_button)
+    if has_next:
+        nav_buttons.append(next_button)
+    
+    if nav_buttons:
+        markup.keyboard[0] = nav_buttons
+    else:
+        markup.keyboard.pop(0)
+    
+    # Кнопки действий
+    edit_button.callback_data = f"route_edit_order_{order_number}"
+    delivered_button.callback_data = f"route_delivered_{order_number}"
+    return json.dumps(markup.to_dict(), separators=(',', ':'), ensure_ascii=False)
+
+
+class _StatusThrottler:
+    """Статусное сообщение оптимизации маршрута
+    
+    Редактирует сообщение не чаще PROGRESS_EDIT_INTERVAL: промежуточный текст,
+    пришедший раньше, откладывается и вытесняется следующим, а отправляется
+    таймером по истечении интервала (или раньше - через flush()).
+    Перед заменой сообщения итоговым нужно вызвать close().
+    """
+    
+    def __init__(self, bot, chat_id: int, message_id: int, text: Optional[str] = None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self._text = text
+        self._pending: Optional[str] = None
+        self._last_edit_ts = time_module.monotonic()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+    
+    def update(self, text: str, force: bool = False):
+        """Показать text; force=True - сразу (этап, на котором пользователь будет ждать дольше всего)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._pending = None
+            if text == self._text:
+                return
+            wait = PROGRESS_EDIT_INTERVAL - (time_module.monotonic() - self._last_edit_ts)
+            if not force and wait > 0:
+                self._pending = text
+                self._schedule_flush(wait)
+                return
+            self._edit(text)
+    
+    def flush(self):
+        """Отправить отложенный текст, если интервал уже прошел"""
+        with self._lock:
+            if self._closed or not self._pending:
+                return
+            wait = PROGRESS_EDIT_INTERVAL - (time_module.monotonic() - self._last_edit_ts)
+            if wait > 0:
+                self._schedule_flush(wait)
+                return
+            text, self._pending = self._pending, None
+            self._edit(text)
+    
+    def close(self):
+        """Прекратить обновления статуса: отложенный текст больше не отправляется"""
+        with self._lock:
+            self._closed = True
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+    
+    def _schedule_flush(self, wait: float):
+        """Взвести таймер отправки отложенного текста (вызывать под lock)"""
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(wait, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+    
+    def _edit(self, text: str):
+        try:
+            self.bot.edit_message_text(text, self.chat_id, self.message_id, parse_mode='HTML')
+        except ApiTelegramException as e:
+            logger.debug(f"Не удалось обновить статус оптимизации: {e}")
+            return
+        self._text = text
+        self._last_edit_ts = time_module.monotonic()
+
 
 class RouteHandlers:
     """Обработчики маршрутов - полная реализация"""
@@ -25,48 +267,26 @@ class RouteHandlers:
     def __init__(self, bot_instance):
         self.bot = bot_instance.bot
         self.parent = bot_instance
+        # Последний отрисованный текст и клавиатура по (chat_id, message_id)
+        self._last_render: OrderedDict = OrderedDict()
+        # Ограничение частоты отрисовки карточки заказа по чатам
+        self._chat_bucket: Dict[int, float] = {}
+        self._pending_render: Dict[int, tuple] = {}
+        self._render_lock = threading.Lock()
+        # Время последнего нажатия 'Доставлен' по (user_id, order_number)
+        self._recent_deliveries: Dict[tuple, float] = {}
+        self._delivery_lock = threading.Lock()
+        # Пользователи, для которых сейчас выполняется оптимизация в фоне
+        self._optimizing_users: set = set()
+        self._optimizing_lock = threading.Lock()
+        # user_id -> (дата, ключ входных данных, отформатированный маршрут)
+        self._formatted_routes: Dict[int, tuple] = {}
     
     def register(self):
         """Регистрация обработчиков маршрутов"""
-        # Кнопки меню маршрутов
-        self.bot.register_message_handler(
-            self.handle_set_start,
-            func=lambda m: m.text == "📍 Точка старта"
-        )
-        self.bot.register_message_handler(
-            self.handle_optimize_route,
-            func=lambda m: m.text == "▶️ Оптимизировать"
-        )
-        self.bot.register_message_handler(
-            self.handle_show_route,
-            func=lambda m: m.text == "📋 Показать маршрут"
-        )
-        self.bot.register_message_handler(
-            self.handle_current_order,
-            func=lambda m: m.text == "📋 Текущий заказ"
-        )
-        self.bot.register_message_handler(
-            self.handle_show_calls,
-            func=lambda m: m.text == "📞 Звонки"
-        )
-        self.bot.register_message_handler(
-            self.handle_reset_day,
-            func=lambda m: m.text == "🗑️ Сбросить день"
-        )
-        
-        # Под-меню точки старта
-        self.bot.register_message_handler(
-            self.handle_set_start_location_geo,
-            func=lambda m: m.text == "📍 Геопозиция"
-        )
-        self.bot.register_message_handler(
-            self.handle_set_start_location_address,
-            func=lambda m: m.text == "✍️ Адрес"
-        )
-        self.bot.register_message_handler(
-            self.handle_set_start_time_change,
-            func=lambda m: m.text == "⏰ Время старта"
-        )
+        # Кнопки меню маршрутов и под-меню точки старта
+        for text, handler_name in ROUTE_MENU_HANDLERS.items():
+            self.parent.register_text_handler(text, getattr(self, handler_name))
         
         logger.info("✅ Route handlers зарегистрированы")
     
@@ -114,15 +334,10 @@ class RouteHandlers:
             self.handle_edit_order_from_route(call)
         elif callback_data.startswith("current_order_"):
             # Формат: current_order_<index> или current_order_next_<index> или current_order_prev_<index>
-            if callback_data.startswith("current_order_next_"):
-                index = int(callback_data.replace("current_order_next_", ""))
-                self.handle_show_order_by_index(call, index + 1)
-            elif callback_data.startswith("current_order_prev_"):
-                index = int(callback_data.replace("current_order_prev_", ""))
-                self.handle_show_order_by_index(call, index - 1)
-            else:
-                index = int(callback_data.replace("current_order_", ""))
-                self.handle_show_order_by_index(call, index)
+            action, _, raw_index = callback_data.rpartition('_')
+            step = CURRENT_ORDER_NAV_STEPS.get(action)
+            if step is not None:
+                self.handle_show_order_by_index(call, int(raw_index) + step)
     
     # ==================== ТОЧКА СТАРТА ====================
     
@@ -136,7 +351,7 @@ class RouteHandlers:
         
         start_address = None
         start_location = None
-        start_time_str = None
+        start_time = None
         
         if start_location_data:
             if start_location_data.get('location_type') == 'geo':
@@ -146,14 +361,10 @@ class RouteHandlers:
                 }
             elif start_location_data.get('location_type') == 'address':
                 start_address = start_location_data.get('address')
-            start_time_str = start_location_data.get('start_time')
+            start_time = start_location_data.get('start_time')
         
-        # Создаем клавиатуру с вариантами
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("📍 Геопозиция", "✍️ Адрес")
-        if start_time_str:
-            markup.row("⏰ Время старта")
-        markup.row("⬅️ Главное меню")
+        # Клавиатура с вариантами
+        markup = _start_menu_markup_json(bool(start_time))
 
         text = "📍 <b>Точка старта</b>\n\n"
         
@@ -165,8 +376,7 @@ class RouteHandlers:
         else:
             text += "Точка старта не установлена\n"
         
-        if start_time_str:
-            start_time = datetime.fromisoformat(start_time_str)
+        if start_time:
             text += f"⏰ <b>Время старта:</b> {start_time.strftime('%H:%M')}\n"
         else:
             text += "⏰ Время старта не установлено\n"
@@ -179,16 +389,10 @@ class RouteHandlers:
         """Запросить геопозицию для точки старта"""
         user_id = message.from_user.id
         
-        # Создаем клавиатуру с кнопкой "Отправить геопозицию"
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-        geo_button = types.KeyboardButton("📍 Отправить геопозицию", request_location=True)
-        markup.add(geo_button)
-        markup.row("⬅️ Назад")
-        
         self.bot.send_message(
             message.chat.id,
             "📍 Отправьте свою геопозицию с помощью кнопки ниже:",
-            reply_markup=markup
+            reply_markup=_geo_request_markup_json()
         )
         
         # Устанавливаем состояние
@@ -199,13 +403,10 @@ class RouteHandlers:
         """Запросить адрес для точки старта"""
         user_id = message.from_user.id
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("⬅️ Назад")
-        
         self.bot.send_message(
             message.chat.id,
             "✍️ Введите адрес точки старта:",
-            reply_markup=markup
+            reply_markup=_back_markup_json()
         )
         
         # Устанавливаем состояние
@@ -215,13 +416,10 @@ class RouteHandlers:
         """Изменить время старта"""
         user_id = message.from_user.id
         
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("⬅️ Назад")
-        
         self.bot.send_message(
             message.chat.id,
             "⏰ Введите время старта (например, 09:00):",
-            reply_markup=markup
+            reply_markup=_back_markup_json()
         )
         
         # Устанавливаем состояние
@@ -263,7 +461,7 @@ class RouteHandlers:
         user_id = message.from_user.id
         today = date.today()
         
-        if message.text == "⬅️ Назад":
+        if message.text == BTN_BACK:
             self.parent.clear_user_state(user_id)
             self.handle_set_start(message)
             return
@@ -280,7 +478,7 @@ class RouteHandlers:
             
             # Спрашиваем про время старта
             markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.row("⬅️ Главное меню")
+            markup.row(BTN_MAIN_MENU)
             
             self.bot.send_message(
                 message.chat.id,
@@ -301,7 +499,7 @@ class RouteHandlers:
         user_id = message.from_user.id
         today = date.today()
         
-        if message.text == "⬅️ Назад":
+        if message.text == BTN_BACK:
             self.parent.clear_user_state(user_id)
             self.handle_set_start(message)
             return
@@ -310,7 +508,7 @@ class RouteHandlers:
         
         # Геокодируем адрес для получения координат
         self.bot.send_chat_action(message.chat.id, 'typing')
-        maps_service = MapsService()
+        maps_service = self.parent.maps_service
         lat, lon, gid = maps_service.geocode_address_sync(address)
         
         if not lat or not lon:
@@ -335,7 +533,6 @@ class RouteHandlers:
         yandex_link = f"https://yandex.ru/maps/?whatshere[point]={lon},{lat}&whatshere[zoom]=17"
         
         # Показываем inline кнопки для подтверждения
-        from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
         markup = InlineKeyboardMarkup()
         markup.row(
             InlineKeyboardButton("✅ Да, верно", callback_data="confirm_start_address"),
@@ -410,7 +607,7 @@ class RouteHandlers:
         user_id = message.from_user.id
         today = date.today()
         
-        if message.text == "⬅️ Главное меню":
+        if message.text == BTN_MAIN_MENU:
             self.parent.clear_user_state(user_id)
             self.bot.send_message(
                 message.chat.id,
@@ -457,53 +654,74 @@ class RouteHandlers:
     # ==================== ОПТИМИЗАЦИЯ МАРШРУТА ====================
     
     def handle_optimize_route(self, message):
-        """Handle /optimize_route command"""
+        """Handle /optimize_route command
+        
+        Оптимизация (БД, геокодирование, матрица расстояний, решатель) выполняется
+        в пуле parent.executor, поток polling сразу освобождается для других чатов.
+        """
+        user_id = message.from_user.id
+        with self._optimizing_lock:
+            if user_id in self._optimizing_users:
+                self.bot.reply_to(message, "⏳ Оптимизация маршрута уже выполняется, дождитесь результата")
+                return
+            self._optimizing_users.add(user_id)
+        try:
+            self.parent.executor.submit(self._run_optimize_route, message)
+        except Exception:
+            with self._optimizing_lock:
+                self._optimizing_users.discard(user_id)
+            raise
+    
+    def _run_optimize_route(self, message):
+        """Выполнить оптимизацию в фоне и снять отметку о выполнении"""
+        try:
+            self._do_optimize_route(message)
+        finally:
+            with self._optimizing_lock:
+                self._optimizing_users.discard(message.from_user.id)
+    
+    def _do_optimize_route(self, message):
+        """Оптимизация маршрута (выполняется в пуле потоков)"""
         try:
             user_id = message.from_user.id
             today = date.today()
             
             logger.debug(f"Начало оптимизации для user_id={user_id}")
             
-            # Загружаем заказы из БД
+            # Загружаем заказы, подтвержденные звонки и точку старта одним обращением к БД
             try:
-                orders_data = self.parent.db_service.get_today_orders(user_id)
-                logger.debug(f"Загружено заказов: {len(orders_data) if orders_data else 0}")
+                bundle = self.parent.db_service.get_optimization_bundle(user_id, today)
             except Exception as e:
-                logger.error(f"Ошибка загрузки заказов: {e}", exc_info=True)
-                self.bot.reply_to(message, f"❌ Ошибка загрузки заказов: {str(e)}", reply_markup=self.parent._route_menu_markup())
+                logger.error(f"Ошибка загрузки данных для оптимизации: {e}", exc_info=True)
+                self.bot.reply_to(message, f"❌ Ошибка загрузки данных: {str(e)}", reply_markup=self.parent._route_menu_markup())
                 return
             
+            orders_data = bundle['orders']
+            logger.debug(f"Загружено заказов: {len(orders_data) if orders_data else 0}")
+            
             if not orders_data:
                 user_id = message.from_user.id
                 self.bot.reply_to(message, "❌ Нет добавленных заказов. Добавьте их через кнопку ➕ Добавить заказы", reply_markup=self.parent._orders_menu_markup(user_id))
                 return
 
-            # Фильтруем доставленные заказы
-            active_orders_data = [od for od in orders_data if od.get('status', 'pending') != 'delivered']
+            # Активные заказы уже разделены в БД-слое по подтвержденным звонкам (доставленные исключены)
+            confirmed_orders_data = bundle['confirmed_orders']
+            unconfirmed_orders_data = bundle['unconfirmed_orders']
             
-            if not active_orders_data:
+            if not confirmed_orders_data and not unconfirmed_orders_data:
                 user_id = message.from_user.id
                 self.bot.reply_to(message, "❌ Нет активных заказов для оптимизации. Все заказы доставлены.", reply_markup=self.parent._orders_menu_markup(user_id))
                 return
             
-            # Загружаем подтвержденные звонки для сохранения их при повторной оптимизации
-            try:
-                confirmed_calls = self.parent.db_service.get_confirmed_calls(user_id, today)
-                confirmed_order_numbers = set(call['order_number'] for call in confirmed_calls)
-                logger.info(f"Найдено {len(confirmed_calls)} подтвержденных звонков: {confirmed_order_numbers}")
-            except Exception as e:
-                logger.error(f"Ошибка загрузки подтвержденных звонков: {e}", exc_info=True)
-                confirmed_calls = []
-                confirmed_order_numbers = set()
+            # Подтвержденные звонки - для сохранения их при повторной оптимизации
+            confirmed_calls = bundle['confirmed_calls']
+            # Неизменяемое множество: используется для проверок принадлежности во всех циклах ниже
+            confirmed_order_numbers = frozenset(call['order_number'] for call in confirmed_calls)
+            logger.info(f"Найдено {len(confirmed_calls)} подтвержденных звонков: {confirmed_order_numbers}")
 
-            # Загружаем точку старта из БД
-            try:
-                start_location_data = self.parent.db_service.get_start_location(user_id, today)
-                logger.debug(f"Данные точки старта: {start_location_data}")
-            except Exception as e:
-                logger.error(f"Ошибка загрузки точки старта: {e}", exc_info=True)
-                self.bot.reply_to(message, f"❌ Ошибка загрузки точки старта: {str(e)}", reply_markup=self.parent._route_menu_markup())
-                return
+            # Точка старта
+            start_location_data = bundle['start_location']
+            logger.debug(f"Данные точки старта: {start_location_data}")
             
             if not start_location_data:
                 self.bot.reply_to(message, "❌ Не установлена точка старта. Используйте кнопку 📍 Точка старта", reply_markup=self.parent._route_menu_markup())
@@ -512,50 +730,17 @@ class RouteHandlers:
             start_address = start_location_data.get('address')
             start_lat = start_location_data.get('latitude')
             start_lon = start_location_data.get('longitude')
-            start_time_str = start_location_data.get('start_time')
+            start_datetime = start_location_data.get('start_time')
             location_type = start_location_data.get('location_type')
             
-            if not start_time_str:
+            if not start_datetime:
                 self.bot.reply_to(message, "❌ Не установлено время старта. Используйте кнопку 📍 Точка старта", reply_markup=self.parent._route_menu_markup())
                 return
 
             # Convert data back to Order objects
-            # Разделяем на подтвержденные (confirmed calls) и неподтвержденные заказы
-            confirmed_orders = []  # Заказы с подтвержденными звонками (сохраняем порядок из предыдущего маршрута)
-            unconfirmed_orders = []  # Заказы для новой оптимизации
-            
-            for order_data in active_orders_data:
-                try:
-                    # Преобразуем строки времени обратно в time объекты
-                    order_dict = order_data.copy()
-                    if order_dict.get('delivery_time_start'):
-                        if isinstance(order_dict['delivery_time_start'], str):
-                            parts = order_dict['delivery_time_start'].split(':')
-                            if len(parts) >= 2:
-                                order_dict['delivery_time_start'] = time(int(parts[0]), int(parts[1]))
-                            else:
-                                order_dict['delivery_time_start'] = None
-                    if order_dict.get('delivery_time_end'):
-                        if isinstance(order_dict['delivery_time_end'], str):
-                            parts = order_dict['delivery_time_end'].split(':')
-                            if len(parts) >= 2:
-                                order_dict['delivery_time_end'] = time(int(parts[0]), int(parts[1]))
-                            else:
-                                order_dict['delivery_time_end'] = None
-                    
-                    order = Order(**order_dict)
-                    
-                    # DEBUG: Логируем manual_arrival_time СРАЗУ после создания Order
-                    logger.info(f"📦 DEBUG: Заказ #{order.order_number} создан из БД, manual_arrival_time = {order.manual_arrival_time} (тип: {type(order.manual_arrival_time)})")
-                    
-                    # Разделяем по признаку подтвержденного звонка
-                    if order.order_number and order.order_number in confirmed_order_numbers:
-                        confirmed_orders.append(order)
-                    else:
-                        unconfirmed_orders.append(order)
-                except Exception as e:
-                    logger.error(f"Ошибка создания Order из данных: {e}, данные: {order_data}", exc_info=True)
-                    continue
+            confirmed_orders = self._orders_from_db(confirmed_orders_data)  # Заказы с подтвержденными звонками (сохраняем порядок из предыдущего маршрута)
+            unconfirmed_orders = self._orders_from_db(unconfirmed_orders_data)  # Заказы для новой оптимизации
+            confirmed_by_num = {o.order_number: o for o in confirmed_orders}
             
             # Для оптимизации используем только неподтвержденные заказы
             orders = unconfirmed_orders
@@ -569,13 +754,6 @@ class RouteHandlers:
                 self.bot.reply_to(message, "✅ Все заказы уже подтверждены. Маршрут не требует оптимизации.", reply_markup=self.parent._route_menu_markup())
                 return
             
-            try:
-                start_datetime = datetime.fromisoformat(start_time_str) if isinstance(start_time_str, str) else start_time_str
-            except Exception as e:
-                logger.error(f"Ошибка парсинга времени старта: {e}, start_time_str: {start_time_str}", exc_info=True)
-                self.bot.reply_to(message, f"❌ Ошибка обработки времени старта: {str(e)}", reply_markup=self.parent._route_menu_markup())
-                return
-            
             # Если есть подтвержденные заказы - начинаем маршрут с последнего подтвержденного
             # Загружаем предыдущий маршрут из БД
             actual_start_from_confirmed = None
@@ -587,20 +765,16 @@ class RouteHandlers:
                         route_order = route_data.get('route_order', [])
                         
                         # Находим последний подтвержденный заказ в маршруте
-                        last_confirmed_index = -1
-                        last_confirmed_order_number = None
-                        for i, order_num in enumerate(route_order):
-                            if order_num in confirmed_order_numbers:
-                                last_confirmed_index = i
-                                last_confirmed_order_number = order_num
+                        last_confirmed_index = max(
+                            (i for i, order_num in enumerate(route_order) if order_num in confirmed_order_numbers),
+                            default=-1
+                        )
                         
                         if last_confirmed_index >= 0 and last_confirmed_index < len(route_points_data):
                             last_point_data = route_points_data[last_confirmed_index]
+                            last_confirmed_order_number = route_order[last_confirmed_index]
                             # Находим соответствующий Order объект для получения координат
-                            last_confirmed_order = next(
-                                (o for o in confirmed_orders if o.order_number == last_confirmed_order_number),
-                                None
-                            )
+                            last_confirmed_order = confirmed_by_num.get(last_confirmed_order_number)
                             
                             if last_confirmed_order and last_confirmed_order.latitude and last_confirmed_order.longitude:
                                 # Получаем настройки пользователя для времени на точке
@@ -645,34 +819,46 @@ class RouteHandlers:
             
             logger.debug(f"Начало оптимизации: {len(orders)} заказов, точка старта: {start_location or start_address}")
 
+            # Если с прошлой оптимизации ничего не изменилось - показываем сохраненный маршрут
+            # (подпись хранится вместе с маршрутом в route_data и переживает сброс state и рестарт)
+            route_signature = self._route_signature(
+                orders, confirmed_order_numbers, start_location_coords, start_address, start_datetime,
+                self.parent.settings_service.get_settings(user_id), bundle['manual_call_times']
+            )
+            saved_route_data = bundle['route_data']
+            if saved_route_data and saved_route_data.get('input_signature') == route_signature:
+                logger.info(f"♻️ Данные маршрута user_id={user_id} не изменились, показываем сохраненный маршрут")
+                if self.parent.get_user_state(user_id).get('optimized_route') is None:
+                    # Живой маршрут для мониторинга пробок восстанавливаем из сохраненных точек
+                    restored_route = self._optimized_route_from_db(saved_route_data, orders)
+                    if restored_route is not None:
+                        self._store_monitoring_state(user_id, restored_route, orders, start_location_data)
+                self.handle_show_route(message)
+                return
+
             # Отправляем начальное сообщение и включаем typing indicator
             status_msg = self.bot.reply_to(message, "🔄 <b>Начинаю оптимизацию маршрута...</b>\n\n⏳ Загружаю данные...", parse_mode='HTML')
+            status = _StatusThrottler(self.bot, message.chat.id, status_msg.message_id, status_msg.text)
             self.bot.send_chat_action(message.chat.id, 'typing')
 
-            # Initialize services
-            maps_service = MapsService()
+            # Initialize services (общий MapsService: кэши и HTTP-соединения переиспользуются)
+            maps_service = self.parent.maps_service
 
             # Get start location coordinates - используем сохраненные координаты из БД
             if start_location_coords:
                 # Координаты уже есть в БД (были сохранены при подтверждении адреса или при отправке геопозиции)
-                self.bot.edit_message_text(
-                    "🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена (координаты из БД)\n⏳ Геокодирую адреса заказов...",
-                    message.chat.id,
-                    status_msg.message_id,
-                    parse_mode='HTML'
+                status.update(
+                    "🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена (координаты из БД)\n⏳ Геокодирую адреса заказов..."
                 )
             elif start_address:
                 # Координат нет в БД, но есть адрес (старые данные или не подтвержденный адрес) - нужно загеокодировать
-                self.bot.edit_message_text(
-                    "🔄 <b>Оптимизация маршрута</b>\n\n⏳ Определяю координаты точки старта...",
-                    message.chat.id,
-                    status_msg.message_id,
-                    parse_mode='HTML'
+                status.update(
+                    "🔄 <b>Оптимизация маршрута</b>\n\n⏳ Определяю координаты точки старта..."
                 )
-                self.bot.send_chat_action(message.chat.id, 'typing')
                 
                 start_lat, start_lon, gid = maps_service.geocode_address_sync(start_address)
                 if not start_lat or not start_lon:
+                    status.close()
                     self.bot.edit_message_text(
                         f"❌ Не удалось определить координаты точки старта: {start_address}",
                         message.chat.id,
@@ -687,14 +873,14 @@ class RouteHandlers:
                 self.parent.db_service.save_start_location(
                     user_id, 'address', start_address, start_lat, start_lon, None, today
                 )
-                
-                self.bot.edit_message_text(
-                    "🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена\n⏳ Геокодирую адреса заказов...",
-                    message.chat.id,
-                    status_msg.message_id,
-                    parse_mode='HTML'
+                # Обновляем и локальную копию - дальше по ней строится состояние маршрута
+                start_location_data['latitude'], start_location_data['longitude'] = start_lat, start_lon
+
+                status.update(
+                    "🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена\n⏳ Геокодирую адреса заказов..."
                 )
             else:
+                status.close()
                 self.bot.edit_message_text(
                     "❌ Не удалось получить координаты точки старта",
                     message.chat.id,
@@ -704,35 +890,43 @@ class RouteHandlers:
                 return
 
             # Геокодирование адресов заказов (только для тех, у кого нет координат)
-            self.bot.send_chat_action(message.chat.id, 'typing')
             orders_to_geocode = [o for o in orders if not o.latitude or not o.longitude]
             if orders_to_geocode:
                 total_to_geocode = len(orders_to_geocode)
-                self.bot.edit_message_text(
-                    f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена\n⏳ Геокодирую адреса: 0/{total_to_geocode}...",
-                    message.chat.id,
-                    status_msg.message_id,
-                    parse_mode='HTML'
+                status.update(
+                    f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена\n⏳ Геокодирую адреса ({total_to_geocode})..."
                 )
-                for idx, order in enumerate(orders_to_geocode, 1):
-                    # Обновляем сообщение перед обработкой каждого заказа
-                    if idx == 1 or idx % 3 == 0 or idx == total_to_geocode:
-                        self.bot.edit_message_text(
-                            f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена\n⏳ Геокодирую адреса: {idx}/{total_to_geocode}...",
-                            message.chat.id,
-                            status_msg.message_id,
-                            parse_mode='HTML'
-                        )
-                    self.bot.send_chat_action(message.chat.id, 'typing')
-                    # Проверяем, что адрес не пустой перед геокодированием
+                # Проверяем, что адрес не пустой перед геокодированием
+                geocodable_orders = []
+                for order in orders_to_geocode:
                     if order.address and order.address.strip():
-                        lat, lon, gid = maps_service.geocode_address_sync(order.address)
+                        geocodable_orders.append(order)
+                    else:
+                        logger.warning(f"⚠️ Заказ {order.order_number} не может быть загеокодирован: адрес отсутствует")
+                
+                # Геокодируем пакетно: БД кэш одним запросом, остальное - параллельно
+                if geocodable_orders:
+                    # Статус обновляется фоновым тикером, геокодирование только увеличивает счетчик
+                    geocode_progress = {'done': 0, 'total': 0}
+                    geocode_done = threading.Event()
+                    ticker = threading.Thread(
+                        target=self._geocode_progress_ticker,
+                        args=(status, geocode_progress, geocode_done),
+                        daemon=True
+                    )
+                    ticker.start()
+                    try:
+                        results = maps_service.geocode_batch_sync(
+                            [o.address for o in geocodable_orders], progress=geocode_progress
+                        )
+                    finally:
+                        geocode_done.set()
+                        ticker.join()
+                    for order, (lat, lon, gid) in zip(geocodable_orders, results):
                         if lat and lon:
                             order.latitude = lat
                             order.longitude = lon
                             order.gis_id = gid
-                    else:
-                        logger.warning(f"⚠️ Заказ {order.order_number} не может быть загеокодирован: адрес отсутствует")
 
             # Initialize route optimizer
             total_orders = len(orders)
@@ -740,25 +934,19 @@ class RouteHandlers:
                 geocoded_count = len(orders_to_geocode)
                 already_geocoded = total_orders - geocoded_count
                 if already_geocoded > 0:
-                    self.bot.edit_message_text(
+                    status.update(
                         f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Адреса обработаны: {geocoded_count} загеокодировано, {already_geocoded} уже были в БД\n⏳ Всего заказов: {total_orders}\n⏳ Рассчитываю оптимальный маршрут...",
-                        message.chat.id,
-                        status_msg.message_id,
-                        parse_mode='HTML'
+                        force=True
                     )
                 else:
-                    self.bot.edit_message_text(
+                    status.update(
                         f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Все адреса загеокодированы ({total_orders} заказов)\n⏳ Рассчитываю оптимальный маршрут...",
-                        message.chat.id,
-                        status_msg.message_id,
-                        parse_mode='HTML'
+                        force=True
                     )
             else:
-                self.bot.edit_message_text(
+                status.update(
                     f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Все адреса уже загеокодированы ({total_orders} заказов)\n⏳ Рассчитываю оптимальный маршрут...",
-                    message.chat.id,
-                    status_msg.message_id,
-                    parse_mode='HTML'
+                    force=True
                 )
             self.bot.send_chat_action(message.chat.id, 'typing')
             
@@ -767,11 +955,16 @@ class RouteHandlers:
             for order in orders:
                 logger.info(f"   → Заказ #{order.order_number}: manual_arrival_time = {order.manual_arrival_time}")
             
-            route_optimizer = RouteOptimizer(maps_service)
+            # Предзагружаем посчитанные ранее пары точек - при повторной оптимизации
+            # запросы к API маршрутов нужны только для новых точек
+            matrix_locations = [start_location_coords] + [
+                (o.latitude, o.longitude) for o in orders if o.latitude and o.longitude
+            ]
+            distance_cache = self.parent.db_service.get_distance_cache(user_id, matrix_locations)
+            route_optimizer = RouteOptimizer(maps_service, distance_cache=distance_cache)
             # Проверяем, есть ли ручные времена - если нет, используем fallback при ошибке
             has_manual_times_check = False
             with get_db_session() as session:
-                from sqlalchemy import and_
                 manual_calls_check = session.query(CallStatusDB).filter(
                     and_(
                         CallStatusDB.user_id == user_id,
@@ -787,13 +980,17 @@ class RouteHandlers:
                 user_id=user_id,
                 use_fallback=not has_manual_times_check  # Используем fallback только если нет ручных времен
             )
+            if route_optimizer.new_distance_entries:
+                try:
+                    self.parent.db_service.save_distance_cache(user_id, route_optimizer.new_distance_entries)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось сохранить кэш расстояний: {e}")
             
             # Проверяем результат оптимизации
             if not optimized_route or not optimized_route.points:
                 # Проверяем наличие ручных времен
                 has_manual_times = False
                 with get_db_session() as session:
-                    from sqlalchemy import and_
                     manual_calls = session.query(CallStatusDB).filter(
                         and_(
                             CallStatusDB.user_id == user_id,
@@ -827,6 +1024,7 @@ class RouteHandlers:
                     )
                 
                 # Удаляем статусное сообщение и отправляем новое с клавиатурой
+                status.close()
                 try:
                     self.bot.delete_message(message.chat.id, status_msg.message_id)
                 except Exception as e:
@@ -834,7 +1032,6 @@ class RouteHandlers:
                 
                 # Создаем клавиатуру
                 if has_manual_times:
-                    from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
                     markup = InlineKeyboardMarkup()
                     markup.add(InlineKeyboardButton(
                         "🔄 Пересчитать без ручных времен",
@@ -856,13 +1053,9 @@ class RouteHandlers:
                 )
                 return
             
-            self.bot.edit_message_text(
-                f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Маршрут рассчитан\n⏳ Формирую детальный план...",
-                message.chat.id,
-                status_msg.message_id,
-                parse_mode='HTML'
+            status.update(
+                f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Маршрут рассчитан\n⏳ Формирую детальный план..."
             )
-            self.bot.send_chat_action(message.chat.id, 'typing')
 
             # Build route summary
             # Сохраняем структурированные данные маршрута вместо готового текста
@@ -899,27 +1092,28 @@ class RouteHandlers:
                         previous_route_points = previous_route_data.get('route_points_data', [])
                         previous_route_order = previous_route_data.get('route_order', [])
                         previous_call_schedule = previous_route_data.get('call_schedule', [])
+                        # reversed: при дубликатах остается первая запись, как раньше с next()
+                        prev_call_idx = {c['order_number']: c for c in reversed(previous_call_schedule) if c.get('order_number')}
                         
                         # Добавляем подтвержденные точки из предыдущего маршрута
-                        for order_num in previous_route_order:
+                        added_confirmed = 0
+                        for point_index, order_num in enumerate(previous_route_order):
                             if order_num in confirmed_order_numbers:
-                                # Находим данные точки в предыдущем маршруте
-                                point_index = previous_route_order.index(order_num)
+                                added_confirmed += 1
+                                # Данные точки в предыдущем маршруте - по той же позиции
                                 if point_index < len(previous_route_points):
                                     route_points_data.append(previous_route_points[point_index])
                                 
                                 # Находим данные звонка в предыдущем расписании
-                                call_data = next(
-                                    (c for c in previous_call_schedule if c.get('order_number') == order_num),
-                                    None
-                                )
+                                call_data = prev_call_idx.get(order_num)
                                 if call_data:
                                     call_schedule.append(call_data)
                         
-                        logger.info(f"✅ Добавлено {len([o for o in previous_route_order if o in confirmed_order_numbers])} подтвержденных точек в начало маршрута")
+                        logger.info(f"✅ Добавлено {added_confirmed} подтвержденных точек в начало маршрута")
                 except Exception as e:
                     logger.error(f"Ошибка добавления подтвержденных заказов в маршрут: {e}", exc_info=True)
 
+            call_status_entries = []
             for i, point in enumerate(optimized_route.points, 1):
                 order = point.order
 
@@ -940,17 +1134,16 @@ class RouteHandlers:
                 # Фактическое время прибытия: ручное (если есть) или рассчитанное оптимизатором
                 actual_arrival_time = order.manual_arrival_time if order.manual_arrival_time else point.estimated_arrival
                 if order.manual_arrival_time:
-                    logger.info(f"⏰ Используется ручное время прибытия для заказа {order.order_number}: {actual_arrival_time.strftime('%H:%M')}")
+                    logger.info("⏰ Используется ручное время прибытия для заказа %s: %s",
+                                order.order_number, actual_arrival_time.strftime('%H:%M'))
 
                 # Время звонка:
                 #  - если есть РУЧНОЕ время звонка -> используем его
                 #  - иначе рассчитываем от фактического времени прибытия
                 if manual_call_time:
                     call_time = manual_call_time
-                    logger.info(
-                        f"📞 Используется РУЧНОЕ время звонка для заказа {order.order_number}: "
-                        f"{call_time.strftime('%H:%M')}"
-                    )
+                    logger.info("📞 Используется РУЧНОЕ время звонка для заказа %s: %s",
+                                order.order_number, call_time.strftime('%H:%M'))
                 else:
                     call_time = actual_arrival_time - timedelta(minutes=user_settings.call_advance_minutes)
 
@@ -966,6 +1159,7 @@ class RouteHandlers:
                 route_point_data = {
                     "order_number": order.order_number or str(order.id),
                     "estimated_arrival": actual_arrival_time.isoformat(),
+                    "estimated_arrival_ts": int(actual_arrival_time.timestamp()),
                     "distance_from_previous": point.distance_from_previous,
                     "time_from_previous": point.time_from_previous,
                     "call_time": call_time.isoformat(),
@@ -988,27 +1182,30 @@ class RouteHandlers:
                 # чтобы уведомления использовали актуальное время
                 if order.order_number:
                     if order.order_number in confirmed_order_numbers:
-                        logger.info(f"⏭️ Пропускаем создание call_status для заказа {order.order_number} - звонок уже подтвержден")
+                        logger.info("⏭️ Пропускаем создание call_status для заказа %s - звонок уже подтвержден",
+                                    order.order_number)
                     else:
-                        logger.debug(
-                            f"Создание/обновление записи о звонке: заказ {order.order_number}, "
-                            f"время звонка {call_time.strftime('%Y-%m-%d %H:%M:%S')}, "
-                            f"прибытие {actual_arrival_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                        )
+                        # strftime в цикле по точкам - только если DEBUG действительно включен
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(
+                                f"Создание/обновление записи о звонке: заказ {order.order_number}, "
+                                f"время звонка {call_time.strftime('%Y-%m-%d %H:%M:%S')}, "
+                                f"прибытие {actual_arrival_time.strftime('%Y-%m-%d %H:%M:%S')}"
+                            )
                         # Используем телефон из заказа или "Не указан" если его нет
-                        phone = order.phone or "Не указан"
-                        self.parent.call_notifier.create_call_status(
-                            user_id,
-                            order.order_number,
-                            call_time,
-                            phone,
-                            order.customer_name,
-                            today,
-                            is_manual_call=bool(manual_call_time),
-                            is_manual_arrival=bool(order.manual_arrival_time),
-                            arrival_time=actual_arrival_time,
-                            manual_arrival_time=order.manual_arrival_time
-                        )
+                        call_status_entries.append({
+                            "order_number": order.order_number,
+                            "call_time": call_time,
+                            "phone": order.phone or "Не указан",
+                            "customer_name": order.customer_name,
+                            "is_manual_call": bool(manual_call_time),
+                            "is_manual_arrival": bool(order.manual_arrival_time),
+                            "arrival_time": actual_arrival_time,
+                            "manual_arrival_time": order.manual_arrival_time,
+                        })
+
+            # Записи о звонках для всего маршрута - одной транзакцией
+            self.parent.call_notifier.bulk_create_call_statuses(user_id, today, call_status_entries)
 
             # Сохраняем порядок заказов в маршруте
             # Сначала подтвержденные (в порядке из предыдущего маршрута), затем новые
@@ -1020,59 +1217,46 @@ class RouteHandlers:
             new_route_order = [point.order.order_number or str(point.order.id) for point in optimized_route.points]
             route_order = confirmed_route_order + new_route_order
             
-            # Сохраняем обновленные координаты заказов в БД (если они были загеокодированы)
-            for point in optimized_route.points:
-                order = point.order
-                if order.latitude and order.longitude and order.order_number:
-                    # Обновляем координаты заказа в БД
-                    updates = {
-                        'latitude': order.latitude,
-                        'longitude': order.longitude,
-                    }
-                    if order.gis_id:
-                        updates['gis_id'] = order.gis_id
-                    try:
-                        self.parent.db_service.update_order(user_id, order.order_number, updates, today)
-                    except Exception as e:
-                        logger.warning(f"Не удалось обновить координаты заказа {order.order_number}: {e}")
+            # Обновленные координаты заказов (если они были загеокодированы)
+            order_coords = [
+                (point.order.order_number, point.order.latitude, point.order.longitude, point.order.gis_id)
+                for point in optimized_route.points
+                if point.order.latitude and point.order.longitude and point.order.order_number
+            ]
             
-            # Сохраняем структурированные данные маршрута в БД
-            self.parent.db_service.save_route_data(
-                user_id,
-                route_points_data,  # Структурированные данные вместо готового текста
-                call_schedule,
-                route_order,
-                optimized_route.total_distance,
-                optimized_route.total_time,
-                optimized_route.estimated_completion,
-                today
-            )
+            # Координаты и структурированные данные маршрута сохраняем одной транзакцией
+            with get_db_session() as session:
+                try:
+                    self.parent.db_service.bulk_update_order_coords(user_id, order_coords, today, session=session)
+                except Exception as e:
+                    session.rollback()
+                    logger.warning(
+                        f"Не удалось обновить координаты заказов {[c[0] for c in order_coords]}: {e}"
+                    )
+                self.parent.db_service.save_route_data(
+                    user_id,
+                    route_points_data,  # Структурированные данные вместо готового текста
+                    call_schedule,
+                    route_order,
+                    optimized_route.total_distance,
+                    optimized_route.total_time,
+                    optimized_route.estimated_completion,
+                    today,
+                    session=session,
+                    input_signature=route_signature
+                )
+            self.parent.invalidate_route_cache(user_id)
             
-            # Также сохраняем в state для обратной совместимости
-            self.parent.update_user_state(user_id, 'route_points_data', route_points_data)
-            self.parent.update_user_state(user_id, 'call_schedule', call_schedule)
-            self.parent.update_user_state(user_id, 'route_order', route_order)
-            # Сохраняем optimized_route для мониторинга пробок
-            self.parent.update_user_state(user_id, 'optimized_route', optimized_route)
-            self.parent.update_user_state(user_id, 'optimized_orders', orders)
-            start_location_tuple = None
-            if start_location_data:
-                if start_location_data.get('latitude') and start_location_data.get('longitude'):
-                    start_location_tuple = (start_location_data['latitude'], start_location_data['longitude'])
-            self.parent.update_user_state(user_id, 'start_location', start_location_tuple)
-            if start_location_data and start_location_data.get('start_time'):
-                start_time_str = start_location_data['start_time']
-                if isinstance(start_time_str, str):
-                    start_time = datetime.fromisoformat(start_time_str)
-                else:
-                    start_time = start_time_str
-                self.parent.update_user_state(user_id, 'start_time', start_time.isoformat() if isinstance(start_time, datetime) else start_time)
+            # Данные маршрута читаются только из БД; в state держим лишь живые объекты
+            self._store_monitoring_state(user_id, optimized_route, orders, start_location_data)
 
-            # Формируем итоговое сообщение (форматируем маршрут для отображения)
-            orders_data = self.parent.db_service.get_today_orders(user_id)
+            # Формируем итоговое сообщение (форматируем маршрут для отображения).
+            # Заказы и точку старта не перечитываем из БД: они загружены в начале,
+            # а обновленные координаты есть в уже построенных Order
             orders_dict = {od.get('order_number'): od for od in orders_data if od.get('order_number')}
-            start_location_data = self.parent.db_service.get_start_location(user_id, today) or {}
-            formatted_route = self._format_route_summary(user_id, route_points_data, orders_dict, start_location_data, maps_service)
+            order_obj_cache = {o.order_number: o for o in confirmed_orders + orders if o.order_number}
+            formatted_route = self._cached_route_summary(user_id, today, route_points_data, orders_dict,
+                                                         start_location_data, maps_service, order_obj_cache)
             
             summary_text = (
                 f"✅ <b>Маршрут оптимизирован!</b>\n\n"
@@ -1087,6 +1271,7 @@ class RouteHandlers:
                 summary_text += f"\n... и ещё {len(formatted_route) - 3} заказов"
 
             # Редактируем статусное сообщение на итоговое
+            status.close()
             try:
                 self.bot.edit_message_text(
                     summary_text,
@@ -1102,6 +1287,8 @@ class RouteHandlers:
 
         except Exception as e:
             logger.error(f"Ошибка оптимизации маршрута: {e}", exc_info=True)
+            if 'status' in locals():
+                status.close()
             
             # Обновляем статусное сообщение с ошибкой (если оно было создано)
             try:
@@ -1131,24 +1318,150 @@ class RouteHandlers:
     
     # ==================== ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ ====================
     
+    def _store_monitoring_state(self, user_id: int, optimized_route: OptimizedRoute, orders: List[Order],
+                                start_location_data: Optional[Dict]):
+        """Сохранить в state живые объекты маршрута для мониторинга пробок"""
+        self.parent.update_user_state(user_id, 'optimized_route', optimized_route)
+        self.parent.update_user_state(user_id, 'optimized_orders', orders)
+        start_location_tuple = None
+        if start_location_data:
+            if start_location_data.get('latitude') and start_location_data.get('longitude'):
+                start_location_tuple = (start_location_data['latitude'], start_location_data['longitude'])
+        self.parent.update_user_state(user_id, 'start_location', start_location_tuple)
+        if start_location_data and start_location_data.get('start_time'):
+            # Храним как unix-время: в мониторинге не нужен разбор строки
+            self.parent.update_user_state(user_id, 'start_time', int(start_location_data['start_time'].timestamp()))
+    
+    @staticmethod
+    def _optimized_route_from_db(route_data: Dict, orders: List[Order]) -> Optional[OptimizedRoute]:
+        """Собрать OptimizedRoute из сохраненных точек маршрута (только для переданных заказов)"""
+        orders_by_number = {o.order_number: o for o in orders if o.order_number}
+        points = []
+        for point_data in route_data.get('route_points_data') or []:
+            order = orders_by_number.get(point_data.get('order_number'))
+            if order is None:
+                # Подтвержденные заказы в оптимизированный маршрут не входят
+                continue
+            points.append(RoutePoint(
+                order=order,
+                estimated_arrival=datetime.fromisoformat(point_data['estimated_arrival']),
+                distance_from_previous=point_data.get('distance_from_previous') or 0.0,
+                time_from_previous=point_data.get('time_from_previous') or 0.0,
+            ))
+        if not points:
+            return None
+        estimated_completion = route_data.get('estimated_completion')
+        return OptimizedRoute(
+            points=points,
+            total_distance=route_data.get('total_distance') or 0.0,
+            total_time=route_data.get('total_time') or 0.0,
+            estimated_completion=(datetime.fromisoformat(estimated_completion) if estimated_completion
+                                  else points[-1].estimated_arrival),
+        )
+    
+    @staticmethod
+    def _route_signature(orders: List[Order], confirmed_order_numbers: frozenset, start_location_coords,
+                         start_address: Optional[str], start_datetime: datetime, user_settings,
+                         manual_call_times: Dict[str, datetime]) -> str:
+        """Подпись входных данных оптимизации (заказы, подтвержденные, точка и время старта,
+        настройки, ручные времена звонков)"""
+        payload = json.dumps(
+            [
+                # Координаты не входят в подпись: они производны от адреса и дописываются при геокодировании
+                sorted(
+                    (o.model_dump(mode='json', exclude=_SIGNATURE_EXCLUDED_FIELDS) for o in orders),
+                    key=lambda od: str(od.get('order_number'))
+                ),
+                sorted(confirmed_order_numbers),
+                start_location_coords,
+                start_address,
+                start_datetime.isoformat(),
+                user_settings.model_dump(),
+                sorted((str(number), call_time.isoformat()) for number, call_time in manual_call_times.items()),
+            ],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    
+    def _geocode_progress_ticker(self, status: _StatusThrottler, geocode_progress: Dict[str, int],
+                                 done: threading.Event):
+        """Периодически показывать в статусе счетчик геокодирования, пока не выставлен done"""
+        while not done.wait(PROGRESS_TICK_INTERVAL):
+            total = geocode_progress['total']
+            if total:
+                status.update(
+                    f"🔄 <b>Оптимизация маршрута</b>\n\n✅ Точка старта определена\n⏳ Геокодирую адреса ({geocode_progress['done']}/{total})..."
+                )
+            else:
+                status.flush()
+    
+    def _orders_from_db(self, orders_data: List[Dict]) -> List[Order]:
+        """Преобразовать словари заказов из БД в Order, пропуская некорректные"""
+        orders = []
+        for order_data in orders_data:
+            try:
+                # Строки времени преобразуются обратно в time объекты
+                order = Order.from_db(order_data)
+                
+                # DEBUG: Логируем manual_arrival_time СРАЗУ после создания Order
+                logger.info(f"📦 DEBUG: Заказ #{order.order_number} создан из БД, manual_arrival_time = {order.manual_arrival_time} (тип: {type(order.manual_arrival_time)})")
+                orders.append(order)
+            except Exception as e:
+                logger.error(f"Ошибка создания Order из данных: {e}, данные: {order_data}", exc_info=True)
+        return orders
+    
     def _build_order_delivered_keyboard(self, order_number: str):
         """Строит inline‑клавиатуру для одного заказа: кнопка "✅ Доставлен"."""
-        from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-
         markup = InlineKeyboardMarkup()
         callback_data = f"route_delivered_{order_number}"
         # callback_data ограничено 64 символами, наш формат безопасен
         markup.add(InlineKeyboardButton("✅ Доставлен", callback_data=callback_data))
         return markup
 
+    def _cached_route_summary(self, user_id: int, today: date, route_points_data: List[Dict],
+                              orders_dict: Dict[str, Dict], start_location_data: Dict, maps_service,
+                              order_obj_cache: Optional[Dict[str, Order]] = None) -> List[Dict]:
+        """_format_route_summary с кэшем: пересчет только при изменении точек, заказов,
+        точки старта или статусов звонков"""
+        call_status_version = self.parent.db_service.get_call_status_version(user_id, today)
+        key = self._route_summary_key(route_points_data, orders_dict, start_location_data, call_status_version)
+        cached = self._formatted_routes.get(user_id)
+        if cached and cached[0] == today and cached[1] == key:
+            return cached[2]
+        
+        route_summary = self._format_route_summary(user_id, route_points_data, orders_dict, start_location_data,
+                                                   maps_service, order_obj_cache=order_obj_cache)
+        if route_summary:
+            self._formatted_routes[user_id] = (today, key, route_summary)
+        return route_summary
+    
+    @staticmethod
+    def _route_summary_key(route_points_data: List[Dict], orders_dict: Dict[str, Dict],
+                           start_location_data: Dict, call_status_version: tuple) -> str:
+        """Ключ входных данных форматирования маршрута"""
+        route_orders = [
+            {k: v for k, v in orders_dict[pd['order_number']].items() if k not in _SIGNATURE_EXCLUDED_FIELDS}
+            for pd in route_points_data if pd.get('order_number') in orders_dict
+        ]
+        payload = json.dumps(
+            # Координаты заказов не входят в ключ: они производны от адреса
+            [route_points_data, route_orders, start_location_data, call_status_version],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
     def _format_route_summary(self, user_id: int, route_points_data: List[Dict], orders_dict: Dict[str, Dict], 
                               start_location_data: Dict, maps_service, start_index: int = 1, 
-                              prev_latlon: tuple = None, prev_gid: str = None) -> List[Dict]:
+                              prev_latlon: tuple = None, prev_gid: str = None,
+                              order_obj_cache: Optional[Dict[str, Order]] = None) -> List[Dict]:
         """
         Форматирует маршрут из структурированных данных.
         
         Args:
             start_index: Начальный номер для нумерации заказов (по умолчанию 1)
+            order_obj_cache: Уже построенные Order по номеру заказа (дополняется на промахах)
         
         Returns:
             Список словарей:
@@ -1170,15 +1483,32 @@ class RouteHandlers:
         # ВАЖНО: выводим маршрут в хронологическом порядке по фактическому времени прибытия,
         # а не в "сыром" порядке вершин из оптимизатора. Это делает план понятным для человека.
         try:
-            sorted_points = sorted(
-                route_points_data,
-                key=lambda pd: datetime.fromisoformat(pd.get("estimated_arrival"))
-            )
+            sorted_points = _sort_route_points(route_points_data)
         except Exception as e:
             logger.error(f"Ошибка сортировки точек маршрута по времени прибытия: {e}", exc_info=True)
             sorted_points = route_points_data
 
-        for i, point_data in enumerate(sorted_points, start_index):
+        # Парсим время точек один раз: оно нужно и для статусов звонков, и для вывода
+        point_times = []
+        for pd in sorted_points:
+            try:
+                point_times.append((datetime.fromisoformat(pd['estimated_arrival']), datetime.fromisoformat(pd['call_time'])))
+            except Exception as e:
+                logger.error(f"Ошибка парсинга времени: {e}", exc_info=True)
+                point_times.append(None)
+
+        # Статусы звонков по всем точкам - одним запросом
+        call_statuses = {}
+        try:
+            call_statuses = self.parent.db_service.get_call_statuses(
+                user_id,
+                [pd['order_number'] for pd in sorted_points if pd.get('order_number')],
+                list({times[0].date() for times in point_times if times})
+            )
+        except Exception as e:
+            logger.debug(f"Ошибка получения статусов звонков: {e}")
+
+        for i, (point_data, times) in enumerate(zip(sorted_points, point_times), start_index):
             order_number = point_data.get('order_number')
             if not order_number:
                 continue
@@ -1192,20 +1522,20 @@ class RouteHandlers:
                 logger.debug(f"Пропускаем доставленный заказ {order_number} в маршруте")
                 continue
             
-            # Преобразуем данные заказа
-            try:
-                order = Order(**order_data)
-            except Exception as e:
-                logger.error(f"Ошибка создания Order из данных: {e}", exc_info=True)
-                continue
+            # Преобразуем данные заказа (повторно не валидируем уже построенные)
+            order = order_obj_cache.get(order_number) if order_obj_cache is not None else None
+            if order is None:
+                try:
+                    order = Order(**order_data)
+                except Exception as e:
+                    logger.error(f"Ошибка создания Order из данных: {e}", exc_info=True)
+                    continue
+                if order_obj_cache is not None:
+                    order_obj_cache[order_number] = order
             
-            # Парсим время
-            try:
-                estimated_arrival = datetime.fromisoformat(point_data['estimated_arrival'])
-                call_time = datetime.fromisoformat(point_data['call_time'])
-            except Exception as e:
-                logger.error(f"Ошибка парсинга времени: {e}", exc_info=True)
+            if times is None:
                 continue
+            estimated_arrival, call_time = times
             
             # Определяем заголовок заказа
             if order.order_number:
@@ -1239,18 +1569,22 @@ class RouteHandlers:
             if order.delivery_time_window:
                 arrival_status = ""
                 if order.delivery_time_start and order.delivery_time_end:
-                    today_date = estimated_arrival.date()
-                    window_start = datetime.combine(today_date, order.delivery_time_start)
-                    window_end = datetime.combine(today_date, order.delivery_time_end)
-
-                    if estimated_arrival < window_start:
-                        arrival_status = f" ⚠️ Раньше окна"
-                    elif estimated_arrival > window_end:
-                        arrival_status = f" 🚨 Позже окна"
+                    # Сравниваем в минутах от начала дня (с той же точностью, что и выводим)
+                    window_start, window_end = order.get_time_window_minutes()
+                    arrival_minutes = estimated_arrival.hour * 60 + estimated_arrival.minute
+
+                    if arrival_minutes < window_start:
+                        arrival_status = " ⚠️ Раньше окна"
+                    elif arrival_minutes > window_end:
+                        arrival_status = " 🚨 Позже окна"
                     else:
-                        arrival_status = f" ✅"
+                        arrival_status = " ✅"
                 
-                order_info.append(f"🕐 {order.delivery_time_window} | Прибытие: {estimated_arrival.strftime('%H:%M')}{arrival_status}")
+                order_info.append(_ROUTE_ARRIVAL_TEMPLATE.format(
+                    window=order.delivery_time_window,
+                    arrival=estimated_arrival.strftime('%H:%M'),
+                    status=arrival_status
+                ))
 
             # Детали доставки (компактно)
             delivery_details = []
@@ -1262,26 +1596,20 @@ class RouteHandlers:
                 order_info.append(" | ".join(delivery_details))
             
             # Проверяем статус звонка
-            call_status_text = f"📞 Звонок: {call_time.strftime('%H:%M')}"
-            try:
-                with get_db_session() as session:
-                    call_status = session.query(CallStatusDB).filter(
-                        CallStatusDB.order_number == order.order_number,
-                        CallStatusDB.call_date == estimated_arrival.date()
-                    ).first()
-                    if call_status:
-                        if call_status.status == "failed":
-                            call_status_text = "🔴 НЕДОЗВОН"
-                        elif call_status.status == "confirmed":
-                            call_status_text = f"✅ Звонок: {call_time.strftime('%H:%M')}"
-            except Exception as e:
-                logger.debug(f"Ошибка получения статуса звонка: {e}")
+            call_status = call_statuses.get((order.order_number, estimated_arrival.date()))
+            if call_status == "failed":
+                call_status_text = "🔴 НЕДОЗВОН"
+            elif call_status == "confirmed":
+                call_status_text = f"✅ Звонок: {call_time.strftime('%H:%M')}"
+            else:
+                call_status_text = f"📞 Звонок: {call_time.strftime('%H:%M')}"
             
             # Время звонка и маршрут (компактно)
-            route_info = [call_status_text]
-            route_info.append(f"📏 {point_data.get('distance_from_previous', 0):.1f} км")
-            route_info.append(f"⏱️ {point_data.get('time_from_previous', 0):.0f} мин")
-            order_info.append(" | ".join(route_info))
+            order_info.append(_ROUTE_LEG_TEMPLATE.format(
+                call=call_status_text,
+                distance=point_data.get('distance_from_previous', 0),
+                minutes=point_data.get('time_from_previous', 0)
+            ))
 
             # Ссылки на карты (компактно)
             if order.latitude and order.longitude and prev_latlon:
@@ -1295,15 +1623,12 @@ class RouteHandlers:
                 )
                 point_links = maps_service.build_point_links(order.latitude, order.longitude, order.gis_id)
 
-                order_info.append(
-                    "🔗 <a href=\"{dg}\">Маршрут 2ГИС</a> | <a href=\"{ya}\">Яндекс</a> | "
-                    "<a href=\"{pdg}\">Точка 2ГИС</a> | <a href=\"{pya}\">Яндекс</a>".format(
-                        dg=links["2gis"],
-                        ya=links["yandex"],
-                        pdg=point_links["2gis"],
-                        pya=point_links["yandex"]
-                    )
-                )
+                order_info.append(_ROUTE_LINKS_TEMPLATE.format(
+                    dg=links["2gis"],
+                    ya=links["yandex"],
+                    pdg=point_links["2gis"],
+                    pya=point_links["yandex"]
+                ))
 
                 # Обновляем prev_latlon для следующей точки
                 prev_latlon = (order.latitude, order.longitude)
@@ -1358,24 +1683,24 @@ class RouteHandlers:
         # Загружаем точку старта
         start_location_data = self.parent.db_service.get_start_location(user_id, today) or {}
         
-        # Форматируем маршрут только для активных заказов
-        maps_service = MapsService()
-        route_summary = self._format_route_summary(user_id, active_route_points_data, orders_dict, start_location_data, maps_service)
+        # Форматируем маршрут только для активных заказов (или берем готовый, если данные не менялись)
+        maps_service = self.parent.maps_service
+        route_summary = self._cached_route_summary(user_id, today, active_route_points_data, orders_dict,
+                                                   start_location_data, maps_service)
         
         if not route_summary:
             self.bot.reply_to(message, "❌ Не удалось сформировать маршрут", reply_markup=self.parent._route_menu_markup())
             return
         
-        # Отправляем маршрут по частям (по 3 заказа в сообщении) - БЕЗ кнопок
+        # Отправляем маршрут минимальным числом сообщений (в пределах лимита Telegram).
+        # Отправка последовательная: параллельные запросы не гарантируют порядок сообщений в чате
         text_header = "<b>🗺️ Маршрут доставки</b>\n\n"
+        chunks = _pack_messages(text_header, [item["text"] for item in route_summary])
         
-        # Первое сообщение с заголовком и первыми заказами
-        first_chunk = text_header + "\n\n".join(item["text"] for item in route_summary[:3])
-        self.bot.reply_to(message, first_chunk, parse_mode='HTML', reply_markup=self.parent._route_menu_markup(), disable_web_page_preview=True)
+        # Первое сообщение с заголовком и клавиатурой
+        self.bot.reply_to(message, chunks[0], parse_mode='HTML', reply_markup=self.parent._route_menu_markup(), disable_web_page_preview=True)
         
-        # Остальные заказы по 5 в сообщении
-        for i in range(3, len(route_summary), 5):
-            chunk = "\n\n".join(item["text"] for item in route_summary[i:i+5])
+        for chunk in chunks[1:]:
             self.bot.send_message(message.chat.id, chunk, parse_mode='HTML', disable_web_page_preview=True)
     
     def handle_show_calls(self, message):
@@ -1395,8 +1720,17 @@ class RouteHandlers:
             self.bot.reply_to(message, "❌ График звонков не найден", reply_markup=self.parent._route_menu_markup())
             return
         
-        # Формируем текст с графиком звонков
-        text = "<b>📞 График звонков</b>\n\n"
+        # Статусы звонков по всему графику - одним запросом
+        call_statuses = {}
+        try:
+            call_statuses = self.parent.db_service.get_call_statuses(
+                user_id, [cd['order_number'] for cd in call_schedule if cd.get('order_number')], [today]
+            )
+        except Exception as e:
+            logger.debug(f"Ошибка получения статусов звонков: {e}")
+        
+        # Формируем текст с графиком звонков (фрагменты собираем в список и склеиваем один раз)
+        parts = ["<b>📞 График звонков</b>\n\n"]
         
         for i, call_data in enumerate(call_schedule, 1):
             order_number = call_data.get('order_number', 'N/A')
@@ -1407,26 +1741,21 @@ class RouteHandlers:
             
             # Проверяем статус звонка
             call_status = "⏰"
-            try:
-                with get_db_session() as session:
-                    status_obj = session.query(CallStatusDB).filter(
-                        CallStatusDB.order_number == order_number,
-                        CallStatusDB.call_date == today
-                    ).first()
-                    if status_obj:
-                        if status_obj.status == "confirmed":
-                            call_status = "✅"
-                        elif status_obj.status == "failed":
-                            call_status = "🔴"
-            except Exception as e:
-                logger.debug(f"Ошибка получения статуса звонка: {e}")
+            status = call_statuses.get((order_number, today))
+            if status == "confirmed":
+                call_status = "✅"
+            elif status == "failed":
+                call_status = "🔴"
             
-            text += f"{i}. {call_status} <b>№{order_number}</b>"
+            parts.append(f"{i}. {call_status} <b>№{order_number}</b>")
             if customer_name:
-                text += f" ({customer_name})"
-            text += f"\n   📞 {phone}\n"
-            text += f"   🕐 Звонок: {call_time.strftime('%H:%M')}\n"
-            text += f"   🚗 Прибытие: {arrival_time.strftime('%H:%M')}\n\n"
+                parts.append(f" ({customer_name})")
+            parts.append(
+                f"\n   📞 {phone}\n"
+                f"   🕐 Звонок: {call_time.strftime('%H:%M')}\n"
+                f"   🚗 Прибытие: {arrival_time.strftime('%H:%M')}\n\n"
+            )
+        text = "".join(parts)
         
         # Отправляем по частям если слишком длинное
         if len(text) > 4096:
@@ -1451,7 +1780,6 @@ class RouteHandlers:
             manual_times_list = []
             manual_count = 0
             with get_db_session() as session:
-                from sqlalchemy import and_
                 manual_calls = session.query(CallStatusDB).filter(
                     and_(
                         CallStatusDB.user_id == user_id,
@@ -1476,7 +1804,6 @@ class RouteHandlers:
                 manual_times_text += f" и еще {manual_count - 5}"
             
             # Создаем клавиатуру с подтверждением
-            from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
             markup = InlineKeyboardMarkup()
             markup.add(InlineKeyboardButton(
                 "✅ Да, пересчитать",
@@ -1512,9 +1839,6 @@ class RouteHandlers:
     
     def handle_recalculate_without_manual(self, call):
         """Пересчет маршрута без учета ручных времен (перенос в комментарии)"""
-        # Явно импортируем для избежания проблем с областью видимости
-        from src.database.connection import get_db_session
-        
         user_id = call.from_user.id
         today = date.today()
         
@@ -1523,11 +1847,8 @@ class RouteHandlers:
             
             # Получаем все заказы с ручными временами
             with get_db_session() as session:
-                from sqlalchemy import and_
-                from src.models.order import OrderDB
                 
                 # Находим все call_status с ручными временами (прибытия или звонка)
-                from sqlalchemy import or_
                 manual_statuses = session.query(CallStatusDB).filter(
                     and_(
                         CallStatusDB.user_id == user_id,
@@ -1654,7 +1975,6 @@ class RouteHandlers:
         user_id = message.from_user.id
         
         # Создаем inline клавиатуру с подтверждением
-        from telebot import types
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("✅ Да, сбросить", callback_data="reset_day_confirm"))
         markup.add(types.InlineKeyboardButton("❌ Отмена", callback_data="reset_day_cancel"))
@@ -1681,6 +2001,8 @@ class RouteHandlers:
         try:
             # Удаляем все данные за сегодня
             self.parent.db_service.delete_all_data_by_date(user_id, today)
+            self.parent.invalidate_route_cache(user_id)
+            self._formatted_routes.pop(user_id, None)
             
             # Очищаем состояние пользователя
             self.parent.clear_user_state(user_id)
@@ -1715,8 +2037,8 @@ class RouteHandlers:
         user_id = message.from_user.id
         today = date.today()
         
-        # Загружаем маршрут из БД
-        route_data = self.parent.db_service.get_route_data(user_id, today)
+        # Загружаем маршрут и заказы из БД одним обращением
+        route_data, orders_data = self.parent.db_service.get_route_and_orders(user_id, today)
         if not route_data:
             self.bot.reply_to(message, "❌ Маршрут не оптимизирован. Используйте кнопку ▶️ Оптимизировать", reply_markup=self.parent._route_menu_markup())
             return
@@ -1728,16 +2050,12 @@ class RouteHandlers:
         
         # Сортируем по времени прибытия и берем первый (ближайший) заказ
         try:
-            sorted_points = sorted(
-                route_points_data,
-                key=lambda pd: datetime.fromisoformat(pd.get("estimated_arrival"))
-            )
+            sorted_points = _sort_route_points(route_points_data)
         except Exception as e:
             logger.error(f"Ошибка сортировки точек маршрута: {e}", exc_info=True)
             sorted_points = route_points_data
         
         # Фильтруем только активные (не доставленные) заказы
-        orders_data = self.parent.db_service.get_today_orders(user_id)
         active_order_numbers = {od.get('order_number') for od in orders_data if od.get('status', 'pending') != 'delivered'}
         
         active_points = [p for p in sorted_points if p.get('order_number') in active_order_numbers]
@@ -1747,15 +2065,15 @@ class RouteHandlers:
             return
         
         # Показываем первый заказ (индекс 0) - отправляем новое сообщение
-        self._show_order_at_index(message.chat.id, user_id, active_points, 0, None)
+        self._show_order_at_index(message.chat.id, user_id, active_points, 0, None, orders_data=orders_data)
     
     def handle_show_order_by_index(self, call, index: int):
         """Показать заказ по индексу (для навигации)"""
         user_id = call.from_user.id
         today = date.today()
         
-        # Загружаем маршрут из БД
-        route_data = self.parent.db_service.get_route_data(user_id, today)
+        # Загружаем маршрут и заказы из БД одним обращением
+        route_data, orders_data = self.parent.db_service.get_route_and_orders(user_id, today)
         if not route_data:
             self.bot.answer_callback_query(call.id, "❌ Маршрут не найден")
             return
@@ -1767,15 +2085,11 @@ class RouteHandlers:
         
         # Сортируем и фильтруем активные заказы
         try:
-            sorted_points = sorted(
-                route_points_data,
-                key=lambda pd: datetime.fromisoformat(pd.get("estimated_arrival"))
-            )
+            sorted_points = _sort_route_points(route_points_data)
         except Exception as e:
             logger.error(f"Ошибка сортировки точек маршрута: {e}", exc_info=True)
             sorted_points = route_points_data
         
-        orders_data = self.parent.db_service.get_today_orders(user_id)
         active_order_numbers = {od.get('order_number') for od in orders_data if od.get('status', 'pending') != 'delivered'}
         active_points = [p for p in sorted_points if p.get('order_number') in active_order_numbers]
         
@@ -1790,10 +2104,15 @@ class RouteHandlers:
             index = len(active_points) - 1
         
         self.bot.answer_callback_query(call.id)
-        self._show_order_at_index(call.message.chat.id, user_id, active_points, index, call.message.message_id)
+        self._show_order_at_index(call.message.chat.id, user_id, active_points, index, call.message.message_id, orders_data=orders_data)
     
-    def _show_order_at_index(self, chat_id: int, user_id: int, active_points: List[Dict], index: int, message_id: int = None):
-        """Показать заказ по индексу с навигацией"""
+    def _show_order_at_index(self, chat_id: int, user_id: int, active_points: List[Dict], index: int, message_id: int = None,
+                             orders_data: List[Dict] = None):
+        """Показать заказ по индексу с навигацией
+        
+        Args:
+            orders_data: Уже загруженные заказы за сегодня (если нет - загружаются из БД)
+        """
         today = date.today()
         
         if index < 0 or index >= len(active_points):
@@ -1805,7 +2124,8 @@ class RouteHandlers:
             return
         
         # Загружаем данные заказа
-        orders_data = self.parent.db_service.get_today_orders(user_id)
+        if orders_data is None:
+            orders_data = self.parent.db_service.get_today_orders(user_id)
         orders_dict = {od.get('order_number'): od for od in orders_data if od.get('order_number')}
         order_data = orders_dict.get(order_number)
         
@@ -1845,7 +2165,7 @@ class RouteHandlers:
             return
         
         # Форматируем один заказ с правильным порядковым номером (index + 1, так как нумерация с 1)
-        maps_service = MapsService()
+        maps_service = self.parent.maps_service
         route_summary = self._format_route_summary(user_id, [point_data], orders_dict, start_location_data, maps_service, start_index=index + 1, prev_latlon=prev_latlon, prev_gid=prev_gid)
         
         if not route_summary:
@@ -1853,58 +2173,131 @@ class RouteHandlers:
         
         order_text = route_summary[0]["text"]
         
-        # Создаем клавиатуру навигации
-        from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-        markup = InlineKeyboardMarkup()
-        
-        # Кнопки навигации
-        nav_buttons = []
-        if index > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️ Предыдущий", callback_data=f"current_order_prev_{index}"))
-        if index < len(active_points) - 1:
-            nav_buttons.append(InlineKeyboardButton("➡️ Следующий", callback_data=f"current_order_next_{index}"))
-        
-        if nav_buttons:
-            markup.row(*nav_buttons)
+        # Клавиатура навигации (JSON кэшируется по форме клавиатуры)
+        markup_json = _order_nav_markup_json(index, index < len(active_points) - 1, order_number)
         
-        # Кнопки действий
-        action_buttons = []
-        action_buttons.append(InlineKeyboardButton("✏️ Отредактировать", callback_data=f"route_edit_order_{order_number}"))
-        action_buttons.append(InlineKeyboardButton("✅ Доставлен", callback_data=f"route_delivered_{order_number}"))
-        markup.row(*action_buttons)
+        self._throttled_render(chat_id, message_id, order_text, markup_json)
+    
+    def _throttled_render(self, chat_id: int, message_id, order_text: str, markup_json: str):
+        """Отправить/отредактировать карточку заказа не чаще раза в секунду на чат.
         
+        Короткую задержку выжидаем на месте, при длинной - откладываем отрисовку,
+        оставляя только последнюю (быстрые нажатия ⬅️/➡️ схлопываются в одну правку).
+        Пока таймер отложенной отрисовки не сработал, все новые карточки идут через него,
+        иначе таймер затер бы более свежую карточку устаревшей.
+        """
+        with self._render_lock:
+            delay = self._chat_bucket.get(chat_id, 0.0) - time_module.monotonic()
+            already_pending = chat_id in self._pending_render
+            if delay > CHAT_THROTTLE_MAX_SLEEP or already_pending:
+                self._pending_render[chat_id] = (message_id, order_text, markup_json)
+                if not already_pending:
+                    timer = threading.Timer(delay, self._flush_pending_render, args=(chat_id,))
+                    timer.daemon = True
+                    timer.start()
+                return
+        if delay > 0:
+            time_module.sleep(delay)
+        self._render_order_message(chat_id, message_id, order_text, markup_json)
+    
+    def _flush_pending_render(self, chat_id: int):
+        """Отрисовать последнюю отложенную карточку заказа для чата"""
+        with self._render_lock:
+            pending = self._pending_render.pop(chat_id, None)
+        if not pending:
+            return
+        message_id, order_text, markup_json = pending
+        try:
+            self._render_order_message(chat_id, message_id, order_text, markup_json)
+        except Exception as e:
+            logger.error(f"Ошибка отложенной отрисовки заказа для чата {chat_id}: {e}", exc_info=True)
+    
+    def _render_order_message(self, chat_id: int, message_id, order_text: str, markup_json: str):
+        """Отправить или отредактировать сообщение с карточкой заказа"""
         # Отправляем или редактируем сообщение
         if message_id:
+            render_key = (chat_id, message_id)
+            last_text, last_markup_json = self._last_render.get(render_key, (None, None))
             try:
-                self.bot.edit_message_text(
-                    order_text,
-                    chat_id,
-                    message_id,
-                    parse_mode='HTML',
-                    reply_markup=markup,
-                    disable_web_page_preview=True
-                )
+                if order_text == last_text:
+                    # Текст не изменился - обновляем только клавиатуру (или ничего)
+                    if markup_json != last_markup_json:
+                        self.bot.edit_message_reply_markup(chat_id, message_id, reply_markup=markup_json)
+                else:
+                    self.bot.edit_message_text(
+                        order_text,
+                        chat_id,
+                        message_id,
+                        parse_mode='HTML',
+                        reply_markup=markup_json,
+                        disable_web_page_preview=True
+                    )
+                self._store_render(render_key, order_text, markup_json)
             except Exception as e:
                 logger.warning(f"Не удалось отредактировать сообщение: {e}")
                 # Если не удалось отредактировать, отправляем новое
-                self.bot.send_message(
+                self._last_render.pop(render_key, None)
+                sent = self.bot.send_message(
                     chat_id,
                     order_text,
                     parse_mode='HTML',
-                    reply_markup=markup,
+                    reply_markup=markup_json,
                     disable_web_page_preview=True
                 )
+                self._remember_render(chat_id, sent, order_text, markup_json)
         else:
-            self.bot.send_message(
+            sent = self.bot.send_message(
                 chat_id,
                 order_text,
                 parse_mode='HTML',
-                reply_markup=markup,
+                reply_markup=markup_json,
                 disable_web_page_preview=True
             )
+            self._remember_render(chat_id, sent, order_text, markup_json)
+        self._chat_bucket[chat_id] = time_module.monotonic() + CHAT_THROTTLE_INTERVAL
+    
+    def _remember_render(self, chat_id: int, sent_message, order_text: str, markup_json: str):
+        """Запомнить отрисованный текст и клавиатуру отправленного сообщения"""
+        message_id = getattr(sent_message, 'message_id', None)
+        if isinstance(message_id, int):
+            self._store_render((chat_id, message_id), order_text, markup_json)
+    
+    def _store_render(self, render_key: tuple, order_text: str, markup_json: str):
+        """Сохранить отрисовку в LRU, вытесняя самые старые карточки"""
+        with self._render_lock:
+            self._last_render[render_key] = (order_text, markup_json)
+            self._last_render.move_to_end(render_key)
+            if len(self._last_render) > LAST_RENDER_CACHE_SIZE:
+                self._last_render.popitem(last=False)
     
     # ==================== ОТМЕТКА ДОСТАВКИ ЗАКАЗА ====================
 
+    def _is_duplicate_delivery(self, user_id: int, order_number: str) -> bool:
+        """Проверить, было ли нажатие 'Доставлен' для заказа в последние секунды"""
+        key = (user_id, order_number)
+        now = time_module.monotonic()
+        with self._delivery_lock:
+            if now - self._recent_deliveries.get(key, float('-inf')) < DELIVERY_DEDUP_TTL:
+                return True
+            self._recent_deliveries[key] = now
+            # Периодически вычищаем устаревшие записи
+            if len(self._recent_deliveries) > 256:
+                self._recent_deliveries = {
+                    k: ts for k, ts in self._recent_deliveries.items()
+                    if now - ts < DELIVERY_DEDUP_TTL
+                }
+        return False
+
+    def _answer_callback_async(self, callback_query_id: str, text: str = None, **kwargs):
+        """Ответить на callback в фоне, не дожидаясь ответа Telegram"""
+        def _answer():
+            try:
+                self.bot.answer_callback_query(callback_query_id, text, **kwargs)
+            except Exception as e:
+                logger.warning(f"Не удалось ответить на callback {callback_query_id}: {e}")
+        
+        _CALLBACK_ACK_EXECUTOR.submit(_answer)
+
     def handle_mark_order_delivered(self, call):
         """Обработчик нажатия на кнопку 'Доставлен' в списке маршрута."""
         user_id = call.from_user.id
@@ -1913,18 +2306,22 @@ class RouteHandlers:
         try:
             data = call.data or ""
             # Формат callback_data: route_delivered_<order_number>
-            prefix = "route_delivered_"
-            if not data.startswith(prefix):
+            order_number = data.removeprefix("route_delivered_")
+            if order_number == data:
                 self.bot.answer_callback_query(call.id, "❌ Некорректные данные", show_alert=True)
                 return
 
-            order_number = data[len(prefix):]
             if not order_number:
                 self.bot.answer_callback_query(call.id, "❌ Не указан номер заказа", show_alert=True)
                 return
 
-            # Загружаем маршрут ДО обновления статуса, чтобы найти индекс текущего заказа
-            route_data = self.parent.db_service.get_route_data(user_id, today)
+            # Повторное нажатие (или повторная доставка update) - не обрабатываем заново
+            if self._is_duplicate_delivery(user_id, order_number):
+                self.bot.answer_callback_query(call.id, f"⏳ Заказ №{order_number} уже обрабатывается")
+                return
+
+            # Загружаем маршрут и заказы ДО обновления статуса, чтобы найти индекс текущего заказа
+            route_data, orders_data = self.parent.db_service.get_route_and_orders(user_id, today)
             if not route_data:
                 # Если маршрута нет, просто обновляем статус
                 updated = self.parent.db_service.update_order(
@@ -1941,18 +2338,15 @@ class RouteHandlers:
             
             route_points_data = route_data.get('route_points_data', [])
             try:
-                sorted_points = sorted(
-                    route_points_data,
-                    key=lambda pd: datetime.fromisoformat(pd.get("estimated_arrival"))
-                )
+                sorted_points = _sort_route_points(route_points_data)
             except Exception:
                 sorted_points = route_points_data
             
             # Находим индекс текущего заказа ДО обновления статуса
-            orders_data_before = self.parent.db_service.get_today_orders(user_id)
-            active_order_numbers_before = {od.get('order_number') for od in orders_data_before if od.get('status', 'pending') != 'delivered'}
+            active_order_numbers_before = {od.get('order_number') for od in orders_data if od.get('status', 'pending') != 'delivered'}
             active_points_before = [p for p in sorted_points if p.get('order_number') in active_order_numbers_before]
-            current_index = next((i for i, p in enumerate(active_points_before) if p.get('order_number') == order_number), None)
+            index_by_order = {p.get('order_number'): i for i, p in enumerate(active_points_before)}
+            current_index = index_by_order.get(order_number)
             
             # Обновляем статус заказа в БД
             updated = self.parent.db_service.update_order(
@@ -1970,13 +2364,14 @@ class RouteHandlers:
                 )
                 return
 
-            # Отвечаем на callback
-            self.bot.answer_callback_query(call.id, f"✅ Заказ №{order_number} отмечен доставленным")
+            # Отвечаем на callback параллельно с перерисовкой карточки
+            self._answer_callback_async(call.id, f"✅ Заказ №{order_number} отмечен доставленным")
             
-            # Загружаем активные заказы ПОСЛЕ обновления статуса
-            orders_data_after = self.parent.db_service.get_today_orders(user_id)
-            active_order_numbers_after = {od.get('order_number') for od in orders_data_after if od.get('status', 'pending') != 'delivered'}
-            active_points_after = [p for p in sorted_points if p.get('order_number') in active_order_numbers_after]
+            # Активные заказы ПОСЛЕ обновления статуса - без повторного запроса к БД
+            if current_index is not None:
+                active_points_after = active_points_before[:current_index] + active_points_before[current_index + 1:]
+            else:
+                active_points_after = active_points_before
             
             if active_points_after:
                 # Определяем, какой заказ показать
@@ -1991,23 +2386,34 @@ class RouteHandlers:
                     # Если не нашли индекс (не должно случиться), показываем первый
                     next_index = 0
                 
-                self._show_order_at_index(call.message.chat.id, user_id, active_points_after, next_index, call.message.message_id)
+                self._show_order_at_index(call.message.chat.id, user_id, active_points_after, next_index, call.message.message_id,
+                                          orders_data=orders_data)
             else:
                 # Больше нет активных заказов
+                self._last_render.pop((call.message.chat.id, call.message.message_id), None)
                 try:
-                    # Удаляем старое сообщение и отправляем новое с клавиатурой
-                    # (на случай, если исходное сообщение не имело reply_markup)
+                    # Превращаем карточку заказа в итоговое сообщение (один запрос).
+                    # ReplyKeyboard к редактированию не прикрепить - inline-кнопки просто убираются
                     try:
-                        self.bot.delete_message(call.message.chat.id, call.message.message_id)
-                    except:
-                        pass  # Игнорируем ошибку, если сообщение уже удалено
-                    
-                    self.bot.send_message(
-                        call.message.chat.id,
-                        "✅ Все заказы доставлены",
-                        parse_mode='HTML',
-                        reply_markup=self.parent._main_menu_markup(user_id)
-                    )
+                        self.bot.edit_message_text(
+                            "✅ Все заказы доставлены",
+                            call.message.chat.id,
+                            call.message.message_id,
+                            parse_mode='HTML'
+                        )
+                    except ApiTelegramException as edit_api_error:
+                        logger.warning(f"Не удалось отредактировать сообщение, отправляем новое: {edit_api_error}")
+                        try:
+                            self.bot.delete_message(call.message.chat.id, call.message.message_id)
+                        except ApiTelegramException:
+                            pass  # Игнорируем ошибку, если сообщение уже удалено
+                        
+                        self.bot.send_message(
+                            call.message.chat.id,
+                            "✅ Все заказы доставлены",
+                            parse_mode='HTML',
+                            reply_markup=self.parent._main_menu_markup(user_id)
+                        )
                 except Exception as edit_error:
                     logger.error(f"Ошибка при обновлении сообщения после доставки всех заказов: {edit_error}")
                     # Пытаемся хотя бы ответить на callback
@@ -2031,12 +2437,10 @@ class RouteHandlers:
         try:
             data = call.data or ""
             # Формат callback_data: route_edit_order_<order_number>
-            prefix = "route_edit_order_"
-            if not data.startswith(prefix):
+            order_number = data.removeprefix("route_edit_order_")
+            if order_number == data:
                 self.bot.answer_callback_query(call.id, "❌ Некорректные данные", show_alert=True)
                 return
-            
-            order_number = data[len(prefix):]
             if not order_number:
                 self.bot.answer_callback_query(call.id, "❌ Не указан номер заказа", show_alert=True)
                 return
@@ -2,10 +2,121 @@
 Обработчики для работы с настройками пользователя
 """
 import logging
+import re
+from functools import lru_cache
 from telebot import types
 
 logger = logging.getLogger(__name__)
 
+# Целое число (с пробелами по краям): некорректный ввод отсекается без исключения
+_INT_RE = re.compile(r'^\s*-?\d+\s*$')
+
+# Параметры настроек для меню: поле модели, заголовок, описание, диапазон, единицы
+_SETTING_META = {
+    'call_advance': {
+        'name': 'call_advance_minutes',
+        'title': '⏱️ Время звонка до приезда',
+        'description': 'За сколько минут до приезда звонить клиенту',
+        'min': 1,
+        'max': 60,
+        'unit': 'минут'
+    },
+    'call_retry': {
+        'name': 'call_retry_interval_minutes',
+        'title': '🔄 Интервал повторных звонков',
+        'description': 'Через сколько минут повторить звонок после отклонения',
+        'min': 1,
+        'max': 15,
+        'unit': 'минут'
+    },
+    'call_attempts': {
+        'name': 'call_max_attempts',
+        'title': '📞 Максимум попыток дозвона',
+        'description': 'Сколько раз пытаться дозвониться',
+        'min': 1,
+        'max': 10,
+        'unit': 'раз'
+    },
+    'service_time': {
+        'name': 'service_time_minutes',
+        'title': '⏰ Время на точке',
+        'description': 'Сколько времени тратится на доставку одного заказа',
+        'min': 1,
+        'max': 60,
+        'unit': 'минут'
+    },
+    'parking_time': {
+        'name': 'parking_time_minutes',
+        'title': '🚗 Время на парковку',
+        'description': 'Время на парковку и подход к подъезду',
+        'min': 0,
+        'max': 30,
+        'unit': 'минут'
+    },
+    'traffic_interval': {
+        'name': 'traffic_check_interval_minutes',
+        'title': '🚦 Интервал проверки пробок',
+        'description': 'Как часто проверять изменения в пробках',
+        'min': 1,
+        'max': 60,
+        'unit': 'минут'
+    },
+    'traffic_threshold': {
+        'name': 'traffic_threshold_percent',
+        'title': '⚠️ Порог уведомлений о пробках',
+        'description': 'При каком увеличении времени уведомлять',
+        'min': 10,
+        'max': 200,
+        'unit': '%'
+    },
+}
+
+
+@lru_cache(maxsize=1)
+def _settings_menu_markup_json() -> str:
+    """JSON инлайн-клавиатуры меню настроек (статичная)"""
+    markup = types.InlineKeyboardMarkup(row_width=1)
+    markup.add(
+        types.InlineKeyboardButton("📲 Учетные данные ШефМаркет", callback_data="settings_chefmarket_creds"),
+        types.InlineKeyboardButton("⏱️ Время звонка до приезда", callback_data="settings_call_advance"),
+        types.InlineKeyboardButton("🔄 Интервал повторных звонков", callback_data="settings_call_retry"),
+        types.InlineKeyboardButton("📞 Макс. попыток дозвона", callback_data="settings_call_attempts"),
+        types.InlineKeyboardButton("⏰ Время на точке", callback_data="settings_service_time"),
+        types.InlineKeyboardButton("🚗 Время на парковку", callback_data="settings_parking_time"),
+        types.InlineKeyboardButton("🚦 Интервал проверки пробок", callback_data="settings_traffic_interval"),
+        types.InlineKeyboardButton("⚠️ Порог уведомлений о пробках", callback_data="settings_traffic_threshold"),
+        types.InlineKeyboardButton("🔄 Сбросить к умолчанию", callback_data="settings_reset"),
+        types.InlineKeyboardButton("🗑️ Сбросить день", callback_data="settings_reset_day"),
+        types.InlineKeyboardButton("⬅️ Назад", callback_data="settings_back")
+    )
+    return markup.to_json()
+
+
+@lru_cache(maxsize=2)
+def _chefmarket_menu_markup_json(has_creds: bool) -> str:
+    """JSON клавиатуры меню учетных данных ШефМаркет (с данными и без)"""
+    markup = types.InlineKeyboardMarkup(row_width=1)
+    if has_creds:
+        markup.add(
+            types.InlineKeyboardButton("🔄 Обновить данные", callback_data="chefmarket_update_creds"),
+            types.InlineKeyboardButton("🗑️ Удалить данные", callback_data="chefmarket_delete_creds"),
+            types.InlineKeyboardButton("⬅️ Назад к настройкам", callback_data="chefmarket_back_to_settings")
+        )
+    else:
+        markup.add(
+            types.InlineKeyboardButton("➕ Добавить данные", callback_data="chefmarket_add_creds"),
+            types.InlineKeyboardButton("⬅️ Назад к настройкам", callback_data="chefmarket_back_to_settings")
+        )
+    return markup.to_json()
+
+
+@lru_cache(maxsize=1)
+def _cancel_markup_json() -> str:
+    """JSON клавиатуры с кнопкой отмены ввода значения"""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row("❌ Отмена")
+    return markup.to_json()
+
 
 class SettingsHandlers:
     """Обработчики настроек"""
@@ -13,6 +124,13 @@ class SettingsHandlers:
     def __init__(self, bot_instance):
         self.bot = bot_instance.bot
         self.parent = bot_instance
+        # Callback-и с фиксированным callback_data: data -> обработчик
+        self._callback_dispatch = {
+            "settings_back": self.handle_settings_back,
+            "settings_reset": self.handle_settings_reset,
+            "settings_reset_day": self.handle_reset_day_from_settings,
+            "settings_chefmarket_creds": self.handle_chefmarket_credentials_menu,
+        }
     
     def register(self):
         """Регистрация обработчиков"""
@@ -23,14 +141,9 @@ class SettingsHandlers:
         """Обработка callback запросов для настроек"""
         callback_data = call.data
         
-        if callback_data == "settings_back":
-            self.handle_settings_back(call)
-        elif callback_data == "settings_reset":
-            self.handle_settings_reset(call)
-        elif callback_data == "settings_reset_day":
-            self.handle_reset_day_from_settings(call)
-        elif callback_data == "settings_chefmarket_creds":
-            self.handle_chefmarket_credentials_menu(call)
+        handler = self._callback_dispatch.get(callback_data)
+        if handler:
+            handler(call)
         else:
             # Обработка конкретной настройки
             setting_name = callback_data.replace("settings_", "")
@@ -39,10 +152,8 @@ class SettingsHandlers:
     def show_settings_menu(self, message):
         """Показать меню настроек"""
         user_id = message.from_user.id
-        settings = self.parent.settings_service.get_settings(user_id)
-        
-        # Проверяем наличие учетных данных ШефМаркет
-        has_chefmarket_creds = self.parent.credentials_service.has_credentials(user_id, "chefmarket")
+        # Настройки и наличие учетных данных ШефМаркет - одним обращением
+        settings, has_chefmarket_creds = self.parent.settings_service.get_settings_bundle(user_id, "chefmarket")
         chefmarket_status = "✅ Настроено" if has_chefmarket_creds else "❌ Не настроено"
         
         # Формируем текст с текущими настройками
@@ -63,119 +174,37 @@ class SettingsHandlers:
             "Выберите параметр для изменения:"
         )
         
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        markup.add(
-            types.InlineKeyboardButton("📲 Учетные данные ШефМаркет", callback_data="settings_chefmarket_creds"),
-            types.InlineKeyboardButton("⏱️ Время звонка до приезда", callback_data="settings_call_advance"),
-            types.InlineKeyboardButton("🔄 Интервал повторных звонков", callback_data="settings_call_retry"),
-            types.InlineKeyboardButton("📞 Макс. попыток дозвона", callback_data="settings_call_attempts"),
-            types.InlineKeyboardButton("⏰ Время на точке", callback_data="settings_service_time"),
-            types.InlineKeyboardButton("🚗 Время на парковку", callback_data="settings_parking_time"),
-            types.InlineKeyboardButton("🚦 Интервал проверки пробок", callback_data="settings_traffic_interval"),
-            types.InlineKeyboardButton("⚠️ Порог уведомлений о пробках", callback_data="settings_traffic_threshold"),
-            types.InlineKeyboardButton("🔄 Сбросить к умолчанию", callback_data="settings_reset"),
-            types.InlineKeyboardButton("🗑️ Сбросить день", callback_data="settings_reset_day"),
-            types.InlineKeyboardButton("⬅️ Назад", callback_data="settings_back")
-        )
-        
-        self.bot.reply_to(message, text, parse_mode='HTML', reply_markup=markup)
+        self.bot.reply_to(message, text, parse_mode='HTML', reply_markup=_settings_menu_markup_json())
     
     def handle_setting_update(self, call, setting_name: str):
         """Обработка запроса на изменение настройки"""
         user_id = call.from_user.id
         
-        # Описания и текущие значения
-        settings = self.parent.settings_service.get_settings(user_id)
-        setting_info = {
-            'call_advance': {
-                'name': 'call_advance_minutes',
-                'title': '⏱️ Время звонка до приезда',
-                'description': 'За сколько минут до приезда звонить клиенту',
-                'current': settings.call_advance_minutes,
-                'min': 1,
-                'max': 60,
-                'unit': 'минут'
-            },
-            'call_retry': {
-                'name': 'call_retry_interval_minutes',
-                'title': '🔄 Интервал повторных звонков',
-                'description': 'Через сколько минут повторить звонок после отклонения',
-                'current': settings.call_retry_interval_minutes,
-                'min': 1,
-                'max': 15,
-                'unit': 'минут'
-            },
-            'call_attempts': {
-                'name': 'call_max_attempts',
-                'title': '📞 Максимум попыток дозвона',
-                'description': 'Сколько раз пытаться дозвониться',
-                'current': settings.call_max_attempts,
-                'min': 1,
-                'max': 10,
-                'unit': 'раз'
-            },
-            'service_time': {
-                'name': 'service_time_minutes',
-                'title': '⏰ Время на точке',
-                'description': 'Сколько времени тратится на доставку одного заказа',
-                'current': settings.service_time_minutes,
-                'min': 1,
-                'max': 60,
-                'unit': 'минут'
-            },
-            'parking_time': {
-                'name': 'parking_time_minutes',
-                'title': '🚗 Время на парковку',
-                'description': 'Время на парковку и подход к подъезду',
-                'current': settings.parking_time_minutes,
-                'min': 0,
-                'max': 30,
-                'unit': 'минут'
-            },
-            'traffic_interval': {
-                'name': 'traffic_check_interval_minutes',
-                'title': '🚦 Интервал проверки пробок',
-                'description': 'Как часто проверять изменения в пробках',
-                'current': settings.traffic_check_interval_minutes,
-                'min': 1,
-                'max': 60,
-                'unit': 'минут'
-            },
-            'traffic_threshold': {
-                'name': 'traffic_threshold_percent',
-                'title': '⚠️ Порог уведомлений о пробках',
-                'description': 'При каком увеличении времени уведомлять',
-                'current': settings.traffic_threshold_percent,
-                'min': 10,
-                'max': 200,
-                'unit': '%'
-            }
-        }
-        
-        info = setting_info.get(setting_name)
+        info = _SETTING_META.get(setting_name)
         if not info:
             self.bot.answer_callback_query(call.id, "❌ Неизвестная настройка")
             return
+        # Отвечаем на callback до обращения к настройкам, чтобы у кнопки не крутились часики
+        self.bot.answer_callback_query(call.id)
+        current = getattr(self.parent.settings_service.get_settings(user_id), info['name'])
         
         # Сохраняем информацию о текущей настройке в состоянии
-        self.parent.update_user_state(user_id, 'state', 'waiting_for_setting_value')
-        self.parent.update_user_state(user_id, 'pending_setting_name', info['name'])
-        self.parent.update_user_state(user_id, 'pending_setting_min', info['min'])
-        self.parent.update_user_state(user_id, 'pending_setting_max', info['max'])
-        
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.row("❌ Отмена")
+        self.parent.update_user_state_many(user_id, {
+            'state': 'waiting_for_setting_value',
+            'pending_setting_name': info['name'],
+            'pending_setting_min': info['min'],
+            'pending_setting_max': info['max'],
+        })
         
-        self.bot.answer_callback_query(call.id)
         self.bot.send_message(
             user_id,
             f"{info['title']}\n\n"
             f"📝 {info['description']}\n"
-            f"📊 Текущее значение: <b>{info['current']} {info['unit']}</b>\n"
+            f"📊 Текущее значение: <b>{current} {info['unit']}</b>\n"
             f"📏 Диапазон: {info['min']}-{info['max']} {info['unit']}\n\n"
             f"Введите новое значение:",
             parse_mode='HTML',
-            reply_markup=markup
+            reply_markup=_cancel_markup_json()
         )
     
     def handle_setting_value(self, message, state_data):
@@ -185,46 +214,47 @@ class SettingsHandlers:
         min_val = state_data.get('pending_setting_min', 0)
         max_val = state_data.get('pending_setting_max', 100)
         
-        try:
-            value = int(message.text.strip())
-            
-            if value < min_val or value > max_val:
-                self.bot.reply_to(
-                    message,
-                    f"❌ Значение должно быть от {min_val} до {max_val}. Попробуйте еще раз:"
-                )
-                return
+        text = message.text or ""
+        if not _INT_RE.match(text):
+            self.bot.reply_to(
+                message,
+                "❌ Пожалуйста, введите целое число:"
+            )
+            return
+        value = int(text)
+        
+        if value < min_val or value > max_val:
+            self.bot.reply_to(
+                message,
+                f"❌ Значение должно быть от {min_val} до {max_val}. Попробуйте еще раз:"
+            )
+            return
+        
+        # Обновляем настройку
+        success = self.parent.settings_service.update_setting(user_id, setting_name, value)
+        
+        if success:
+            self.parent.update_user_state_many(user_id, {'state': None, 'pending_setting_name': None})
             
-            # Обновляем настройку
-            success = self.parent.settings_service.update_setting(user_id, setting_name, value)
+            setting_description = self.parent.settings_service.get_setting_description(setting_name)
             
-            if success:
-                self.parent.update_user_state(user_id, 'state', None)
-                self.parent.update_user_state(user_id, 'pending_setting_name', None)
-                
-                setting_description = self.parent.settings_service.get_setting_description(setting_name)
-                
-                self.bot.reply_to(
-                    message,
-                    f"✅ Настройка обновлена!\n\n{setting_description}: <b>{value}</b>",
-                    parse_mode='HTML',
-                    reply_markup=self.parent._main_menu_markup()
-                )
-            else:
-                self.bot.reply_to(
-                    message,
-                    "❌ Ошибка при обновлении настройки",
-                    reply_markup=self.parent._main_menu_markup()
-                )
-        except ValueError:
             self.bot.reply_to(
                 message,
-                "❌ Пожалуйста, введите целое число:"
+                f"✅ Настройка обновлена!\n\n{setting_description}: <b>{value}</b>",
+                parse_mode='HTML',
+                reply_markup=self.parent._main_menu_markup()
+            )
+        else:
+            self.bot.reply_to(
+                message,
+                "❌ Ошибка при обновлении настройки",
+                reply_markup=self.parent._main_menu_markup()
             )
     
     def handle_settings_reset(self, call):
         """Сброс настроек к значениям по умолчанию"""
         user_id = call.from_user.id
+        self.bot.answer_callback_query(call.id, "🔄 Сбрасываю настройки...")
         
         success = self.parent.settings_service.reset_settings(user_id)
         
@@ -240,7 +270,6 @@ class SettingsHandlers:
                 f"🚦 Проверка пробок: {settings.traffic_check_interval_minutes} мин\n"
                 f"⚠️ Порог пробок: {settings.traffic_threshold_percent}%"
             )
-            self.bot.answer_callback_query(call.id, "✅ Настройки сброшены")
             self.bot.edit_message_text(
                 text,
                 call.message.chat.id,
@@ -253,7 +282,7 @@ class SettingsHandlers:
                 reply_markup=self.parent._main_menu_markup()
             )
         else:
-            self.bot.answer_callback_query(call.id, "❌ Ошибка сброса настроек", show_alert=True)
+            self.bot.send_message(call.message.chat.id, "❌ Ошибка сброса настроек")
     
     def handle_settings_back(self, call):
         """Возврат в главное меню из настроек"""
@@ -272,10 +301,9 @@ class SettingsHandlers:
     def handle_chefmarket_credentials_menu(self, call):
         """Меню управления учетными данными ШефМаркет"""
         user_id = call.from_user.id
+        self.bot.answer_callback_query(call.id)
         has_creds = self.parent.credentials_service.has_credentials(user_id, "chefmarket")
         
-        markup = types.InlineKeyboardMarkup(row_width=1)
-        
         if has_creds:
             text = (
                 "📲 <b>Учетные данные ШефМаркет</b>\n\n"
@@ -285,11 +313,6 @@ class SettingsHandlers:
                 "• Удалить их\n"
                 "• Использовать /import_orders для загрузки заказов"
             )
-            markup.add(
-                types.InlineKeyboardButton("🔄 Обновить данные", callback_data="chefmarket_update_creds"),
-                types.InlineKeyboardButton("🗑️ Удалить данные", callback_data="chefmarket_delete_creds"),
-                types.InlineKeyboardButton("⬅️ Назад к настройкам", callback_data="chefmarket_back_to_settings")
-            )
         else:
             text = (
                 "📲 <b>Учетные данные ШефМаркет</b>\n\n"
@@ -301,18 +324,13 @@ class SettingsHandlers:
                 "• Хранятся только в вашей БД\n"
                 "• Используются только для импорта"
             )
-            markup.add(
-                types.InlineKeyboardButton("➕ Добавить данные", callback_data="chefmarket_add_creds"),
-                types.InlineKeyboardButton("⬅️ Назад к настройкам", callback_data="chefmarket_back_to_settings")
-            )
         
-        self.bot.answer_callback_query(call.id)
         self.bot.edit_message_text(
             text,
             call.message.chat.id,
             call.message.message_id,
             parse_mode='HTML',
-            reply_markup=markup
+            reply_markup=_chefmarket_menu_markup_json(has_creds)
         )
     
     def handle_reset_day_from_settings(self, call):
@@ -2,6 +2,7 @@
 Обработчики для мониторинга пробок
 """
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -17,14 +18,8 @@ class TrafficHandlers:
     def register(self):
         """Регистрация обработчиков"""
         # Регистрация обработчиков кнопок меню
-        self.bot.register_message_handler(
-            self.handle_monitor,
-            func=lambda m: m.text == "🚦 Мониторинг"
-        )
-        self.bot.register_message_handler(
-            self.handle_stop_monitor,
-            func=lambda m: m.text == "🛑 Стоп мониторинг"
-        )
+        self.parent.register_text_handler("🚦 Мониторинг", self.handle_monitor)
+        self.parent.register_text_handler("🛑 Стоп мониторинг", self.handle_stop_monitor)
         
         logger.info("✅ Traffic handlers зарегистрированы")
     
@@ -42,9 +37,9 @@ class TrafficHandlers:
         optimized_route = state_data.get('optimized_route')
         orders = state_data.get('optimized_orders', [])
         start_location = state_data.get('start_location')
-        start_time_str = state_data.get('start_time')
+        start_time_ts = state_data.get('start_time')
 
-        if not optimized_route or not orders or not start_location or not start_time_str:
+        if not optimized_route or not orders or not start_location or not start_time_ts:
             self.bot.reply_to(
                 message,
                 "❌ Сначала оптимизируйте маршрут",
@@ -52,11 +47,8 @@ class TrafficHandlers:
             )
             return
 
-        # Преобразуем start_time в datetime
-        if isinstance(start_time_str, str):
-            start_datetime = datetime.fromisoformat(start_time_str)
-        else:
-            start_datetime = start_time_str
+        # start_time хранится в state как unix-время (секунды)
+        start_datetime = datetime.fromtimestamp(start_time_ts)
 
         # Запустить мониторинг для этого пользователя
         self.parent.traffic_monitor.start_monitoring(
@@ -93,9 +85,8 @@ class TrafficHandlers:
         if status['is_monitoring']:
             last_check = status['last_check']
             if last_check:
-                last_check_dt = datetime.fromisoformat(last_check)
-                time_diff = datetime.now() - last_check_dt
-                last_check_str = f"{time_diff.seconds // 60} мин назад"
+                # last_check - unix-время последней проверки (секунды)
+                last_check_str = f"{(int(time.time()) - last_check) // 60} мин назад"
             else:
                 last_check_str = "еще не проверялось"
 
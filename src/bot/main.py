@@ -1,11 +1,23 @@
-import telebot
 import logging
-from src.config import settings
-# Импортируем модели для использования в ORM запросах
-from src.models.order import OrderDB, StartLocationDB, RouteDataDB, CallStatusDB, UserSettingsDB, UserCredentialsDB  # noqa: F401
-from src.models.geocache import GeocodeCacheDB  # noqa: F401
-# from src.services.llm_service import LLMService  # Пока отключено
-from src.bot.handlers import CourierBot
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _configure_telegram_session():
+    """Общая HTTP-сессия с keep-alive для запросов telebot к api.telegram.org
+    
+    Соединения переиспользуются между вызовами и потоками обработчиков,
+    поэтому TLS-рукопожатие не повторяется на каждый answer/edit/send.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from telebot import apihelper
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=0)
+    session.mount('https://', adapter)
+    apihelper.session = session
 
 
 def main():
@@ -23,11 +35,24 @@ def main():
     if hasattr(sys.stdout, 'reconfigure'):
         sys.stdout.reconfigure(line_buffering=True)
     
-    logger = logging.getLogger(__name__)
     logger.info("=" * 60)
     logger.info("🚀 Запуск Courier Bot")
     logger.info("=" * 60)
 
+    settings = get_settings()
+
+    # Токен проверяем до миграций и тяжелых импортов (telebot, ORM), чтобы без него падать сразу
+    if not settings.telegram_bot_token or settings.telegram_bot_token == "your_bot_token_here":
+        logger.error("❌ Установите TELEGRAM_BOT_TOKEN в файле env")
+        return
+
+    import telebot
+    # Импортируем модели для использования в ORM запросах
+    from src.models.order import OrderDB, StartLocationDB, RouteDataDB, CallStatusDB, UserSettingsDB, UserCredentialsDB  # noqa: F401
+    from src.models.geocache import GeocodeCacheDB  # noqa: F401
+    # from src.services.llm_service import LLMService  # Пока отключено
+    from src.bot.handlers import CourierBot
+
     # Применяем миграции (создают таблицы и изменяют схему)
     logger.info("🔄 Применение миграций базы данных...")
     try:
@@ -50,12 +75,11 @@ def main():
 
     # Initialize bot
     logger.info("🔧 Инициализация бота...")
-    if not settings.telegram_bot_token or settings.telegram_bot_token == "your_bot_token_here":
-        logger.error("❌ Установите TELEGRAM_BOT_TOKEN в файле env")
-        return
-
     try:
-        bot = telebot.TeleBot(settings.telegram_bot_token)
+        _configure_telegram_session()
+        # Хендлеры в основном ждут I/O (БД, Telegram API), поэтому пул потоков
+        # telebot расширен: медленный запрос одного чата не задерживает остальные
+        bot = telebot.TeleBot(settings.telegram_bot_token, num_threads=settings.telegram_num_threads)
         logger.info("✅ Telegram Bot инициализирован")
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации Telegram Bot: {e}", exc_info=True)
@@ -65,15 +89,7 @@ def main():
     # llm_service = LLMService()  # Пока отключено
     llm_service = None
 
-    # Проверяем доступность Tesseract OCR для парсинга изображений
-    logger.info("🔍 Проверка доступности Tesseract OCR...")
-    try:
-        from src.services.image_parser import ImageOrderParser
-        test_parser = ImageOrderParser()
-        logger.info("✅ Tesseract OCR доступен - парсинг изображений включен")
-    except Exception as e:
-        logger.warning(f"⚠️ Tesseract OCR недоступен: {e}")
-        logger.warning("⚠️ Парсинг изображений будет недоступен. Установите Tesseract для использования этой функции.")
+    # Доступность Tesseract OCR проверяется при первом скриншоте (OrderHandlers._get_image_parser)
     
     # Initialize bot handler (все сервисы инициализируются внутри)
     logger.info("🔧 Инициализация обработчиков...")
@@ -105,7 +121,9 @@ def main():
     # Start polling
     logger.info("🤖 Courier Bot started! Начинаю polling...")
     try:
-        bot.polling(none_stop=True)
+        # Long polling: сервер держит getUpdates до 30 с, клиент не спит между запросами;
+        # накопившиеся за время простоя обновления не переигрываются при перезапуске
+        bot.polling(none_stop=True, interval=0, timeout=20, long_polling_timeout=30, skip_pending=True)
     except KeyboardInterrupt:
         logger.info("\n🛑 Остановка бота...")
         courier_bot.call_notifier.stop()
@@ -1,4 +1,4 @@
-import os
+from functools import lru_cache
 from typing import Optional
 from pydantic_settings import BaseSettings
 
@@ -6,6 +6,7 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     # Telegram
     telegram_bot_token: str = "your_bot_token_here"
+    telegram_num_threads: int = 8  # Потоков telebot для параллельной обработки апдейтов
 
     # Maps API
     yandex_maps_api_key: Optional[str] = None
@@ -39,20 +40,11 @@ class Settings(BaseSettings):
         # которые передаются через docker-compose environment: секцию
 
 
-settings = Settings()
-
-# Диагностика при загрузке модуля (только если logging настроен)
-import logging
-logger = logging.getLogger(__name__)
-# Логируем только если encryption_key не установлен (чтобы не спамить)
-if not settings.encryption_key:
-    logger.info(f"🔍 Config загружен (encryption_key не найден):")
-    logger.info(f"   - settings.encryption_key: {settings.encryption_key}")
-    logger.info(f"   - settings.yandex_maps_api_key: {settings.yandex_maps_api_key[:10] if settings.yandex_maps_api_key else None}...")
-    logger.info(f"   - settings.two_gis_api_key: {settings.two_gis_api_key[:10] if settings.two_gis_api_key else None}...")
-    logger.info(f"   - settings.telegram_bot_token: {settings.telegram_bot_token[:10] if settings.telegram_bot_token else None}...")
-    # Проверяем, что Pydantic видит из переменных окружения
-    import os
-    logger.info(f"   - os.getenv('ENCRYPTION_KEY'): {os.getenv('ENCRYPTION_KEY')}")
-    logger.info(f"   - os.getenv('encryption_key'): {os.getenv('encryption_key')}")
-    logger.info(f"   - Проверка всех переменных с 'ENCRYPTION' или 'encryption': {[k for k in os.environ.keys() if 'encryption' in k.lower()]}")
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Настройки приложения (читаются из окружения один раз на процесс)"""
+    return Settings()
+
+
+# Совместимость со старыми импортами `from src.config import settings`
+settings = get_settings()
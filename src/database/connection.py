@@ -1,19 +1,46 @@
+import json
+from functools import partial
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, StaticPool
 from contextlib import contextmanager
-from src.config import settings
+from src.config import get_settings
+
+# Сериализация JSON-колонок (маршрут, график звонков): компактные разделители и кириллица
+# без \uXXXX-экранирования - строка вдвое короче и кодируется быстрее
+_json_serializer = partial(json.dumps, ensure_ascii=False, separators=(",", ":"))
 
 # Поддержка SQLite и PostgreSQL
+settings = get_settings()
 database_url = settings.database_url
 if "sqlite" in database_url:
     connect_args = {"check_same_thread": False}
-    engine = create_engine(database_url, connect_args=connect_args)
+    if ":memory:" in database_url:
+        # In-memory БД живет в одном соединении: все потоки должны делить его
+        engine = create_engine(database_url, connect_args=connect_args, poolclass=StaticPool,
+                               json_serializer=_json_serializer)
+    else:
+        engine = create_engine(database_url, connect_args=connect_args, json_serializer=_json_serializer)
 else:
-    # PostgreSQL
-    engine = create_engine(database_url, pool_pre_ping=True)
+    # PostgreSQL: пул заранее открытых соединений (сессии берут соединение из пула,
+    # а не устанавливают новое на каждый запрос). Пул не меньше числа потоков telebot
+    # плюс фоновые потоки (уведомления о звонках, мониторинг пробок), чтобы
+    # параллельные обработчики не ждали освобождения соединения
+    engine = create_engine(
+        database_url,
+        poolclass=QueuePool,
+        pool_size=max(10, settings.telegram_num_threads + 2),
+        max_overflow=20,  # Запас на всплески (пакетные уведомления, параллельное геокодирование)
+        pool_timeout=10,  # Ждать соединение дольше, чем длится типичный запрос, но не бесконечно
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        json_serializer=_json_serializer,
+    )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: после commit объекты остаются заполненными - возвращаемые
+# из сервисов записи не требуют session.refresh (лишнего SELECT) и читаются после закрытия сессии
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
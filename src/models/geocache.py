@@ -8,7 +8,7 @@ class GeocodeCacheDB(Base):
     __tablename__ = "geocode_cache"
 
     id = Column(Integer, primary_key=True, index=True)
-    address = Column(String, nullable=False, index=True)  # Нормализованный адрес (lower, strip)
+    address = Column(String, nullable=False, index=True)  # Нормализованный адрес (lower, ё -> е, схлопнутые пробелы)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     gis_id = Column(String, nullable=True)  # ID объекта 2ГИС
@@ -19,3 +19,19 @@ class GeocodeCacheDB(Base):
         Index('idx_address', 'address'),
     )
 
+
+def distance_cache_key(lat: float, lon: float) -> str:
+    """Ключ точки для кэша расстояний (округление до 5 знаков, ~1 м)"""
+    return f"{round(lat, 5)},{round(lon, 5)}"
+
+
+class DistanceCacheDB(Base):
+    """Кэш расстояний/времени проезда между парами точек (матрица маршрута)"""
+    __tablename__ = "distance_cache"
+
+    user_id = Column(Integer, primary_key=True)
+    coord_a = Column(String, primary_key=True)  # "lat,lon" с округлением до 5 знаков
+    coord_b = Column(String, primary_key=True)
+    distance_km = Column(Float, nullable=False)
+    time_minutes = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,9 +1,39 @@
+import re
 from datetime import datetime, time, date
 from typing import Optional, List
 from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Time, Date, JSON, Index, Boolean
 from pydantic import BaseModel
 from src.database.connection import Base
 
+# Временное окно доставки: ЧЧ:ММ - ЧЧ:ММ
+_TIME_WINDOW_RE = re.compile(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})')
+
+
+def _split_hhmm(value: str) -> Optional[tuple]:
+    """Разобрать строку ровно вида ЧЧ:ММ (или Ч:ММ) в (часы, минуты)"""
+    hours, sep, minutes = value.partition(':')
+    if (sep and 1 <= len(hours) <= 2 and len(minutes) == 2
+            and hours.isdecimal() and minutes.isdecimal()):
+        return int(hours), int(minutes)
+    return None
+
+
+def _parse_time_window_parts(window: str) -> Optional[tuple]:
+    """Часы и минуты начала и конца окна: (ч1, м1, ч2, м2) или None
+    
+    Обычная строка "ЧЧ:ММ - ЧЧ:ММ" разбирается строковыми операциями,
+    регулярное выражение - только для остальных форматов (текст вокруг окна и т.п.)
+    """
+    start, sep, end = window.partition('-')
+    if sep:
+        start_parts = _split_hhmm(start.strip())
+        end_parts = _split_hhmm(end.strip())
+        if start_parts and end_parts:
+            return start_parts + end_parts
+    
+    match = _TIME_WINDOW_RE.search(window)
+    return tuple(map(int, match.groups())) if match else None
+
 
 class OrderDB(Base):
     __tablename__ = "orders"
@@ -33,6 +63,11 @@ class OrderDB(Base):
     call_time = Column(DateTime, nullable=True)  # Расчетное время звонка
     route_order = Column(Integer, nullable=True)
 
+    __table_args__ = (
+        # Проверка "заказ доставлен?" для звонков и выборка заказов пользователя за день
+        Index('idx_order_user_date_number', 'user_id', 'order_date', 'order_number'),
+    )
+
 
 class StartLocationDB(Base):
     __tablename__ = "start_locations"
@@ -61,6 +96,7 @@ class RouteDataDB(Base):
     total_distance = Column(Float, nullable=True)
     total_time = Column(Float, nullable=True)
     estimated_completion = Column(DateTime, nullable=True)
+    input_signature = Column(String, nullable=True)  # Подпись входных данных оптимизации, по которой построен маршрут
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -90,6 +126,9 @@ class CallStatusDB(Base):
     __table_args__ = (
         Index('idx_user_date', 'user_id', 'call_date'),
         Index('idx_status_time', 'status', 'call_time'),
+        # Запросы CallNotifier на каждой проверке: наступившие pending и rejected с наступившим повтором
+        Index('idx_status_date_call_time', 'status', 'call_date', 'call_time'),
+        Index('idx_status_date_next_attempt', 'status', 'call_date', 'next_attempt_time'),
     )
 
 
@@ -183,15 +222,30 @@ class Order(BaseModel):
         if self.delivery_time_window:
             self._parse_time_window()
 
+    @classmethod
+    def from_db(cls, order_data: dict) -> "Order":
+        """Создать Order из словаря DatabaseService (время окна - строки 'HH:MM[:SS]')"""
+        data = dict(order_data)
+        for key in ('delivery_time_start', 'delivery_time_end'):
+            value = data.get(key)
+            if isinstance(value, str):
+                try:
+                    data[key] = time.fromisoformat(value).replace(second=0, microsecond=0)
+                except ValueError:
+                    data[key] = None
+        # model_validate не вызывает __init__: время окна из БД уже разобрано при сохранении,
+        # строку разбираем, только если в записи его нет
+        order = cls.model_validate(data)
+        if order.delivery_time_window and (order.delivery_time_start is None or order.delivery_time_end is None):
+            order._parse_time_window()
+        return order
+
     def _parse_time_window(self):
         """Парсит строку временного окна в объекты time"""
-        import re
-        # Ищем паттерн ЧЧ:ММ - ЧЧ:ММ
-        time_pattern = r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})'
-        match = re.search(time_pattern, self.delivery_time_window)
+        parts = _parse_time_window_parts(self.delivery_time_window)
 
-        if match:
-            start_hour, start_min, end_hour, end_min = map(int, match.groups())
+        if parts:
+            start_hour, start_min, end_hour, end_min = parts
             try:
                 self.delivery_time_start = time(start_hour, start_min)
                 self.delivery_time_end = time(end_hour, end_min)
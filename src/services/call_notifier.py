@@ -1,16 +1,90 @@
+import json
 import threading
 import logging
 import time as time_module
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta, date
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from src.services.db_service import DatabaseService
 from src.services.user_settings_service import UserSettingsService
+from src.services.rate_limiter import TokenBucket, PerKeyRateLimiter
 from src.database.connection import get_db_session
 from src.models.order import CallStatusDB
 from sqlalchemy import and_
 
 logger = logging.getLogger(__name__)
 
+# Глобальный лимит Telegram Bot API на исходящие сообщения
+TELEGRAM_MESSAGES_PER_SECOND = 30
+# Минимальный интервал между сообщениями в один чат (лимит Telegram ~1 сообщение/с)
+TELEGRAM_CHAT_MIN_INTERVAL = 1.0
+# Параллельных отправок, когда в одной проверке наступили звонки нескольких пользователей
+NOTIFICATION_SEND_WORKERS = 8
+
+# Шаблоны уведомления о звонке (первое и повторное)
+_CALL_TEMPLATE = (
+    "📞 <b>Время звонка!</b>\n\n"
+    "👤 {name}\n"
+    "📦 {order}\n"
+    "📱 {phone}\n"
+    "🕐 Время: {time}"
+)
+_RETRY_TEMPLATE = (
+    "📞 <b>Повторное уведомление!</b>\n\n"
+    "👤 {name}\n"
+    "📦 {order}\n"
+    "📱 {phone}\n"
+    "🕐 Время: {time}\n"
+    "🔄 Попытка: {attempt}"
+)
+# Сводное уведомление, если у курьера одновременно наступило несколько звонков
+GROUP_NOTIFICATION_TITLE = "Время звонков!"
+_GROUP_HEADER_TEMPLATE = "📞 <b>" + GROUP_NOTIFICATION_TITLE + "</b> ({count})"
+_GROUP_ITEM_TEMPLATE = (
+    "👤 {name}\n"
+    "📦 {order}\n"
+    "📱 {phone}\n"
+    "🕐 Время: {time}"
+)
+# callback_data кнопок уведомления (формат разбирается в CallHandlers)
+_CONFIRM_CALLBACK_PREFIX = "call_confirm_"
+_REJECT_CALLBACK_PREFIX = "call_reject_"
+_CALL_ID_PLACEHOLDER = "{call_status_id}"
+
+
+@lru_cache(maxsize=1)
+def _confirm_reject_markup_template() -> str:
+    """JSON клавиатуры подтверждения/отклонения звонка с подстановкой под ID записи"""
+    from telebot import types
+    
+    markup = types.InlineKeyboardMarkup()
+    markup.add(
+        types.InlineKeyboardButton("✅ Подтверждено", callback_data=_CONFIRM_CALLBACK_PREFIX + _CALL_ID_PLACEHOLDER),
+        types.InlineKeyboardButton("❌ Отклонено", callback_data=_REJECT_CALLBACK_PREFIX + _CALL_ID_PLACEHOLDER)
+    )
+    return markup.to_json()
+
+
+def _make_confirm_reject_markup(call_status_id: int) -> str:
+    """JSON клавиатуры подтверждения/отклонения для конкретной записи о звонке"""
+    return _confirm_reject_markup_template().replace(_CALL_ID_PLACEHOLDER, str(call_status_id))
+
+
+def _make_group_markup(calls: List[CallStatusDB]) -> str:
+    """JSON клавиатуры сводного уведомления: по строке подтверждения/отклонения на каждый звонок
+    
+    Собирается сразу в JSON (формат InlineKeyboardMarkup.to_json), без объектов кнопок telebot.
+    """
+    return json.dumps({"inline_keyboard": [
+        [
+            {"text": f"✅ №{call.order_number}", "callback_data": f"{_CONFIRM_CALLBACK_PREFIX}{call.id}"},
+            {"text": f"❌ №{call.order_number}", "callback_data": f"{_REJECT_CALLBACK_PREFIX}{call.id}"},
+        ]
+        for call in calls
+    ]})
+
 try:
     from zoneinfo import ZoneInfo
     TZ_AVAILABLE = True
@@ -43,6 +117,9 @@ class CallNotifier:
         self.running = False
         self.thread = None
         self.check_interval = 30  # Проверка каждые 30 секунд
+        # Ограничение частоты отправки, чтобы пачка уведомлений не упиралась в 429
+        self.send_limiter = TokenBucket(TELEGRAM_MESSAGES_PER_SECOND)
+        self.chat_limiter = PerKeyRateLimiter(TELEGRAM_CHAT_MIN_INTERVAL)
     
     def start(self):
         """Запустить фоновую проверку звонков"""
@@ -132,9 +209,13 @@ class CallNotifier:
             
             logger.debug(f"Звонков для отправки: {len(filtered_calls)} (время <= {now.strftime('%H:%M:%S')} и >= {time_threshold.strftime('%H:%M:%S')}, отфильтровано доставленных: {len(pending_calls) - len(filtered_calls)})")
             
+            # Наступившие звонки одного курьера отправляем одним сообщением
+            calls_by_user = defaultdict(list)
             for call in filtered_calls:
                 logger.info(f"✅ Найден звонок для отправки: заказ {call.order_number}, время {call.call_time.strftime('%H:%M:%S')}, сейчас {now.strftime('%H:%M:%S')}")
-                self._send_call_notification(call.id, session)
+                calls_by_user[call.user_id].append(call.id)
+            
+            self._send_call_notifications_batch(list(calls_by_user.values()), session)
     
     def _check_retry_calls(self):
         """Проверить звонки для повторной попытки"""
@@ -189,6 +270,114 @@ class CallNotifier:
                     session.commit()
                     logger.warning(f"❌ Превышено максимальное количество попыток дозвона для заказа {call.order_number}")
     
+    def _acquire_send_slot(self, chat_id: int):
+        """Дождаться разрешения на отправку: сначала в этот чат, затем в общем лимите бота"""
+        self.chat_limiter.acquire(chat_id)
+        self.send_limiter.acquire()
+    
+    def _get_sendable_call(self, call_id: int, session) -> Optional[CallStatusDB]:
+        """Получить запись о звонке, если по ней еще нужно отправлять уведомление
+        
+        Звонки по уже доставленным заказам помечаются как неактивные.
+        """
+        call = session.query(CallStatusDB).filter(CallStatusDB.id == call_id).first()
+        if not call:
+            logger.error(f"❌ Запись о звонке с ID {call_id} не найдена")
+            return None
+        
+        # Проверяем что звонок еще актуален
+        if call.status not in ["pending", "rejected"]:
+            logger.warning(f"⚠️ Попытка отправить уведомление для звонка со статусом {call.status}, пропускаем")
+            return None
+        
+        # ВАЖНО: Проверяем, не доставлен ли уже заказ
+        from src.models.order import OrderDB
+        order = session.query(OrderDB).filter(
+            and_(
+                OrderDB.user_id == call.user_id,
+                OrderDB.order_number == call.order_number,
+                OrderDB.order_date == call.call_date
+            )
+        ).first()
+        
+        if order and order.status == "delivered":
+            logger.info(f"⏭️ Пропускаем уведомление о звонке для заказа {call.order_number} - заказ уже доставлен")
+            # Помечаем звонок как неактивный
+            call.status = "failed"
+            call.attempts = 999  # Помечаем как обработанный
+            session.commit()
+            return None
+        
+        return call
+    
+    @staticmethod
+    def _call_template_fields(call: CallStatusDB) -> Dict:
+        """Поля шаблонов уведомления для записи о звонке"""
+        return {
+            'name': call.customer_name or "Клиент",
+            'order': f"Заказ №{call.order_number}" if call.order_number else "Заказ",
+            'phone': call.phone,
+            'time': call.call_time.strftime('%H:%M'),
+            'attempt': call.attempts + 1,
+        }
+    
+    def _build_notification(self, call_ids: List[int], session, is_retry: bool = False) -> Optional[Tuple]:
+        """Подготовить уведомление о звонках одного пользователя
+        
+        Одна запись - обычное (или повторное) уведомление, несколько - сводное.
+        Повторные уведомления срочные и собираются только по одной записи.
+        
+        Returns:
+            (user_id, text, markup, calls) или None, если отправлять нечего
+        """
+        calls = [call for call in (self._get_sendable_call(call_id, session) for call_id in call_ids) if call]
+        if not calls:
+            return None
+        
+        if len(calls) == 1:
+            call = calls[0]
+            # Формируем текст с указанием попытки (если это retry)
+            template = _RETRY_TEMPLATE if is_retry else _CALL_TEMPLATE
+            text = template.format(**self._call_template_fields(call))
+            # Inline клавиатура с кнопками подтверждения/отклонения
+            markup = _make_confirm_reject_markup(call.id)
+        else:
+            text = "\n\n".join(
+                [_GROUP_HEADER_TEMPLATE.format(count=len(calls))]
+                + [_GROUP_ITEM_TEMPLATE.format(**self._call_template_fields(call)) for call in calls]
+            )
+            markup = _make_group_markup(calls)
+        return calls[0].user_id, text, markup, calls
+    
+    def _deliver(self, user_id: int, text: str, markup: str) -> bool:
+        """Отправить подготовленное уведомление (без работы с БД - можно вызывать из пула потоков)
+        
+        Returns:
+            True если сообщение отправлено
+        """
+        try:
+            self._acquire_send_slot(user_id)
+            self.bot.send_message(
+                user_id,
+                text,
+                parse_mode='HTML',
+                reply_markup=markup
+            )
+            return True
+        except Exception as send_error:
+            logger.error(f"❌ Ошибка отправки уведомления пользователю {user_id}: {send_error}", exc_info=True)
+            return False
+    
+    @staticmethod
+    def _mark_sent(calls: List[CallStatusDB], is_retry: bool = False):
+        """Обновить статус и счетчик попыток после успешной отправки (без commit)"""
+        for call in calls:
+            call.attempts += 1
+            call.status = "sent"  # Помечаем как отправленное
+            if is_retry:
+                call.next_attempt_time = None  # Сбрасываем время следующей попытки
+            logger.info(f"✅ Отправлено уведомление о звонке для заказа {call.order_number} пользователю {call.user_id} (попытка #{call.attempts})")
+    
     def _send_call_notification(self, call_id: int, session, is_retry: bool = False):
         """Отправить уведомление о необходимости звонка
         
@@ -197,93 +386,37 @@ class CallNotifier:
             session: SQLAlchemy сессия (передается извне, чтобы избежать race conditions)
             is_retry: True если это повторная попытка после reject
         """
+        self._send_call_notifications_batch([[call_id]], session, is_retry=is_retry)
+    
+    def _send_call_notifications_batch(self, call_id_groups: List[List[int]], session, is_retry: bool = False):
+        """Отправить уведомления нескольким пользователям параллельно
+        
+        Записи читаются и обновляются только в текущем потоке (сессия не потокобезопасна),
+        в пул уходят лишь HTTP-запросы к Telegram; лимиты отправки соблюдаются в _deliver.
+        
+        Args:
+            call_id_groups: ID записей о звонках, сгруппированные по пользователю
+            session: SQLAlchemy сессия (передается извне, чтобы избежать race conditions)
+            is_retry: True если это повторные попытки после reject
+        """
         try:
-            # Получаем актуальную запись из переданной сессии
-            call = session.query(CallStatusDB).filter(CallStatusDB.id == call_id).first()
-            if not call:
-                logger.error(f"❌ Запись о звонке с ID {call_id} не найдена")
-                return
-            
-            # Проверяем что звонок еще актуален
-            if call.status not in ["pending", "rejected"]:
-                logger.warning(f"⚠️ Попытка отправить уведомление для звонка со статусом {call.status}, пропускаем")
+            notifications = [n for n in (self._build_notification(ids, session, is_retry) for ids in call_id_groups) if n]
+            if not notifications:
                 return
             
-            # ВАЖНО: Проверяем, не доставлен ли уже заказ
-            from src.models.order import OrderDB
-            order = session.query(OrderDB).filter(
-                and_(
-                    OrderDB.user_id == call.user_id,
-                    OrderDB.order_number == call.order_number,
-                    OrderDB.order_date == call.call_date
-                )
-            ).first()
-            
-            if order and order.status == "delivered":
-                logger.info(f"⏭️ Пропускаем уведомление о звонке для заказа {call.order_number} - заказ уже доставлен")
-                # Помечаем звонок как неактивный
-                call.status = "failed"
-                call.attempts = 999  # Помечаем как обработанный
-                session.commit()
-                return
-            
-            customer_info = call.customer_name or "Клиент"
-            order_info = f"Заказ №{call.order_number}" if call.order_number else "Заказ"
-            
-            # Формируем текст с указанием попытки (если это retry)
-            if is_retry:
-                text = (
-                    f"📞 <b>Повторное уведомление!</b>\n\n"
-                    f"👤 {customer_info}\n"
-                    f"📦 {order_info}\n"
-                    f"📱 {call.phone}\n"
-                    f"🕐 Время: {call.call_time.strftime('%H:%M')}\n"
-                    f"🔄 Попытка: {call.attempts + 1}"
-                )
+            if len(notifications) == 1:
+                user_id, text, markup, _ = notifications[0]
+                results = [self._deliver(user_id, text, markup)]
             else:
-                text = (
-                    f"📞 <b>Время звонка!</b>\n\n"
-                    f"👤 {customer_info}\n"
-                    f"📦 {order_info}\n"
-                    f"📱 {call.phone}\n"
-                    f"🕐 Время: {call.call_time.strftime('%H:%M')}"
-                )
-            
-            # Создаем inline клавиатуру с кнопками
-            from telebot import types
-            markup = types.InlineKeyboardMarkup()
-            
-            # Кнопки подтверждения/отклонения
-            confirm_button = types.InlineKeyboardButton(
-                "✅ Подтверждено",
-                callback_data=f"call_confirm_{call.id}"
-            )
-            reject_button = types.InlineKeyboardButton(
-                "❌ Отклонено",
-                callback_data=f"call_reject_{call.id}"
-            )
-            markup.add(confirm_button, reject_button)
+                workers = min(len(notifications), NOTIFICATION_SEND_WORKERS)
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="call-notify") as executor:
+                    results = list(executor.map(lambda n: self._deliver(*n[:3]), notifications))
             
-            # Отправляем уведомление
-            try:
-                self.bot.send_message(
-                    call.user_id,
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=markup
-                )
-                
-                # ВАЖНО: Обновляем статус и счетчик ПОСЛЕ успешной отправки
-                call.attempts += 1
-                call.status = "sent"  # Помечаем как отправленное
-                if is_retry:
-                    call.next_attempt_time = None  # Сбрасываем время следующей попытки
-                session.commit()
-                
-                logger.info(f"✅ Отправлено уведомление о звонке для заказа {call.order_number} пользователю {call.user_id} (попытка #{call.attempts})")
-                
-            except Exception as send_error:
-                logger.error(f"❌ Ошибка отправки уведомления: {send_error}", exc_info=True)
+            # ВАЖНО: Обновляем статус и счетчик ПОСЛЕ успешной отправки
+            for (_, _, _, calls), delivered in zip(notifications, results):
+                if delivered:
+                    self._mark_sent(calls, is_retry)
+            session.commit()
             
         except Exception as e:
             logger.error(f"Ошибка отправки уведомления о звонке: {e}", exc_info=True)
@@ -315,22 +448,6 @@ class CallNotifier:
                     OrderDB.order_date == call_date
                 )
             ).first()
-            
-            if order and order.status == "delivered":
-                logger.info(f"⏭️ Пропускаем создание записи о звонке для заказа {order_number} - заказ уже доставлен")
-                # Если запись уже существует, помечаем её как неактивную
-                existing = session.query(CallStatusDB).filter(
-                    and_(
-                        CallStatusDB.user_id == user_id,
-                        CallStatusDB.order_number == order_number,
-                        CallStatusDB.call_date == call_date
-                    )
-                ).first()
-                if existing:
-                    existing.status = "failed"
-                    existing.attempts = 999
-                    session.commit()
-                return None
             # Проверяем, нет ли уже записи для этого заказа
             existing = session.query(CallStatusDB).filter(
                 and_(
@@ -340,39 +457,20 @@ class CallNotifier:
                 )
             ).first()
             
-            if existing:
-                # ВАЖНО: Не перезаписываем ручные установки при автоматической оптимизации!
-                if existing.is_manual_call and not is_manual_call:
-                    logger.info(f"⏭️ Пропускаем обновление call_time для заказа {order_number} - звонок установлен вручную")
-                else:
-                    # Обновляем call_time если это не ручная установка или если флаг был сброшен
-                    old_call_time = existing.call_time
-                    existing.call_time = call_time
-                    existing.is_manual_call = is_manual_call
-                    logger.info(
-                        f"🔄 Обновлен call_time для заказа {order_number}: "
-                        f"{old_call_time.strftime('%H:%M') if old_call_time else 'None'} -> "
-                        f"{call_time.strftime('%H:%M')}, is_manual_call: {existing.is_manual_call} -> {is_manual_call}"
-                    )
-
-                if existing.is_manual_arrival and not is_manual_arrival:
-                    logger.info(f"⏭️ Пропускаем обновление arrival_time для заказа {order_number} - прибытие установлено вручную")
-                else:
-                    existing.arrival_time = arrival_time
-                    existing.manual_arrival_time = manual_arrival_time
-                    existing.is_manual_arrival = is_manual_arrival
-
-                existing.phone = phone
-                existing.customer_name = customer_name
-                # Сбрасываем статус только если не подтвержден
-                if existing.status not in ['confirmed']:
-                    existing.status = "pending"
-                    existing.attempts = 0
-                    existing.next_attempt_time = None
-                session.commit()
-                now = get_local_now()
-                if now.tzinfo is not None:
-                    now = now.replace(tzinfo=None)
+            call_status = self._apply_call_status(
+                session, user_id, order_number, call_date, order.status if order else None, existing,
+                call_time=call_time, phone=phone, customer_name=customer_name,
+                is_manual_call=is_manual_call, is_manual_arrival=is_manual_arrival,
+                arrival_time=arrival_time, manual_arrival_time=manual_arrival_time,
+            )
+            session.commit()
+            if call_status is None:
+                return None
+            
+            now = get_local_now()
+            if now.tzinfo is not None:
+                now = now.replace(tzinfo=None)
+            if call_status is existing:
                 time_diff = (existing.call_time - now).total_seconds() / 60
                 manual_flag = "🖐️ручное" if existing.is_manual_call else "🤖авто"
                 logger.debug(
@@ -383,28 +481,128 @@ class CallNotifier:
                 )
                 return existing
             
-            # Создаем новую запись
-            call_status = CallStatusDB(
-                user_id=user_id,
-                order_number=order_number,
-                call_date=call_date,
-                call_time=call_time,
-                arrival_time=arrival_time,
-                manual_arrival_time=manual_arrival_time,
-                is_manual_call=is_manual_call,
-                is_manual_arrival=is_manual_arrival,
-                phone=phone,
-                customer_name=customer_name,
-                status="pending",
-                attempts=0
-            )
-            session.add(call_status)
-            session.commit()
-            session.refresh(call_status)
-            now = get_local_now()
-            if now.tzinfo is not None:
-                now = now.replace(tzinfo=None)
             time_diff = (call_time - now).total_seconds() / 60
             logger.info(f"✅ Создана запись о звонке: заказ {order_number}, время звонка {call_time.strftime('%Y-%m-%d %H:%M:%S')}, телефон {phone}, до звонка {time_diff:.1f} мин (сейчас {now.strftime('%Y-%m-%d %H:%M:%S')})")
             return call_status
+    
+    def bulk_create_call_statuses(self, user_id: int, call_date: date, entries: List[Dict]) -> int:
+        """Создать/обновить записи о звонках для всего маршрута одной транзакцией
+        
+        Args:
+            entries: Список словарей с аргументами create_call_status
+                     (order_number, call_time, phone, customer_name, is_manual_call, ...)
+        
+        Returns:
+            Количество созданных и обновленных записей
+        """
+        if not entries:
+            return 0
+        
+        from src.models.order import OrderDB
+        order_numbers = [entry['order_number'] for entry in entries]
+        with get_db_session() as session:
+            # Заказы и существующие записи - по одному запросу на всех
+            order_statuses = dict(session.query(OrderDB.order_number, OrderDB.status).filter(
+                and_(
+                    OrderDB.user_id == user_id,
+                    OrderDB.order_number.in_(order_numbers),
+                    OrderDB.order_date == call_date
+                )
+            ).all())
+            existing_by_number = {}
+            for existing in session.query(CallStatusDB).filter(
+                and_(
+                    CallStatusDB.user_id == user_id,
+                    CallStatusDB.order_number.in_(order_numbers),
+                    CallStatusDB.call_date == call_date
+                )
+            ).order_by(CallStatusDB.id):
+                existing_by_number.setdefault(existing.order_number, existing)
+            
+            created = updated = 0
+            for entry in entries:
+                fields = dict(entry)
+                order_number = fields.pop('order_number')
+                existing = existing_by_number.get(order_number)
+                call_status = self._apply_call_status(
+                    session, user_id, order_number, call_date, order_statuses.get(order_number), existing, **fields
+                )
+                if call_status is None:
+                    continue
+                if call_status is existing:
+                    updated += 1
+                else:
+                    created += 1
+                    existing_by_number[order_number] = call_status
+            session.commit()
+        
+        logger.info(f"✅ Записи о звонках user_id={user_id}: создано {created}, обновлено {updated}")
+        return created + updated
+    
+    def _apply_call_status(self, session, user_id: int, order_number: str, call_date: date,
+                           order_status: Optional[str], existing: Optional[CallStatusDB],
+                           call_time: datetime, phone: str, customer_name: Optional[str] = None,
+                           is_manual_call: bool = False, is_manual_arrival: bool = False,
+                           arrival_time: datetime = None, manual_arrival_time: datetime = None) -> Optional[CallStatusDB]:
+        """Создать или обновить запись о звонке в сессии (без commit)
+        
+        Returns:
+            existing (обновленная), новая запись (добавлена в сессию) или None, если заказ доставлен
+        """
+        if order_status == "delivered":
+            logger.info(f"⏭️ Пропускаем создание записи о звонке для заказа {order_number} - заказ уже доставлен")
+            # Если запись уже существует, помечаем её как неактивную
+            if existing:
+                existing.status = "failed"
+                existing.attempts = 999
+            return None
+        
+        if existing:
+            # ВАЖНО: Не перезаписываем ручные установки при автоматической оптимизации!
+            if existing.is_manual_call and not is_manual_call:
+                logger.info(f"⏭️ Пропускаем обновление call_time для заказа {order_number} - звонок установлен вручную")
+            else:
+                # Обновляем call_time если это не ручная установка или если флаг был сброшен
+                old_call_time = existing.call_time
+                existing.call_time = call_time
+                existing.is_manual_call = is_manual_call
+                logger.info(
+                    f"🔄 Обновлен call_time для заказа {order_number}: "
+                    f"{old_call_time.strftime('%H:%M') if old_call_time else 'None'} -> "
+                    f"{call_time.strftime('%H:%M')}, is_manual_call: {existing.is_manual_call} -> {is_manual_call}"
+                )
+
+            if existing.is_manual_arrival and not is_manual_arrival:
+                logger.info(f"⏭️ Пропускаем обновление arrival_time для заказа {order_number} - прибытие установлено вручную")
+            else:
+                existing.arrival_time = arrival_time
+                existing.manual_arrival_time = manual_arrival_time
+                existing.is_manual_arrival = is_manual_arrival
+
+            existing.phone = phone
+            existing.customer_name = customer_name
+            # Сбрасываем статус только если не подтвержден
+            if existing.status not in ['confirmed']:
+                existing.status = "pending"
+                existing.attempts = 0
+                existing.next_attempt_time = None
+            return existing
+        
+        # Создаем новую запись
+        call_status = CallStatusDB(
+            user_id=user_id,
+            order_number=order_number,
+            call_date=call_date,
+            call_time=call_time,
+            arrival_time=arrival_time,
+            manual_arrival_time=manual_arrival_time,
+            is_manual_call=is_manual_call,
+            is_manual_arrival=is_manual_arrival,
+            phone=phone,
+            customer_name=customer_name,
+            status="pending",
+            attempts=0
+        )
+        session.add(call_status)
+        return call_status
 
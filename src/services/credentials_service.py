@@ -2,11 +2,13 @@
 Сервис для безопасного хранения учетных данных пользователей
 """
 import logging
+import threading
+from typing import Dict, Optional
 from cryptography.fernet import Fernet
 from sqlalchemy.orm import Session
 from src.database.connection import get_db_session
 from src.models.order import UserCredentialsDB
-from src.config import settings
+from src.config import get_settings
 
 logger = logging.getLogger(__name__)
 
@@ -14,8 +16,14 @@ logger = logging.getLogger(__name__)
 class CredentialsService:
     """Сервис для шифрования и хранения учетных данных"""
     
+    # Кэш наличия учетных данных: user_id -> {site: bool} (проверяется на каждом показе меню).
+    # Сбрасывается целиком для пользователя при сохранении/удалении - запись у пользователя одна
+    _has_credentials_cache: Dict[int, Dict[str, bool]] = {}
+    _cache_lock = threading.Lock()
+    
     def __init__(self):
         # Получаем ключ шифрования из настроек (Pydantic автоматически читает из env файла и переменных окружения)
+        settings = get_settings()
         encryption_key = settings.encryption_key
         
         # Дополнительная проверка через os.getenv для диагностики (но не используем как основной источник)
@@ -134,6 +142,8 @@ class CredentialsService:
         except Exception as e:
             logger.error(f"Ошибка сохранения учетных данных: {e}", exc_info=True)
             return False
+        finally:
+            self._invalidate_has_credentials(user_id)
     
     def get_credentials(self, user_id: int, site: str = "chefmarket") -> tuple[str, str] | None:
         """Получить учетные данные пользователя (login, password)"""
@@ -175,19 +185,44 @@ class CredentialsService:
         except Exception as e:
             logger.error(f"Ошибка удаления учетных данных: {e}", exc_info=True)
             return False
+        finally:
+            self._invalidate_has_credentials(user_id)
     
     def has_credentials(self, user_id: int, site: str = "chefmarket") -> bool:
-        """Проверить, есть ли сохраненные учетные данные"""
+        """Проверить, есть ли сохраненные учетные данные (с кэшем)"""
+        cached = self.has_credentials_cached(user_id, site)
+        if cached is not None:
+            return cached
+        
         try:
             with get_db_session() as session:
                 exists = session.query(UserCredentialsDB).filter(
                     UserCredentialsDB.user_id == user_id,
                     UserCredentialsDB.site == site
                 ).first() is not None
-                
-                return exists
         
         except Exception as e:
             logger.error(f"Ошибка проверки учетных данных: {e}", exc_info=True)
             return False
+        
+        self.remember_has_credentials(user_id, site, exists)
+        return exists
+    
+    @classmethod
+    def has_credentials_cached(cls, user_id: int, site: str = "chefmarket") -> Optional[bool]:
+        """Наличие учетных данных из кэша без обращения к БД (None - нет в кэше)"""
+        with cls._cache_lock:
+            return cls._has_credentials_cache.get(user_id, {}).get(site)
+    
+    @classmethod
+    def remember_has_credentials(cls, user_id: int, site: str, exists: bool) -> None:
+        """Запомнить наличие учетных данных в кэше"""
+        with cls._cache_lock:
+            cls._has_credentials_cache.setdefault(user_id, {})[site] = exists
+    
+    @classmethod
+    def _invalidate_has_credentials(cls, user_id: int):
+        """Сбросить кэш наличия учетных данных пользователя"""
+        with cls._cache_lock:
+            cls._has_credentials_cache.pop(user_id, None)
 
@@ -1,13 +1,17 @@
 import logging
-from datetime import datetime, date, time
-from typing import List, Optional, Dict
+from datetime import datetime, date, time, timedelta
+from typing import List, Optional, Dict, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from src.models.order import OrderDB, StartLocationDB, RouteDataDB, Order
+from src.models.geocache import DistanceCacheDB, distance_cache_key
 from src.database.connection import get_db_session
 
 logger = logging.getLogger(__name__)
 
+# Время проезда считается с учетом пробок, поэтому пары из кэша расстояний живут не дольше суток
+DISTANCE_CACHE_MAX_AGE = timedelta(days=1)
+
 
 class DatabaseService:
     """Сервис для работы с базой данных"""
@@ -29,6 +33,42 @@ class DatabaseService:
     
     def _get_orders(self, user_id: int, order_date: date, session: Session) -> List[Dict]:
         """Внутренний метод получения заказов"""
+        return [order_dict for order_dict, _ in self._load_orders_with_call_status(user_id, order_date, session)]
+    
+    def get_orders_partitioned(self, user_id: int, order_date: date = None,
+                               session: Session = None) -> Tuple[List[Dict], List[Dict]]:
+        """Получить активные (не доставленные) заказы, разделенные по подтверждению звонка
+        
+        Returns:
+            Кортеж (confirmed, unconfirmed) - заказы с подтвержденным звонком и остальные
+        """
+        if order_date is None:
+            order_date = date.today()
+        
+        if session is None:
+            with get_db_session() as session:
+                return self._get_orders_partitioned(user_id, order_date, session)
+        return self._get_orders_partitioned(user_id, order_date, session)
+    
+    def _get_orders_partitioned(self, user_id: int, order_date: date, session: Session) -> Tuple[List[Dict], List[Dict]]:
+        """Внутренний метод получения заказов с разделением по подтверждению звонка"""
+        return self._partition_orders(self._load_orders_with_call_status(user_id, order_date, session))
+    
+    @staticmethod
+    def _partition_orders(orders_with_status: List[Tuple[Dict, object]]) -> Tuple[List[Dict], List[Dict]]:
+        """Разделить активные заказы на подтвержденные и неподтвержденные по call_status"""
+        confirmed, unconfirmed = [], []
+        for order_dict, cs in orders_with_status:
+            if order_dict.get('status', 'pending') == 'delivered':
+                continue
+            if order_dict.get('order_number') and cs is not None and cs.status == "confirmed":
+                confirmed.append(order_dict)
+            else:
+                unconfirmed.append(order_dict)
+        return confirmed, unconfirmed
+    
+    def _load_orders_with_call_status(self, user_id: int, order_date: date, session: Session) -> List[Tuple[Dict, object]]:
+        """Загрузить заказы за дату вместе с их записями call_status (или None)"""
         # ВАЖНО: Для каждого order_number берем ПОСЛЕДНЮЮ запись (по id)
         # чтобы избежать проблем с дубликатами
         from sqlalchemy import func
@@ -62,10 +102,14 @@ class DatabaseService:
                 CallStatusDB.user_id == user_id,
                 CallStatusDB.call_date == order_date
             )
-        ).all()
-        call_status_map = {
-            cs.order_number: cs for cs in call_status_list
-        }
+        ).order_by(CallStatusDB.id).all()
+        # При дубликатах записей для одного заказа подтвержденная запись важнее любой другой,
+        # иначе берем последнюю (по id)
+        call_status_map = {}
+        for cs in call_status_list:
+            current = call_status_map.get(cs.order_number)
+            if current is None or current.status != "confirmed" or cs.status == "confirmed":
+                call_status_map[cs.order_number] = cs
         
         logger.info(f"📦 Загружено {len(orders)} уникальных заказов для user_id={user_id}, date={order_date}")
         
@@ -107,7 +151,7 @@ class DatabaseService:
                 order_dict['manual_arrival_time'] = cs.manual_arrival_time
                 logger.info(f"   ✅ Заказ #{order_db.order_number} (id={order_db.id}): manual_arrival_time = {cs.manual_arrival_time}")
             
-            result.append(order_dict)
+            result.append((order_dict, cs))
         
         return result
     
@@ -202,7 +246,6 @@ class DatabaseService:
                     existing_order.gis_id = order.gis_id
                 existing_order.updated_at = datetime.utcnow()
                 session.commit()
-                session.refresh(existing_order)
                 return existing_order
             else:
                 # Создаем новый заказ
@@ -226,7 +269,6 @@ class DatabaseService:
                 )
                 session.add(order_db)
                 session.commit()
-                session.refresh(order_db)
                 return order_db
         except Exception as e:
             session.rollback()
@@ -266,6 +308,56 @@ class DatabaseService:
         session.commit()
         return True
     
+    def bulk_update_order_coords(self, user_id: int, coords: List[Tuple[str, float, float, Optional[str]]],
+                                 order_date: date = None, session: Session = None) -> int:
+        """Обновить координаты нескольких заказов одним UPDATE
+        
+        Args:
+            coords: Список (order_number, latitude, longitude, gis_id)
+        
+        Returns:
+            Количество обновленных заказов
+        
+        Если передан session, изменения не коммитятся - коммит выполняет вызывающий
+        (например, вместе с save_route_data в одной транзакции).
+        """
+        if order_date is None:
+            order_date = date.today()
+        if not coords:
+            return 0
+        
+        if session is None:
+            with get_db_session() as session:
+                return self._bulk_update_order_coords(user_id, coords, order_date, session)
+        return self._bulk_update_order_coords(user_id, coords, order_date, session)
+    
+    def _bulk_update_order_coords(self, user_id: int, coords: List[Tuple[str, float, float, Optional[str]]],
+                                  order_date: date, session: Session) -> int:
+        """Внутренний метод пакетного обновления координат"""
+        ids_by_number = dict(session.query(OrderDB.order_number, OrderDB.id).filter(
+            and_(
+                OrderDB.user_id == user_id,
+                OrderDB.order_date == order_date,
+                OrderDB.order_number.in_([c[0] for c in coords])
+            )
+        ).all())
+        
+        now = datetime.utcnow()
+        mappings = []
+        for order_number, latitude, longitude, gis_id in coords:
+            order_id = ids_by_number.get(order_number)
+            if order_id is None:
+                logger.warning(f"Не удалось обновить координаты заказа {order_number}: заказ не найден")
+                continue
+            mapping = {'id': order_id, 'latitude': latitude, 'longitude': longitude, 'updated_at': now}
+            if gis_id:
+                mapping['gis_id'] = gis_id
+            mappings.append(mapping)
+        
+        session.bulk_update_mappings(OrderDB, mappings)
+        session.flush()
+        return len(mappings)
+    
     def delete_orders_by_date(self, user_id: int, order_date: date = None, session: Session = None) -> int:
         """Удалить все заказы пользователя за дату"""
         if order_date is None:
@@ -325,7 +417,6 @@ class DatabaseService:
         )
         session.add(start_location)
         session.commit()
-        session.refresh(start_location)
         return start_location
     
     def update_start_time(self, user_id: int, start_time: datetime, location_date: date = None, session: Session = None) -> bool:
@@ -383,14 +474,17 @@ class DatabaseService:
             'address': start_location.address,
             'latitude': start_location.latitude,
             'longitude': start_location.longitude,
-            'start_time': start_location.start_time.isoformat() if start_location.start_time else None,
+            'start_time': start_location.start_time,  # datetime (DateTime колонка) или None
         }
     
     def save_route_data(self, user_id: int, route_points_data: List[Dict], call_schedule: List[str], 
                        route_order: List[str], total_distance: float, total_time: float,
                        estimated_completion: datetime, route_date: date = None, 
-                       session: Session = None) -> RouteDataDB:
-        """Сохранить структурированные данные маршрута"""
+                       session: Session = None, input_signature: Optional[str] = None) -> RouteDataDB:
+        """Сохранить структурированные данные маршрута
+        
+        input_signature - подпись входных данных оптимизации (для пропуска повторного расчета)
+        """
         if route_date is None:
             route_date = date.today()
         
@@ -398,14 +492,15 @@ class DatabaseService:
             with get_db_session() as session:
                 return self._save_route_data(user_id, route_points_data, call_schedule, route_order,
                                            total_distance, total_time, estimated_completion, 
-                                           route_date, session)
+                                           route_date, session, input_signature)
         return self._save_route_data(user_id, route_points_data, call_schedule, route_order,
                                     total_distance, total_time, estimated_completion, 
-                                    route_date, session)
+                                    route_date, session, input_signature)
     
     def _save_route_data(self, user_id: int, route_points_data: List[Dict], call_schedule: List[str],
                         route_order: List[str], total_distance: float, total_time: float,
-                        estimated_completion: datetime, route_date: date, session: Session) -> RouteDataDB:
+                        estimated_completion: datetime, route_date: date, session: Session,
+                        input_signature: Optional[str] = None) -> RouteDataDB:
         """Внутренний метод сохранения маршрута"""
         # Удаляем старые данные маршрута за эту дату
         session.query(RouteDataDB).filter(
@@ -423,11 +518,11 @@ class DatabaseService:
             route_order=route_order,
             total_distance=total_distance,
             total_time=total_time,
-            estimated_completion=estimated_completion
+            estimated_completion=estimated_completion,
+            input_signature=input_signature
         )
         session.add(route_data)
         session.commit()
-        session.refresh(route_data)
         return route_data
     
     def get_route_data(self, user_id: int, route_date: date = None, session: Session = None) -> Optional[Dict]:
@@ -478,6 +573,7 @@ class DatabaseService:
             'total_distance': route_data.total_distance,
             'total_time': route_data.total_time,
             'estimated_completion': route_data.estimated_completion.isoformat() if route_data.estimated_completion else None,
+            'input_signature': route_data.input_signature,
         }
         
         if route_points_data:
@@ -487,6 +583,124 @@ class DatabaseService:
         
         return result
     
+    def get_route_and_orders(self, user_id: int, route_date: date = None,
+                             session: Session = None) -> Tuple[Optional[Dict], List[Dict]]:
+        """Получить данные маршрута и заказы за дату в одной сессии
+        
+        Returns:
+            Кортеж (route_data, orders_data) - как у get_route_data и get_orders_by_date
+        """
+        if route_date is None:
+            route_date = date.today()
+        
+        if session is None:
+            with get_db_session() as session:
+                return self._get_route_and_orders(user_id, route_date, session)
+        return self._get_route_and_orders(user_id, route_date, session)
+    
+    def _get_route_and_orders(self, user_id: int, route_date: date, session: Session) -> Tuple[Optional[Dict], List[Dict]]:
+        """Внутренний метод получения маршрута и заказов"""
+        route_data = self._get_route_data(user_id, route_date, session)
+        orders_data = self._get_orders(user_id, route_date, session)
+        return route_data, orders_data
+    
+    def get_optimization_bundle(self, user_id: int, target_date: date = None, session: Session = None) -> Dict:
+        """Получить все данные для оптимизации маршрута в одной сессии
+        
+        Returns:
+            Dict с ключами 'orders', 'confirmed_orders', 'unconfirmed_orders',
+            'confirmed_calls', 'start_location', 'route_data' (форматы - как у get_orders_by_date,
+            get_orders_partitioned, get_confirmed_calls, get_start_location, get_route_data)
+            и 'manual_call_times' ({order_number: время звонка, установленное вручную})
+        """
+        if target_date is None:
+            target_date = date.today()
+        
+        if session is None:
+            with get_db_session() as session:
+                return self._get_optimization_bundle(user_id, target_date, session)
+        return self._get_optimization_bundle(user_id, target_date, session)
+    
+    def _get_optimization_bundle(self, user_id: int, target_date: date, session: Session) -> Dict:
+        """Внутренний метод получения данных для оптимизации"""
+        orders_with_status = self._load_orders_with_call_status(user_id, target_date, session)
+        confirmed_orders, unconfirmed_orders = self._partition_orders(orders_with_status)
+        return {
+            'orders': [order_dict for order_dict, _ in orders_with_status],
+            'confirmed_orders': confirmed_orders,
+            'unconfirmed_orders': unconfirmed_orders,
+            'confirmed_calls': self._get_confirmed_calls(user_id, target_date, session),
+            'start_location': self._get_start_location(user_id, target_date, session),
+            'route_data': self._get_route_data(user_id, target_date, session),
+            'manual_call_times': {
+                order_dict['order_number']: cs.call_time
+                for order_dict, cs in orders_with_status
+                if cs is not None and cs.is_manual_call and order_dict.get('order_number')
+            },
+        }
+
+    def get_distance_cache(self, user_id: int, locations: List[Tuple[float, float]],
+                           session: Session = None) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """Загрузить из кэша расстояния между всеми парами точек одним запросом
+        (только пары, посчитанные за последние DISTANCE_CACHE_MAX_AGE)
+
+        Returns:
+            Dict {(coord_a, coord_b): (distance_km, time_minutes)}
+        """
+        if session is None:
+            with get_db_session() as session:
+                return self._get_distance_cache(user_id, locations, session)
+        return self._get_distance_cache(user_id, locations, session)
+
+    def _get_distance_cache(self, user_id: int, locations: List[Tuple[float, float]],
+                            session: Session) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """Внутренний метод загрузки кэша расстояний"""
+        keys = {distance_cache_key(lat, lon) for lat, lon in locations}
+        if len(keys) < 2:
+            return {}
+        rows = session.query(DistanceCacheDB).filter(
+            and_(
+                DistanceCacheDB.user_id == user_id,
+                DistanceCacheDB.coord_a.in_(keys),
+                DistanceCacheDB.coord_b.in_(keys),
+                DistanceCacheDB.created_at >= datetime.utcnow() - DISTANCE_CACHE_MAX_AGE
+            )
+        ).all()
+        return {(row.coord_a, row.coord_b): (row.distance_km, row.time_minutes) for row in rows}
+
+    def save_distance_cache(self, user_id: int, entries: Dict[Tuple[str, str], Tuple[float, float]],
+                            session: Session = None) -> int:
+        """Сохранить новые пары точек в кэш расстояний"""
+        if not entries:
+            return 0
+        if session is None:
+            with get_db_session() as session:
+                return self._save_distance_cache(user_id, entries, session)
+        return self._save_distance_cache(user_id, entries, session)
+
+    def _save_distance_cache(self, user_id: int, entries: Dict[Tuple[str, str], Tuple[float, float]],
+                             session: Session) -> int:
+        """Внутренний метод сохранения кэша расстояний"""
+        now = datetime.utcnow()
+        # Устаревшие пары пользователя удаляем - таблица не растет бесконечно
+        session.query(DistanceCacheDB).filter(
+            and_(
+                DistanceCacheDB.user_id == user_id,
+                DistanceCacheDB.created_at < now - DISTANCE_CACHE_MAX_AGE
+            )
+        ).delete(synchronize_session=False)
+        for (coord_a, coord_b), (distance_km, time_minutes) in entries.items():
+            session.merge(DistanceCacheDB(
+                user_id=user_id,
+                coord_a=coord_a,
+                coord_b=coord_b,
+                distance_km=distance_km,
+                time_minutes=time_minutes,
+                created_at=now
+            ))
+        session.commit()
+        return len(entries)
+
     def delete_all_data_by_date(self, user_id: int, target_date: date = None, session: Session = None) -> Dict[str, int]:
         """Удалить все данные пользователя за дату (заказы, точка старта, маршрут)"""
         if target_date is None:
@@ -578,6 +792,68 @@ class DatabaseService:
             for call in confirmed_calls
         ]
     
+    def get_call_statuses(self, user_id: int, order_numbers: List[str], call_dates: List[date],
+                          session: Session = None) -> Dict[Tuple[str, date], str]:
+        """Получить статусы звонков для набора заказов и дат одним запросом
+        
+        Returns:
+            Dict {(order_number, call_date): status}
+        """
+        if not order_numbers or not call_dates:
+            return {}
+        
+        if session is None:
+            with get_db_session() as session:
+                return self._get_call_statuses(user_id, order_numbers, call_dates, session)
+        return self._get_call_statuses(user_id, order_numbers, call_dates, session)
+    
+    def _get_call_statuses(self, user_id: int, order_numbers: List[str], call_dates: List[date],
+                           session: Session) -> Dict[Tuple[str, date], str]:
+        """Внутренний метод получения статусов звонков"""
+        from src.models.order import CallStatusDB
+        rows = session.query(
+            CallStatusDB.order_number, CallStatusDB.call_date, CallStatusDB.status
+        ).filter(
+            and_(
+                CallStatusDB.user_id == user_id,
+                CallStatusDB.order_number.in_(set(order_numbers)),
+                CallStatusDB.call_date.in_(set(call_dates))
+            )
+        ).order_by(CallStatusDB.id).all()
+        
+        statuses = {}
+        for order_number, call_date, status in rows:
+            statuses.setdefault((order_number, call_date), status)
+        return statuses
+    
+    def get_call_status_version(self, user_id: int, call_date: date = None,
+                                session: Session = None) -> Tuple[int, Optional[datetime]]:
+        """Версия статусов звонков за дату: (количество записей, время последнего изменения)
+        
+        Дешевый агрегат для проверки, менялись ли статусы звонков с прошлого раза.
+        """
+        if call_date is None:
+            call_date = date.today()
+        
+        if session is None:
+            with get_db_session() as session:
+                return self._get_call_status_version(user_id, call_date, session)
+        return self._get_call_status_version(user_id, call_date, session)
+    
+    def _get_call_status_version(self, user_id: int, call_date: date, session: Session) -> Tuple[int, Optional[datetime]]:
+        """Внутренний метод получения версии статусов звонков"""
+        from sqlalchemy import func
+        from src.models.order import CallStatusDB
+        count, last_updated = session.query(
+            func.count(CallStatusDB.id), func.max(CallStatusDB.updated_at)
+        ).filter(
+            and_(
+                CallStatusDB.user_id == user_id,
+                CallStatusDB.call_date == call_date
+            )
+        ).one()
+        return count, last_updated
+    
     def get_order_by_number(self, user_id: int, order_number: str, order_date: date = None, session: Session = None) -> Optional[Dict]:
         """Получить заказ по номеру за конкретную дату"""
         if order_date is None:
@@ -3,7 +3,7 @@ from typing import List, Dict, Optional
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
 from datetime import datetime, timedelta
-from src.config import settings
+from src.config import get_settings
 from src.models.order import Order
 
 logger = logging.getLogger(__name__)
@@ -14,11 +14,12 @@ class LLMService:
         self.model = None
         self.tokenizer = None
         self.generator = None
-        self.device = settings.llm_device
+        self.device = get_settings().llm_device
 
     async def initialize(self):
         """Initialize the LLM model"""
         try:
+            settings = get_settings()
             model_path = settings.llm_model_path
             self.tokenizer = AutoTokenizer.from_pretrained(model_path)
             self.model = AutoModelForCausalLM.from_pretrained(
@@ -142,7 +143,7 @@ class LLMService:
         """
         Рассчитать оптимальное время звонка (минимум за 40 минут до доставки)
         """
-        from src.config import settings
+        settings = get_settings()
 
         # Analyze comment for special timing requirements
         if order.comment:
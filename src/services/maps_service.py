@@ -1,9 +1,16 @@
 import requests
 import json
 import logging
-from typing import List, Tuple, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
-from src.config import settings
+from src.config import get_settings
 from src.models.order import Order
 from src.database.connection import get_db_session
 
@@ -23,17 +30,49 @@ except ImportError:
     GEOPY_AVAILABLE = False
 
 
+def _build_http_session() -> requests.Session:
+    """HTTP-сессия с keep-alive и пулом соединений к API карт"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    session.mount('https://', adapter)
+    return session
+
+
+# Максимум одновременных запросов к одному хосту API карт
+MAX_REQUESTS_PER_HOST = 8
+# Размер in-memory кэша геокодирования (адресов)
+GEOCODE_CACHE_SIZE = 4096
+# Число параллельных запросов при пакетном геокодировании
+GEOCODE_BATCH_WORKERS = 8
+# Размер in-memory кэша маршрутов (пар точек)
+ROUTE_CACHE_SIZE = 8192
+# Время жизни маршрута в кэше, сек: длительность учитывает текущие пробки
+ROUTE_CACHE_TTL = 15 * 60
+
+
 class MapsService:
+    # Общая для всех экземпляров сессия: соединения к 2GIS/Yandex не открываются заново на каждый запрос
+    _http_session: requests.Session = _build_http_session()
+    _nominatim = None
+    # Ограничители параллельных запросов по хостам (геокодирование идет из пула потоков)
+    _host_semaphores: dict = {}
+    _host_semaphores_lock = threading.Lock()
+    # Nominatim допускает только последовательные запросы
+    _nominatim_lock = threading.Lock()
+    
     def __init__(self):
+        settings = get_settings()
         self.yandex_api_key = settings.yandex_maps_api_key
         self.two_gis_api_key = settings.two_gis_api_key
         self.session: Optional[aiohttp.ClientSession] = None
         
-        # Кэш для геокодирования (адрес -> (lat, lon, gis_id))
-        self._geocode_cache: dict = {}
+        # LRU-кэш для геокодирования (нормализованный адрес -> (lat, lon, gis_id))
+        self._geocode_cache: OrderedDict = OrderedDict()
+        self._geocode_cache_lock = threading.Lock()
         
-        # Кэш для маршрутов ((start_lat, start_lon, end_lat, end_lon) -> (distance, time))
-        self._route_cache: dict = {}
+        # LRU-кэш маршрутов с TTL ((start_lat, start_lon, end_lat, end_lon) -> (expires_at, (distance, time)))
+        self._route_cache: OrderedDict = OrderedDict()
+        self._route_cache_lock = threading.Lock()
 
     @staticmethod
     def build_route_links(
@@ -153,11 +192,11 @@ class MapsService:
             return None, None, None
         
         # Нормализуем адрес для кэша
-        address_key = address.lower().strip()
+        address_key = self.normalize_address(address)
         
         # Проверяем in-memory кэш
-        if address_key in self._geocode_cache:
-            cached_result = self._geocode_cache[address_key]
+        cached_result = self._get_cached_geocode(address_key)
+        if cached_result is not None:
             logger.debug(f"Геокодирование из памяти: {address}")
             return cached_result
         
@@ -171,7 +210,7 @@ class MapsService:
                 if cached:
                     result = (cached.latitude, cached.longitude, cached.gis_id)
                     # Сохраняем в in-memory кэш
-                    self._geocode_cache[address_key] = result
+                    self._remember_geocode(address_key, result)
                     logger.debug(f"Геокодирование из БД: {address}")
                     return result
         except Exception as e:
@@ -186,7 +225,8 @@ class MapsService:
                     "q": address,
                     "fields": "items.point"
                 }
-                response = requests.get(url, params=params, timeout=10)
+                with self._host_slot(url):
+                    response = self._http_session.get(url, params=params, timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     items = data.get("result", {}).get("items", [])
@@ -197,7 +237,7 @@ class MapsService:
                         gid = items[0].get("id")
                         result = (lat, lon, gid)
                         # Сохраняем в кэши
-                        self._geocode_cache[address_key] = result
+                        self._remember_geocode(address_key, result)
                         self._save_to_db_cache(address_key, lat, lon, gid)
                         return result
             except Exception as e:
@@ -213,7 +253,8 @@ class MapsService:
                     "geocode": address
                 }
 
-                response = requests.get(url, params=params, timeout=10)
+                with self._host_slot(url):
+                    response = self._http_session.get(url, params=params, timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     members = data.get("response", {}).get("GeoObjectCollection", {}).get("featureMember", [])
@@ -223,7 +264,7 @@ class MapsService:
                             lon, lat = map(float, pos.split())
                             result = (lat, lon, None)
                             # Сохраняем в кэши
-                            self._geocode_cache[address_key] = result
+                            self._remember_geocode(address_key, result)
                             self._save_to_db_cache(address_key, lat, lon, None)
                             return result
             except Exception as e:
@@ -232,12 +273,12 @@ class MapsService:
         # Fallback to geopy
         if GEOPY_AVAILABLE:
             try:
-                geolocator = Nominatim(user_agent="courier_bot")
-                location = geolocator.geocode(address)
+                with self._nominatim_lock:
+                    location = self._get_nominatim().geocode(address)
                 if location:
                     result = (location.latitude, location.longitude, None)
                     # Сохраняем в кэши
-                    self._geocode_cache[address_key] = result
+                    self._remember_geocode(address_key, result)
                     self._save_to_db_cache(address_key, location.latitude, location.longitude, None)
                     return result
             except Exception as e:
@@ -245,6 +286,133 @@ class MapsService:
 
         return None, None, None
     
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        """Нормализовать адрес для ключа кэша (регистр, ё/е и лишние пробелы)"""
+        return " ".join(address.lower().replace("ё", "е").split())
+    
+    def _get_cached_geocode(self, address_key: str) -> Optional[Tuple[float, float, Optional[str]]]:
+        """Достать результат геокодирования из in-memory LRU-кэша"""
+        with self._geocode_cache_lock:
+            result = self._geocode_cache.get(address_key)
+            if result is not None:
+                self._geocode_cache.move_to_end(address_key)
+            return result
+    
+    def _remember_geocode(self, address_key: str, result: Tuple[float, float, Optional[str]]):
+        """Положить результат геокодирования в in-memory LRU-кэш"""
+        with self._geocode_cache_lock:
+            self._geocode_cache[address_key] = result
+            self._geocode_cache.move_to_end(address_key)
+            if len(self._geocode_cache) > GEOCODE_CACHE_SIZE:
+                self._geocode_cache.popitem(last=False)
+    
+    def preload_geocode_cache(self, limit: int = GEOCODE_CACHE_SIZE) -> int:
+        """Прогреть in-memory кэш последними использованными адресами из БД кэша
+        
+        Returns:
+            Количество загруженных адресов
+        """
+        try:
+            from src.models.geocache import GeocodeCacheDB
+            with get_db_session() as session:
+                rows = session.query(
+                    GeocodeCacheDB.address, GeocodeCacheDB.latitude,
+                    GeocodeCacheDB.longitude, GeocodeCacheDB.gis_id
+                ).order_by(GeocodeCacheDB.updated_at.desc()).limit(limit).all()
+        except Exception as e:
+            logger.warning(f"Не удалось прогреть кэш геокодирования: {e}")
+            return 0
+        # От старых к новым: самые свежие адреса оказываются в конце LRU
+        for address, lat, lon, gid in reversed(rows):
+            self._remember_geocode(self.normalize_address(address), (lat, lon, gid))
+        logger.info(f"🗺️ Кэш геокодирования прогрет: {len(rows)} адресов")
+        return len(rows)
+    
+    def prefetch_geocode_cache(self, addresses: List[str]) -> int:
+        """Загрузить из БД кэша результаты для списка адресов одним запросом
+        
+        Returns:
+            Количество адресов, для которых результат есть в кэше
+        """
+        keys = {self.normalize_address(a) for a in addresses if a and a.strip()}
+        missing = [k for k in keys if self._get_cached_geocode(k) is None]
+        if missing:
+            try:
+                from src.models.geocache import GeocodeCacheDB
+                with get_db_session() as session:
+                    rows = session.query(
+                        GeocodeCacheDB.address, GeocodeCacheDB.latitude,
+                        GeocodeCacheDB.longitude, GeocodeCacheDB.gis_id
+                    ).filter(GeocodeCacheDB.address.in_(missing)).all()
+                for address_key, lat, lon, gid in rows:
+                    self._remember_geocode(address_key, (lat, lon, gid))
+                logger.debug(f"Геокэш: из БД загружено {len(rows)} из {len(missing)} адресов")
+            except Exception as e:
+                logger.warning(f"Ошибка пакетной проверки БД кэша: {e}")
+        return sum(1 for k in keys if self._get_cached_geocode(k) is not None)
+    
+    def geocode_batch_sync(self, addresses: List[str],
+                           progress: Optional[Dict[str, int]] = None) -> List[Tuple[Optional[float], Optional[float], Optional[str]]]:
+        """Геокодировать список адресов. Возврат: список (lat, lon, gis_id) в порядке addresses
+        
+        У геокодеров 2GIS/Yandex нет пакетного API, поэтому известные адреса
+        поднимаются из БД кэша одним запросом, а остальные геокодируются параллельно.
+        Одинаковые адреса (несколько заказов в одном доме) геокодируются один раз.
+        
+        progress - необязательный счетчик {'done': ..., 'total': ...} по уникальным адресам,
+        его можно читать из другого потока (например, для статуса в Telegram).
+        """
+        if not addresses:
+            return []
+        
+        # Нормализованный ключ -> первый исходный адрес с этим ключом
+        unique = {}
+        for address in addresses:
+            unique.setdefault(self.normalize_address(address), address)
+        
+        self.prefetch_geocode_cache(list(unique.values()))
+        workers = min(GEOCODE_BATCH_WORKERS, len(unique))
+        if progress is not None:
+            progress['done'] = 0
+            progress['total'] = len(unique)
+        results = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode") as executor:
+            futures = {executor.submit(self._geocode_safe, address): key for key, address in unique.items()}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if progress is not None:
+                    progress['done'] += 1
+        if len(unique) < len(addresses):
+            logger.debug(f"Геокодирование: {len(addresses)} адресов, уникальных {len(unique)}")
+        return [results[self.normalize_address(address)] for address in addresses]
+    
+    def _geocode_safe(self, address: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+        """geocode_address_sync без исключений (для пакетного геокодирования)"""
+        try:
+            return self.geocode_address_sync(address)
+        except Exception as e:
+            logger.warning(f"Ошибка геокодирования адреса '{address}': {e}")
+            return None, None, None
+    
+    @classmethod
+    @contextmanager
+    def _host_slot(cls, url: str):
+        """Занять слот параллельных запросов к хосту url"""
+        host = urlsplit(url).netloc
+        with cls._host_semaphores_lock:
+            semaphore = cls._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = cls._host_semaphores[host] = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        with semaphore:
+            yield
+    
+    def _get_nominatim(self):
+        """Геокодер Nominatim (создается один раз на процесс)"""
+        if MapsService._nominatim is None:
+            MapsService._nominatim = Nominatim(user_agent="courier_bot")
+        return MapsService._nominatim
+    
     def _save_to_db_cache(self, address: str, lat: float, lon: float, gis_id: Optional[str]):
         """Сохранить результат геокодирования в БД кэш"""
         try:
@@ -275,6 +443,27 @@ class MapsService:
             # Не критично, если не удалось сохранить в БД кэш
             logger.warning(f"Не удалось сохранить в БД кэш: {e}")
 
+    def _get_cached_route(self, route_key: tuple) -> Optional[Tuple[float, float]]:
+        """Достать маршрут из in-memory LRU-кэша, если он еще не устарел"""
+        with self._route_cache_lock:
+            entry = self._route_cache.get(route_key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at <= time.monotonic():
+                del self._route_cache[route_key]
+                return None
+            self._route_cache.move_to_end(route_key)
+            return result
+
+    def _remember_route(self, route_key: tuple, result: Tuple[float, float]):
+        """Положить маршрут в in-memory LRU-кэш"""
+        with self._route_cache_lock:
+            self._route_cache[route_key] = (time.monotonic() + ROUTE_CACHE_TTL, result)
+            self._route_cache.move_to_end(route_key)
+            if len(self._route_cache) > ROUTE_CACHE_SIZE:
+                self._route_cache.popitem(last=False)
+
     def get_route_sync(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Tuple[float, float]:
         """Синхронный расчет маршрута через 2GIS (если есть ключ) с fallback."""
         # Проверяем кэш (округление координат до 5 знаков для ключа кэша)
@@ -284,8 +473,8 @@ class MapsService:
             round(end_lat, 5),
             round(end_lon, 5)
         )
-        if route_key in self._route_cache:
-            cached_result = self._route_cache[route_key]
+        cached_result = self._get_cached_route(route_key)
+        if cached_result is not None:
             logger.debug(f"Маршрут из кэша: ({start_lat:.5f}, {start_lon:.5f}) -> ({end_lat:.5f}, {end_lon:.5f})")
             return cached_result
         
@@ -306,7 +495,7 @@ class MapsService:
                 }
                 # Пробуем с пробками (jam). При 429 сразу уходим в fallback.
                 payload = dict(payload_base, traffic_mode="jam")
-                response = requests.post(url, params=params, json=payload, timeout=10)
+                response = self._http_session.post(url, params=params, json=payload, timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     result = None
@@ -322,7 +511,7 @@ class MapsService:
                         time_minutes = time_seconds / 60
                         result_tuple = (distance, time_minutes)
                         # Сохраняем в кэш
-                        self._route_cache[route_key] = result_tuple
+                        self._remember_route(route_key, result_tuple)
                         return result_tuple
                 elif response.status_code == 429:
                     logger.warning("2GIS route rate-limited (429), fallback to other providers")
@@ -345,7 +534,7 @@ class MapsService:
                     "mode": "driving"
                 }
 
-                response = requests.get(url, params=params, timeout=10)
+                response = self._http_session.get(url, params=params, timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     route = data.get("route", {})
@@ -355,7 +544,7 @@ class MapsService:
                         time_minutes = time_seconds / 60
                         result_tuple = (distance, time_minutes)
                         # Сохраняем в кэш
-                        self._route_cache[route_key] = result_tuple
+                        self._remember_route(route_key, result_tuple)
                         return result_tuple
 
             except Exception as e:
@@ -367,7 +556,7 @@ class MapsService:
         time_minutes = (distance / 30) * 60
         result_tuple = (distance, time_minutes)
         # Сохраняем в кэш (даже fallback результаты)
-        self._route_cache[route_key] = result_tuple
+        self._remember_route(route_key, result_tuple)
         return result_tuple
 
     async def get_route_with_traffic(
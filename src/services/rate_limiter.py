@@ -0,0 +1,81 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# С какого числа ключей PerKeyRateLimiter начинает чистить устаревшие записи
+PRUNE_MIN_KEYS = 256
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket для ограничения частоты запросов
+    Используется перед send_message, чтобы не превышать лимит Telegram (~30 сообщений/с)
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate  # Пополнение, токенов в секунду
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Пополнить токены за прошедшее время (вызывать под lock)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self) -> float:
+        """Взять один токен, при необходимости подождав его появления
+
+        Токен резервируется сразу (баланс может уйти в минус), поэтому
+        ожидающие потоки получают слоты по очереди без повторных проверок.
+
+        Returns:
+            Время ожидания в секундах
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class PerKeyRateLimiter:
+    """
+    Потокобезопасное ограничение частоты по ключу (например, chat_id)
+    Между двумя acquire с одним ключом проходит не меньше min_interval секунд
+    (Telegram допускает ~1 сообщение в секунду в один чат)
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.next_allowed = {}  # key -> monotonic-время, с которого можно отправлять
+        self.lock = threading.Lock()
+        self._prune_at = PRUNE_MIN_KEYS
+
+    def _prune(self, now: float):
+        """Удалить ключи, для которых ограничение уже истекло (вызывать под lock)"""
+        self.next_allowed = {k: t for k, t in self.next_allowed.items() if t > now}
+        # Следующая чистка - когда словарь вырастет вдвое, чтобы она оставалась амортизированно O(1)
+        self._prune_at = max(PRUNE_MIN_KEYS, 2 * len(self.next_allowed))
+
+    def acquire(self, key) -> float:
+        """Зарезервировать слот для key, при необходимости подождав
+
+        Returns:
+            Время ожидания в секундах
+        """
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_allowed.get(key, now))
+            if len(self.next_allowed) >= self._prune_at:
+                self._prune(now)
+            self.next_allowed[key] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
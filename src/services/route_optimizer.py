@@ -1,10 +1,11 @@
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, time, timedelta
 import numpy as np
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
 from src.models.order import Order, RoutePoint, OptimizedRoute
+from src.models.geocache import distance_cache_key
 from src.services.maps_service import MapsService
 from src.services.user_settings_service import UserSettingsService
 
@@ -12,9 +13,13 @@ logger = logging.getLogger(__name__)
 
 
 class RouteOptimizer:
-    def __init__(self, maps_service: MapsService):
+    def __init__(self, maps_service: MapsService,
+                 distance_cache: Optional[Dict[Tuple[str, str], Tuple[float, float]]] = None):
         self.maps_service = maps_service
         self.settings_service = UserSettingsService()
+        # Предзагруженные пары {(coord_a, coord_b): (км, мин)} и новые пары, посчитанные при построении матрицы
+        self.distance_cache = distance_cache if distance_cache is not None else {}
+        self.new_distance_entries: Dict[Tuple[str, str], Tuple[float, float]] = {}
 
     def optimize_route_sync(
         self,
@@ -32,19 +37,22 @@ class RouteOptimizer:
             return OptimizedRoute(points=[], total_distance=0, total_time=0, estimated_completion=start_time)
 
         # Geocode addresses if needed (используем координаты из БД, если они есть)
-        geocoded_orders = []
+        # Только если координат нет - геокодируем пакетно (кэш + параллельные запросы)
+        to_geocode = []
         for order in orders:
             if order.latitude is None or order.longitude is None:
-                # Только если координат нет - делаем геокодирование (с кэшированием)
                 # Проверяем, что адрес не пустой
                 if order.address and order.address.strip():
-                    lat, lon, gid = self.maps_service.geocode_address_sync(order.address)
-                    order.latitude = lat
-                    order.longitude = lon
-                    order.gis_id = gid
+                    to_geocode.append(order)
                 else:
                     logger.warning(f"⚠️ Заказ {order.order_number} не может быть загеокодирован: адрес отсутствует")
-            geocoded_orders.append(order)
+        if to_geocode:
+            results = self.maps_service.geocode_batch_sync([o.address for o in to_geocode])
+            for order, (lat, lon, gid) in zip(to_geocode, results):
+                order.latitude = lat
+                order.longitude = lon
+                order.gis_id = gid
+        geocoded_orders = list(orders)
 
         # Calculate distance/time matrix
         # Фильтруем заказы с координатами (без координат нельзя построить маршрут)
@@ -147,14 +155,22 @@ class RouteOptimizer:
         n = len(locations)
         distance_matrix = np.zeros((n, n))
         time_matrix = np.zeros((n, n))
+        keys = [distance_cache_key(lat, lon) for lat, lon in locations]
 
         for i in range(n):
             for j in range(n):
                 if i != j:
-                    dist, time_min = self.maps_service.get_route_sync(
-                        locations[i][0], locations[i][1],
-                        locations[j][0], locations[j][1]
-                    )
+                    pair = (keys[i], keys[j])
+                    cached = self.distance_cache.get(pair)
+                    if cached is not None:
+                        dist, time_min = cached
+                    else:
+                        dist, time_min = self.maps_service.get_route_sync(
+                            locations[i][0], locations[i][1],
+                            locations[j][0], locations[j][1]
+                        )
+                        self.distance_cache[pair] = (dist, time_min)
+                        self.new_distance_entries[pair] = (dist, time_min)
                     distance_matrix[i][j] = dist
                     time_matrix[i][j] = time_min
                 else:
@@ -264,10 +280,13 @@ class RouteOptimizer:
             manager = pywrapcp.RoutingIndexManager(len(distance_matrix), 1, 0)  # 1 vehicle, depot at 0
             routing = pywrapcp.RoutingModel(manager)
 
+            # Стоимости дуг в целых единицах решателя считаются векторно один раз:
+            # колбэки OR-Tools вызываются на каждую дугу при поиске и читают готовые списки,
+            # без обращения к элементам numpy-матрицы и пересчета
+            distance_arcs = (np.asarray(distance_matrix) * 1000).astype(int).tolist()  # meters
+
             def distance_callback(from_index, to_index):
-                from_node = manager.IndexToNode(from_index)
-                to_node = manager.IndexToNode(to_index)
-                return int(distance_matrix[from_node][to_node] * 1000)  # Convert to meters
+                return distance_arcs[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
 
             transit_callback_index = routing.RegisterTransitCallback(distance_callback)
             routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
@@ -278,13 +297,13 @@ class RouteOptimizer:
                 user_settings = self.settings_service.get_settings(user_id)
                 service_time_minutes = user_settings.service_time_minutes
             
+            # Travel time + delivery time (except for depot), seconds
+            service_seconds = np.full(len(time_matrix), service_time_minutes * 60, dtype=int)
+            service_seconds[0] = 0
+            time_arcs = ((np.asarray(time_matrix) * 60).astype(int) + service_seconds).tolist()
+
             def delivery_time_callback(from_index, to_index):
-                from_node = manager.IndexToNode(from_index)
-                to_node = manager.IndexToNode(to_index)
-                # Travel time + delivery time (except for depot)
-                travel_time = int(time_matrix[from_node][to_node] * 60)  # seconds
-                delivery_time = service_time_minutes * 60 if to_node > 0 else 0  # minutes -> seconds
-                return travel_time + delivery_time
+                return time_arcs[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
 
             delivery_callback_index = routing.RegisterTransitCallback(delivery_time_callback)
 
@@ -310,18 +329,19 @@ class RouteOptimizer:
                 logger.info(f"📝 Заказ №{order.order_number}: manual_arrival_time = {order.manual_arrival_time}")
                 
                 # Вычисляем ограничения для окна доставки (если есть)
+                # (основное окно в секундах от старта считается один раз и переиспользуется ниже)
                 window_start_seconds = None
                 window_end_seconds = None
                 if order.delivery_time_start and order.delivery_time_end:
                     order_date = start_time.date()
                     window_start_dt = datetime.combine(order_date, order.delivery_time_start)
                     window_end_dt = datetime.combine(order_date, order.delivery_time_end)
-                    window_start_seconds = max(0, int((window_start_dt - start_time).total_seconds()))
-                    window_end_seconds = max(window_start_seconds, int((window_end_dt - start_time).total_seconds()))
+                    start_seconds = max(0, int((window_start_dt - start_time).total_seconds()))
+                    end_seconds = max(start_seconds, int((window_end_dt - start_time).total_seconds()))
                     # Добавляем буфер ±5 минут для гибкости
                     buffer_seconds = 5 * 60
-                    window_start_seconds = max(0, window_start_seconds - buffer_seconds)
-                    window_end_seconds = window_end_seconds + buffer_seconds
+                    window_start_seconds = max(0, start_seconds - buffer_seconds)
+                    window_end_seconds = end_seconds + buffer_seconds
                 
                 # Приоритет 1: Ручное время прибытия (жесткое ограничение)
                 if order.manual_arrival_time:
@@ -386,13 +406,7 @@ class RouteOptimizer:
                     time_dimension.CumulVar(node_index).SetRange(window_start_seconds, window_end_seconds)
                     
                     # Мягкая цель: стремимся к началу окна (чтобы минимизировать ожидание)
-                    # Но с большим штрафом за выход за пределы основного окна
-                    order_date = start_time.date()
-                    window_start_dt = datetime.combine(order_date, order.delivery_time_start)
-                    window_end_dt = datetime.combine(order_date, order.delivery_time_end)
-                    start_seconds = max(0, int((window_start_dt - start_time).total_seconds()))
-                    end_seconds = max(start_seconds, int((window_end_dt - start_time).total_seconds()))
-                    
+                    # Но с большим штрафом за выход за пределы основного окна (start_seconds-end_seconds)
                     early_penalty_per_minute = 1000  # небольшой штраф за раннее прибытие
                     early_penalty_per_second = early_penalty_per_minute / 60.0
                     time_dimension.SetCumulVarSoftLowerBound(
@@ -202,7 +202,7 @@ class TrafficMonitor:
                     check_interval_minutes = monitor_data.get('check_interval', 300) / 60
                     return {
                         'is_monitoring': monitor_data.get('is_monitoring', False),
-                        'last_check': monitor_data.get('last_check_time').isoformat() if monitor_data.get('last_check_time') else None,
+                        'last_check': int(monitor_data['last_check_time'].timestamp()) if monitor_data.get('last_check_time') else None,
                         'route_points': len(monitor_data.get('route', {}).points) if monitor_data.get('route') else 0,
                         'check_interval_minutes': check_interval_minutes
                     }
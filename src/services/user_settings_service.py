@@ -1,7 +1,9 @@
 import logging
-from typing import Optional
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import and_
 from src.database.connection import get_db_session
-from src.models.order import UserSettingsDB, UserSettings
+from src.models.order import UserSettingsDB, UserSettings, UserCredentialsDB
 
 logger = logging.getLogger(__name__)
 
@@ -9,11 +11,87 @@ logger = logging.getLogger(__name__)
 class UserSettingsService:
     """Сервис для управления настройками пользователей"""
     
+    # Кэш настроек общий для всех экземпляров сервиса (бот, уведомления, оптимизатор,
+    # мониторинг пробок), чтобы изменение через любой экземпляр сбрасывало его для всех.
+    # Обработчики telebot работают в пуле потоков - доступ под блокировкой.
+    _cache: Dict[int, UserSettings] = {}
+    _cache_lock = threading.Lock()
+    # Поколение кэша по пользователю: растет при каждом сбросе. Загруженные из БД настройки
+    # кладутся в кэш, только если сброса не было, пока шла загрузка (иначе они уже устарели)
+    _generation: Dict[int, int] = {}
+    
     def get_settings(self, user_id: int) -> UserSettings:
         """
-        Получить настройки пользователя.
+        Получить настройки пользователя (из кэша, при промахе - из БД).
         Если настроек нет - создать с дефолтными значениями.
         """
+        with self._cache_lock:
+            cached = self._cache.get(user_id)
+            generation = self._generation.get(user_id, 0)
+        if cached is not None:
+            return cached.model_copy()
+        
+        settings = self._load_settings(user_id)
+        self._store(user_id, settings, generation)
+        return settings.model_copy()
+    
+    def get_settings_bundle(self, user_id: int, site: str = "chefmarket") -> Tuple[UserSettings, bool]:
+        """
+        Получить настройки пользователя и наличие учетных данных site одним запросом
+        (для меню настроек). Заполняет кэши настроек и учетных данных.
+        """
+        from src.services.credentials_service import CredentialsService
+        
+        with self._cache_lock:
+            settings = self._cache.get(user_id)
+            generation = self._generation.get(user_id, 0)
+        has_credentials = CredentialsService.has_credentials_cached(user_id, site)
+        if settings is not None and has_credentials is not None:
+            return settings.model_copy(), has_credentials
+        
+        with get_db_session() as session:
+            row = session.query(UserSettingsDB, UserCredentialsDB.id).outerjoin(
+                UserCredentialsDB,
+                and_(
+                    UserCredentialsDB.user_id == UserSettingsDB.user_id,
+                    UserCredentialsDB.site == site
+                )
+            ).filter(UserSettingsDB.user_id == user_id).first()
+            if row is not None:
+                settings = UserSettings.model_validate(row[0])
+                has_credentials = row[1] is not None
+        
+        if row is None:
+            # Настроек еще нет - создаем дефолтные (первое обращение пользователя)
+            settings = self._load_settings(user_id)
+            has_credentials = CredentialsService.has_credentials_cached(user_id, site)
+            if has_credentials is None:
+                with get_db_session() as session:
+                    has_credentials = session.query(UserCredentialsDB.id).filter(
+                        UserCredentialsDB.user_id == user_id,
+                        UserCredentialsDB.site == site
+                    ).first() is not None
+        
+        self._store(user_id, settings, generation)
+        CredentialsService.remember_has_credentials(user_id, site, has_credentials)
+        return settings.model_copy(), has_credentials
+    
+    @classmethod
+    def _store(cls, user_id: int, settings: UserSettings, generation: int):
+        """Положить настройки в кэш, если с начала загрузки кэш пользователя не сбрасывали"""
+        with cls._cache_lock:
+            if cls._generation.get(user_id, 0) == generation:
+                cls._cache[user_id] = settings
+    
+    @classmethod
+    def invalidate_cache(cls, user_id: int):
+        """Сбросить кэш настроек пользователя"""
+        with cls._cache_lock:
+            cls._cache.pop(user_id, None)
+            cls._generation[user_id] = cls._generation.get(user_id, 0) + 1
+    
+    def _load_settings(self, user_id: int) -> UserSettings:
+        """Загрузить настройки пользователя из БД (создав дефолтные при отсутствии)"""
         with get_db_session() as session:
             settings_db = session.query(UserSettingsDB).filter(
                 UserSettingsDB.user_id == user_id
@@ -24,7 +102,6 @@ class UserSettingsService:
                 settings_db = UserSettingsDB(user_id=user_id)
                 session.add(settings_db)
                 session.commit()
-                session.refresh(settings_db)
                 logger.info(f"✨ Созданы настройки по умолчанию для user_id={user_id}")
             
             return UserSettings.model_validate(settings_db)
@@ -67,6 +144,8 @@ class UserSettingsService:
         except Exception as e:
             logger.error(f"Ошибка обновления настройки: {e}", exc_info=True)
             return False
+        finally:
+            self.invalidate_cache(user_id)
     
     def update_settings(self, user_id: int, **kwargs) -> bool:
         """
@@ -104,6 +183,8 @@ class UserSettingsService:
         except Exception as e:
             logger.error(f"Ошибка обновления настроек: {e}", exc_info=True)
             return False
+        finally:
+            self.invalidate_cache(user_id)
     
     def reset_settings(self, user_id: int) -> bool:
         """
@@ -136,6 +217,8 @@ class UserSettingsService:
         except Exception as e:
             logger.error(f"Ошибка сброса настроек: {e}", exc_info=True)
             return False
+        finally:
+            self.invalidate_cache(user_id)
     
     def get_setting_description(self, setting_name: str) -> str:
         """Получить описание настройки на русском языке"""
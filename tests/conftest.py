@@ -153,3 +153,21 @@ def mock_settings_service():
     settings_service.get_settings.return_value = mock_settings
     
     return settings_service
+
+
+@pytest.fixture(autouse=True)
+def clear_service_caches():
+    """
+    Сбрасывает общие для процесса кэши сервисов, чтобы они не переходили между тестами
+    """
+    from src.services.user_settings_service import UserSettingsService
+    from src.services.credentials_service import CredentialsService
+    
+    def clear():
+        UserSettingsService._cache.clear()
+        UserSettingsService._generation.clear()
+        CredentialsService._has_credentials_cache.clear()
+    
+    clear()
+    yield
+    clear()
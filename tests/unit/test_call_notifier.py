@@ -73,6 +73,37 @@ class TestCallNotifierCreation:
         assert existing.phone == "+79999999999"
         assert session.commit.called
 
+    def test_bulk_create_call_statuses(self, test_db_session, mock_telegram_bot):
+        """Пакетное создание/обновление записей о звонках одной транзакцией"""
+        from src.models.order import OrderDB
+        today = date.today()
+        test_db_session.add_all([
+            OrderDB(user_id=321, order_date=today, order_number="B1", address="Москва"),
+            OrderDB(user_id=321, order_date=today, order_number="B2", address="Москва"),
+            OrderDB(user_id=321, order_date=today, order_number="B3", address="Москва", status="delivered"),
+            CallStatusDB(user_id=321, order_number="B2", call_date=today, call_time=datetime(2025, 12, 15, 9, 0),
+                         phone="+70000000000", is_manual_call=True, status="pending"),
+        ])
+        test_db_session.commit()
+        
+        call_notifier = CallNotifier(mock_telegram_bot, Mock())
+        with patch('src.services.call_notifier.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            count = call_notifier.bulk_create_call_statuses(321, today, [
+                {"order_number": "B1", "call_time": datetime(2025, 12, 15, 10, 0), "phone": "+71111111111"},
+                {"order_number": "B2", "call_time": datetime(2025, 12, 15, 11, 0), "phone": "+72222222222"},
+                {"order_number": "B3", "call_time": datetime(2025, 12, 15, 12, 0), "phone": "+73333333333"},
+            ])
+        
+        assert count == 2
+        rows = {cs.order_number: cs for cs in test_db_session.query(CallStatusDB).filter_by(user_id=321)}
+        assert set(rows) == {"B1", "B2"}
+        assert rows["B1"].call_time == datetime(2025, 12, 15, 10, 0)
+        # Ручное время звонка не перезаписывается автоматическим
+        assert rows["B2"].call_time == datetime(2025, 12, 15, 9, 0)
+        assert rows["B2"].phone == "+72222222222"
+
 
 @pytest.mark.unit
 class TestCallNotifierEdgeCases:
@@ -98,3 +129,53 @@ class TestCallNotifierEdgeCases:
         # Проверяем, что запись создана
         assert session.add.called
         assert session.commit.called
+    
+    def test_confirm_reject_markup_uses_call_id(self):
+        """Клавиатура уведомления содержит ID записи в обоих callback_data"""
+        import json
+        from src.services.call_notifier import _make_confirm_reject_markup
+        
+        buttons = json.loads(_make_confirm_reject_markup(42))["inline_keyboard"][0]
+        
+        assert [b["callback_data"] for b in buttons] == ["call_confirm_42", "call_reject_42"]
+        assert json.loads(_make_confirm_reject_markup(7))["inline_keyboard"][0][0]["callback_data"] == "call_confirm_7"
+    
+    def test_grouped_notification_sent_as_one_message(self, test_db_session, mock_telegram_bot):
+        """Несколько наступивших звонков одного пользователя уходят одним сообщением"""
+        import json
+        today = date.today()
+        calls = [
+            CallStatusDB(user_id=555, order_number=number, call_date=today, call_time=datetime(2025, 12, 15, 10, 0),
+                         phone="+70000000000", customer_name=name, status="pending", attempts=0)
+            for number, name in (("G1", "Анна"), ("G2", "Борис"))
+        ]
+        test_db_session.add_all(calls)
+        test_db_session.commit()
+        
+        call_notifier = CallNotifier(mock_telegram_bot, Mock())
+        call_notifier._send_call_notifications_batch([[call.id for call in calls]], test_db_session)
+        
+        assert mock_telegram_bot.send_message.call_count == 1
+        args, kwargs = mock_telegram_bot.send_message.call_args
+        assert args[0] == 555
+        assert "Анна" in args[1] and "Борис" in args[1]
+        rows = json.loads(kwargs['reply_markup'])["inline_keyboard"]
+        assert [row[0]["callback_data"] for row in rows] == [f"call_confirm_{call.id}" for call in calls]
+        assert all(call.status == "sent" and call.attempts == 1 for call in calls)
+    
+    def test_batch_notifies_each_user_separately(self, test_db_session, mock_telegram_bot):
+        """Пакет уведомлений разным пользователям: по сообщению каждому, все записи помечены"""
+        today = date.today()
+        calls = [
+            CallStatusDB(user_id=user_id, order_number=f"U{user_id}", call_date=today,
+                         call_time=datetime(2025, 12, 15, 10, 0), phone="+70000000000", status="pending", attempts=0)
+            for user_id in (601, 602, 603)
+        ]
+        test_db_session.add_all(calls)
+        test_db_session.commit()
+        
+        call_notifier = CallNotifier(mock_telegram_bot, Mock())
+        call_notifier._send_call_notifications_batch([[call.id] for call in calls], test_db_session)
+        
+        assert sorted(c.args[0] for c in mock_telegram_bot.send_message.call_args_list) == [601, 602, 603]
+        assert all(call.status == "sent" and call.attempts == 1 for call in calls)
@@ -2,10 +2,11 @@
 Unit-тесты для DatabaseService
 """
 import pytest
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta
 from unittest.mock import patch
 from src.services.db_service import DatabaseService
-from src.models.order import OrderDB, Order
+from src.models.order import OrderDB, Order, CallStatusDB
+from src.models.geocache import DistanceCacheDB
 
 
 @pytest.mark.unit
@@ -137,6 +138,228 @@ class TestDatabaseServiceOrders:
             count = db_service.delete_orders_by_date(user_id, today)
             
             assert count == 2
+    
+    def test_bulk_update_order_coords(self, test_db_session):
+        """Пакетное обновление координат нескольких заказов"""
+        db_service = DatabaseService()
+        user_id = 440
+        today = date.today()
+        
+        test_db_session.add_all([
+            OrderDB(user_id=user_id, order_date=today, order_number="BC001", address="Москва"),
+            OrderDB(user_id=user_id, order_date=today, order_number="BC002", address="Москва", gis_id="old"),
+        ])
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            count = db_service.bulk_update_order_coords(user_id, [
+                ("BC001", 55.75, 37.61, "g1"),
+                ("BC002", 55.76, 37.62, None),
+                ("MISSING", 55.0, 37.0, None),
+            ], today)
+            
+            assert count == 2
+            rows = {o.order_number: o for o in test_db_session.query(OrderDB).filter_by(user_id=user_id)}
+            assert (rows["BC001"].latitude, rows["BC001"].longitude, rows["BC001"].gis_id) == (55.75, 37.61, "g1")
+            assert (rows["BC002"].latitude, rows["BC002"].gis_id) == (55.76, "old")
+    
+    def test_get_route_and_orders(self, test_db_session):
+        """Получение маршрута и заказов одним вызовом"""
+        db_service = DatabaseService()
+        user_id = 450
+        today = date.today()
+        
+        test_db_session.add(OrderDB(user_id=user_id, order_date=today, order_number="RO001", address="Москва"))
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            db_service.save_route_data(user_id, [{"order_number": "RO001"}], [], ["RO001"], 1.0, 10, None, today)
+            route_data, orders_data = db_service.get_route_and_orders(user_id, today)
+            
+            assert route_data['route_order'] == ["RO001"]
+            assert [od['order_number'] for od in orders_data] == ["RO001"]
+    
+    def test_get_optimization_bundle(self, test_db_session):
+        """Получение данных для оптимизации одним вызовом"""
+        db_service = DatabaseService()
+        user_id = 460
+        today = date.today()
+        
+        test_db_session.add(OrderDB(user_id=user_id, order_date=today, order_number="OB001", address="Москва"))
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            bundle = db_service.get_optimization_bundle(user_id, today)
+            
+            assert [od['order_number'] for od in bundle['orders']] == ["OB001"]
+            assert bundle['confirmed_calls'] == []
+            assert bundle['start_location'] is None
+            assert bundle['route_data'] is None
+            assert bundle['manual_call_times'] == {}
+    
+    def test_optimization_bundle_route_signature_and_manual_calls(self, test_db_session):
+        """Подпись входных данных сохраняется с маршрутом, ручные времена звонков попадают в bundle"""
+        db_service = DatabaseService()
+        user_id = 465
+        today = date.today()
+        manual_call = datetime.combine(today, time(11, 30))
+        
+        test_db_session.add_all([
+            OrderDB(user_id=user_id, order_date=today, order_number="MS001", address="Москва"),
+            OrderDB(user_id=user_id, order_date=today, order_number="MS002", address="Москва"),
+            CallStatusDB(user_id=user_id, order_number="MS001", call_date=today, call_time=manual_call,
+                         phone="+79991234567", is_manual_call=True),
+            CallStatusDB(user_id=user_id, order_number="MS002", call_date=today,
+                         call_time=datetime.combine(today, time(12, 0)), phone="+79991234568"),
+        ])
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            db_service.save_route_data(user_id, [{"order_number": "MS001"}], [], ["MS001"], 1.0, 10, None, today,
+                                       input_signature="sig")
+            bundle = db_service.get_optimization_bundle(user_id, today)
+            
+            assert bundle['route_data']['input_signature'] == "sig"
+            assert bundle['manual_call_times'] == {"MS001": manual_call}
+    
+    def test_get_orders_partitioned(self, test_db_session):
+        """Разделение активных заказов по подтвержденным звонкам"""
+        db_service = DatabaseService()
+        user_id = 470
+        today = date.today()
+        
+        test_db_session.add_all([
+            OrderDB(user_id=user_id, order_date=today, order_number="P001", address="Москва"),
+            OrderDB(user_id=user_id, order_date=today, order_number="P002", address="Москва"),
+            OrderDB(user_id=user_id, order_date=today, order_number="P003", address="Москва", status="delivered"),
+            CallStatusDB(user_id=user_id, order_number="P001", call_date=today,
+                         call_time=datetime.combine(today, time(10, 0)), phone="+79991234567", status="confirmed"),
+        ])
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            confirmed, unconfirmed = db_service.get_orders_partitioned(user_id, today)
+            
+            assert [od['order_number'] for od in confirmed] == ["P001"]
+            assert [od['order_number'] for od in unconfirmed] == ["P002"]
+    
+    def test_get_orders_partitioned_duplicate_call_status(self, test_db_session):
+        """Заказ с дубликатами call_status подтвержден, если подтверждена любая запись"""
+        db_service = DatabaseService()
+        user_id = 471
+        today = date.today()
+        call_time = datetime.combine(today, time(10, 0))
+        
+        test_db_session.add_all([
+            OrderDB(user_id=user_id, order_date=today, order_number="D001", address="Москва"),
+            CallStatusDB(user_id=user_id, order_number="D001", call_date=today,
+                         call_time=call_time, phone="+79991234567", status="confirmed"),
+            CallStatusDB(user_id=user_id, order_number="D001", call_date=today,
+                         call_time=call_time, phone="+79991234567", status="pending"),
+        ])
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            confirmed, unconfirmed = db_service.get_orders_partitioned(user_id, today)
+            
+            assert [od['order_number'] for od in confirmed] == ["D001"]
+            assert unconfirmed == []
+
+    def test_get_call_statuses(self, test_db_session):
+        """Статусы звонков для нескольких заказов одним запросом"""
+        db_service = DatabaseService()
+        user_id = 475
+        today = date.today()
+        
+        test_db_session.add_all([
+            CallStatusDB(user_id=user_id, order_number="C001", call_date=today,
+                         call_time=datetime.combine(today, time(10, 0)), phone="+79991234567", status="confirmed"),
+            CallStatusDB(user_id=user_id, order_number="C002", call_date=today,
+                         call_time=datetime.combine(today, time(11, 0)), phone="+79991234568", status="failed"),
+            CallStatusDB(user_id=user_id + 1, order_number="C003", call_date=today,
+                         call_time=datetime.combine(today, time(12, 0)), phone="+79991234569", status="confirmed"),
+        ])
+        test_db_session.commit()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            statuses = db_service.get_call_statuses(user_id, ["C001", "C002", "C003"], [today])
+            
+            assert statuses == {("C001", today): "confirmed", ("C002", today): "failed"}
+    
+    def test_get_call_status_version(self, test_db_session):
+        """Версия статусов звонков меняется при изменении записи"""
+        db_service = DatabaseService()
+        user_id = 476
+        today = date.today()
+        
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            assert db_service.get_call_status_version(user_id, today) == (0, None)
+            
+            call_status = CallStatusDB(user_id=user_id, order_number="V001", call_date=today,
+                                       call_time=datetime.combine(today, time(10, 0)), phone="+79991234567",
+                                       updated_at=datetime(2025, 1, 1, 10, 0))
+            test_db_session.add(call_status)
+            test_db_session.commit()
+            version = db_service.get_call_status_version(user_id, today)
+            assert version == (1, datetime(2025, 1, 1, 10, 0))
+            
+            call_status.status = "confirmed"
+            test_db_session.commit()
+            assert db_service.get_call_status_version(user_id, today) != version
+    
+    def test_distance_cache_roundtrip(self, test_db_session):
+        """Кэш расстояний: сохранение пар и загрузка только для переданных точек"""
+        db_service = DatabaseService()
+        user_id = 480
+        a, b, c = (55.751244, 37.618423), (55.76, 37.64), (55.70, 37.50)
+
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+
+            db_service.save_distance_cache(user_id, {
+                ("55.75124,37.61842", "55.76,37.64"): (2.5, 7.0),
+                ("55.76,37.64", "55.7,37.5"): (9.0, 20.0),
+            })
+
+            cache = db_service.get_distance_cache(user_id, [a, b])
+
+            assert cache == {("55.75124,37.61842", "55.76,37.64"): (2.5, 7.0)}
+            assert db_service.get_distance_cache(user_id + 1, [a, b, c]) == {}
+
+    def test_distance_cache_expires(self, test_db_session):
+        """Пары старше суток не используются и удаляются при следующем сохранении"""
+        db_service = DatabaseService()
+        user_id = 481
+        test_db_session.add(DistanceCacheDB(
+            user_id=user_id, coord_a="55.0,37.0", coord_b="55.1,37.1",
+            distance_km=1.0, time_minutes=3.0, created_at=datetime.utcnow() - timedelta(days=2)
+        ))
+        test_db_session.commit()
+
+        with patch('src.services.db_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+
+            assert db_service.get_distance_cache(user_id, [(55.0, 37.0), (55.1, 37.1)]) == {}
+
+            db_service.save_distance_cache(user_id, {("55.1,37.1", "55.0,37.0"): (1.2, 3.5)})
+
+            assert test_db_session.query(DistanceCacheDB).filter_by(user_id=user_id).count() == 1
 
 
 @pytest.mark.unit
@@ -0,0 +1,111 @@
+"""
+Unit-тесты для MapsService (кэш геокодирования)
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from src.services.maps_service import MapsService, ROUTE_CACHE_TTL
+from src.models.geocache import GeocodeCacheDB
+
+
+@pytest.mark.unit
+class TestGeocodeCache:
+    """Тесты кэша геокодирования"""
+
+    def test_normalize_address(self):
+        """Нормализация адреса для ключа кэша"""
+        assert MapsService.normalize_address("  Москва,   Тверская  1 ") == "москва, тверская 1"
+        assert MapsService.normalize_address("Москва, Тёплый Стан 5") == "москва, теплый стан 5"
+
+    def test_preload_geocode_cache(self, test_db_session):
+        """Прогрев in-memory кэша последними адресами из БД"""
+        maps_service = MapsService()
+        test_db_session.add_all([
+            GeocodeCacheDB(address="москва, арбат 10", latitude=55.75, longitude=37.59, gis_id="g1",
+                           updated_at=datetime(2025, 1, 1)),
+            GeocodeCacheDB(address="москва, тверская 1", latitude=55.76, longitude=37.61, gis_id=None,
+                           updated_at=datetime(2025, 1, 2)),
+        ])
+        test_db_session.commit()
+
+        with patch('src.services.maps_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+
+            assert maps_service.preload_geocode_cache(limit=1) == 1
+
+        assert maps_service._get_cached_geocode("москва, тверская 1") == (55.76, 37.61, None)
+        assert maps_service._get_cached_geocode("москва, арбат 10") is None
+
+    def test_prefetch_from_db_cache(self, test_db_session):
+        """Пакетная загрузка адресов из БД кэша без HTTP-запросов"""
+        maps_service = MapsService()
+        test_db_session.add(GeocodeCacheDB(address="москва, арбат 10", latitude=55.75, longitude=37.59, gis_id="g1"))
+        test_db_session.commit()
+
+        with patch('src.services.maps_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+
+            found = maps_service.prefetch_geocode_cache(["Москва,  Арбат 10", "Москва, Неизвестная 1"])
+
+            assert found == 1
+            with patch.object(maps_service._http_session, 'get') as mock_get:
+                assert maps_service.geocode_address_sync("москва, арбат 10") == (55.75, 37.59, "g1")
+                mock_get.assert_not_called()
+
+    def test_geocode_batch_keeps_order(self):
+        """Пакетное геокодирование возвращает результаты в порядке адресов"""
+        maps_service = MapsService()
+        coords = {"a": (1.0, 1.0, None), "b": (2.0, 2.0, "g2")}
+
+        with patch.object(maps_service, 'prefetch_geocode_cache'), \
+                patch.object(maps_service, 'geocode_address_sync', side_effect=lambda a: coords.get(a, (None, None, None))):
+            results = maps_service.geocode_batch_sync(["b", "x", "a"])
+
+        assert results == [(2.0, 2.0, "g2"), (None, None, None), (1.0, 1.0, None)]
+
+    def test_geocode_batch_deduplicates_addresses(self):
+        """Одинаковые адреса геокодируются один раз, результат раздается всем"""
+        maps_service = MapsService()
+
+        with patch.object(maps_service, 'prefetch_geocode_cache'), \
+                patch.object(maps_service, 'geocode_address_sync', return_value=(1.0, 2.0, "g1")) as mock_geocode:
+            progress = {}
+            results = maps_service.geocode_batch_sync(["Тверская 1", "тверская  1", "Тверская 1"], progress=progress)
+
+        assert results == [(1.0, 2.0, "g1")] * 3
+        assert progress == {'done': 1, 'total': 1}
+        mock_geocode.assert_called_once_with("Тверская 1")
+
+
+@pytest.mark.unit
+class TestRouteCache:
+    """Тесты in-memory кэша маршрутов"""
+
+    def test_route_cache_expires(self):
+        """Маршрут берется из кэша до истечения TTL, потом запрашивается заново"""
+        maps_service = MapsService()
+        maps_service.two_gis_api_key = None
+        maps_service.yandex_api_key = None
+
+        with patch('src.services.maps_service.time.monotonic', return_value=1000.0), \
+                patch.object(maps_service, '_calculate_distance', return_value=3.0) as mock_distance:
+            maps_service.get_route_sync(55.75, 37.61, 55.76, 37.62)
+            maps_service.get_route_sync(55.75, 37.61, 55.76, 37.62)
+        assert mock_distance.call_count == 1
+
+        with patch('src.services.maps_service.time.monotonic', return_value=1000.0 + ROUTE_CACHE_TTL + 1), \
+                patch.object(maps_service, '_calculate_distance', return_value=3.0) as mock_distance:
+            maps_service.get_route_sync(55.75, 37.61, 55.76, 37.62)
+        assert mock_distance.call_count == 1
+
+    def test_route_cache_is_bounded(self):
+        """Кэш маршрутов не растет больше ROUTE_CACHE_SIZE, вытесняются старые записи"""
+        maps_service = MapsService()
+
+        with patch('src.services.maps_service.ROUTE_CACHE_SIZE', 2):
+            maps_service._remember_route((1,), (1.0, 1.0))
+            maps_service._remember_route((2,), (2.0, 2.0))
+            maps_service._get_cached_route((1,))
+            maps_service._remember_route((3,), (3.0, 3.0))
+
+        assert list(maps_service._route_cache) == [(1,), (3,)]
@@ -3,6 +3,7 @@ Unit-тесты для моделей данных
 """
 import pytest
 from datetime import datetime, time, date
+from unittest.mock import patch
 from src.models.order import Order, OrderDB, CallStatusDB
 
 
@@ -71,6 +72,51 @@ class TestOrderModel:
         assert order2.delivery_time_start == time(10, 0)
         assert order2.delivery_time_end == time(12, 0)
     
+    def test_order_time_window_parsing_with_surrounding_text(self):
+        """Окно внутри произвольного текста разбирается через регулярное выражение"""
+        order = Order(
+            customer_name="Тест",
+            phone="+79991234567",
+            address="Москва",
+            delivery_time_window="с 9:30 - 11:00 (после звонка)"
+        )
+        
+        assert order.delivery_time_start == time(9, 30)
+        assert order.delivery_time_end == time(11, 0)
+    
+    def test_order_time_window_edit_overrides_old_times(self):
+        """Новое окно доставки перекрывает переданные вместе с ним старые start/end"""
+        order = Order(
+            address="Москва",
+            delivery_time_start=time(10, 0),
+            delivery_time_end=time(12, 0),
+            delivery_time_window="15:00 - 17:00"
+        )
+        
+        assert order.delivery_time_start == time(15, 0)
+        assert order.delivery_time_end == time(17, 0)
+    
+    def test_order_from_db_does_not_reparse_window(self):
+        """Из БД время окна приходит уже разобранным - строка окна не разбирается повторно"""
+        with patch.object(Order, '_parse_time_window') as mock_parse:
+            order = Order.from_db({
+                'address': "Москва",
+                'delivery_time_window': "10:00 - 12:00",
+                'delivery_time_start': "10:00:00",
+                'delivery_time_end': "12:00:00",
+            })
+        
+        mock_parse.assert_not_called()
+        assert order.delivery_time_start == time(10, 0)
+        assert order.delivery_time_end == time(12, 0)
+    
+    def test_order_from_db_parses_window_without_times(self):
+        """Если в записи БД нет разобранного времени, окно разбирается из строки"""
+        order = Order.from_db({'address': "Москва", 'delivery_time_window': "10:00 - 12:00"})
+        
+        assert order.delivery_time_start == time(10, 0)
+        assert order.delivery_time_end == time(12, 0)
+    
     def test_order_time_window_parsing_invalid(self):
         """Парсинг невалидного временного окна"""
         order = Order(
@@ -106,6 +152,21 @@ class TestOrderModel:
         
         assert order.phone is None
         assert order.status == "pending"
+    
+    def test_order_from_db_parses_time_strings(self):
+        """Создание заказа из словаря БД со строками времени"""
+        order_data = {
+            'address': "Москва",
+            'order_number': "DB001",
+            'delivery_time_start': "10:00:00",
+            'delivery_time_end': "bad",
+        }
+        
+        order = Order.from_db(order_data)
+        
+        assert order.delivery_time_start == time(10, 0)
+        assert order.delivery_time_end is None
+        assert order_data['delivery_time_start'] == "10:00:00"  # исходный словарь не меняется
 
 
 @pytest.mark.unit
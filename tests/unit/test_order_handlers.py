@@ -0,0 +1,43 @@
+"""
+Unit-тесты для OrderHandlers (редактирование заказа)
+"""
+import pytest
+from datetime import time
+from unittest.mock import Mock, MagicMock, patch
+from src.bot.handlers.order_handlers import OrderHandlers
+
+
+@pytest.fixture
+def handlers(mock_telegram_bot):
+    """OrderHandlers с замоканным ботом и БД"""
+    bot_instance = Mock()
+    bot_instance.bot = mock_telegram_bot
+    bot_instance.db_service.get_today_orders.return_value = [{
+        'order_number': '12345',
+        'address': 'Москва, ул. Ленина, 1',
+        'delivery_time_start': '10:00:00',
+        'delivery_time_end': '12:00:00',
+        'delivery_time_window': '10:00 - 12:00',
+    }]
+    bot_instance.db_service.get_route_data.return_value = None
+    return OrderHandlers(bot_instance)
+
+
+@pytest.mark.unit
+class TestUpdateOrderField:
+    """Тесты обновления полей заказа"""
+
+    def test_edit_time_window_replaces_start_and_end(self, handlers):
+        """Новое окно доставки перезаписывает старые start/end"""
+        session = MagicMock()
+        session.query.return_value.filter.return_value.first.return_value = None
+        db_session = MagicMock()
+        db_session.__enter__.return_value = session
+
+        with patch('src.database.connection.get_db_session', return_value=db_session):
+            handlers._update_order_field(1, '12345', 'delivery_time_window', '15:00 - 17:00', Mock())
+
+        updates = handlers.parent.db_service.update_order.call_args[0][2]
+        assert updates['delivery_time_window'] == '15:00 - 17:00'
+        assert updates['delivery_time_start'] == time(15, 0)
+        assert updates['delivery_time_end'] == time(17, 0)
@@ -0,0 +1,69 @@
+"""
+Unit-тесты для TokenBucket (ограничение частоты отправки)
+"""
+import pytest
+from unittest.mock import patch
+from src.services.rate_limiter import TokenBucket, PerKeyRateLimiter
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Тесты token bucket"""
+
+    def test_burst_within_capacity_does_not_wait(self):
+        """Запросы в пределах емкости проходят без ожидания"""
+        bucket = TokenBucket(rate=5)
+
+        with patch('src.services.rate_limiter.time.sleep') as mock_sleep:
+            waits = [bucket.acquire() for _ in range(5)]
+
+        assert waits == [0.0] * 5
+        mock_sleep.assert_not_called()
+
+    def test_waits_when_bucket_is_empty(self):
+        """При пустом bucket acquire ждет пополнения токена"""
+        bucket = TokenBucket(rate=10, capacity=1)
+        clock = [100.0]
+
+        def fake_sleep(delay):
+            clock[0] += delay
+
+        with patch('src.services.rate_limiter.time.monotonic', side_effect=lambda: clock[0]), \
+                patch('src.services.rate_limiter.time.sleep', side_effect=fake_sleep):
+            bucket.updated_at = clock[0]
+            assert bucket.acquire() == 0.0
+            waited = bucket.acquire()
+
+        assert waited == pytest.approx(0.1)
+
+
+@pytest.mark.unit
+class TestPerKeyRateLimiter:
+    """Тесты ограничения частоты по ключу"""
+
+    def test_spaces_requests_for_same_key_only(self):
+        """Повторный acquire того же ключа ждет интервал, другой ключ - нет"""
+        limiter = PerKeyRateLimiter(min_interval=1.0)
+
+        with patch('src.services.rate_limiter.time.monotonic', return_value=50.0), \
+                patch('src.services.rate_limiter.time.sleep') as mock_sleep:
+            assert limiter.acquire(1) == 0
+            assert limiter.acquire(2) == 0
+            assert limiter.acquire(1) == pytest.approx(1.0)
+
+        mock_sleep.assert_called_once_with(pytest.approx(1.0))
+
+    def test_prunes_expired_keys(self):
+        """Ключи с истекшим ограничением удаляются, словарь не растет бесконечно"""
+        limiter = PerKeyRateLimiter(min_interval=1.0)
+
+        with patch('src.services.rate_limiter.PRUNE_MIN_KEYS', 3), \
+                patch('src.services.rate_limiter.time.sleep'):
+            limiter._prune_at = 3
+            with patch('src.services.rate_limiter.time.monotonic', return_value=10.0):
+                for key in (1, 2, 3):
+                    limiter.acquire(key)
+            with patch('src.services.rate_limiter.time.monotonic', return_value=20.0):
+                limiter.acquire(4)
+
+        assert limiter.next_allowed == {4: 21.0}
@@ -0,0 +1,158 @@
+"""
+Unit-тесты для RouteHandlers (отрисовка карточки заказа)
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import Mock, patch
+from src.bot.handlers import route_handlers
+from src.bot.handlers.route_handlers import RouteHandlers, _StatusThrottler, CHAT_THROTTLE_MAX_SLEEP
+from src.models.order import Order, UserSettings
+
+
+@pytest.fixture
+def handlers(mock_telegram_bot):
+    """RouteHandlers с замоканным ботом"""
+    bot_instance = Mock()
+    bot_instance.bot = mock_telegram_bot
+    return RouteHandlers(bot_instance)
+
+
+@pytest.mark.unit
+class TestThrottledRender:
+    """Тесты ограничения частоты отрисовки карточки заказа"""
+    
+    def test_deferred_render_is_sent_by_timer(self, handlers, mock_telegram_bot):
+        """При длинной задержке отрисовка откладывается и выполняется таймером"""
+        chat_id = 100
+        handlers._chat_bucket[chat_id] = route_handlers.time_module.monotonic() + CHAT_THROTTLE_MAX_SLEEP + 10
+        
+        with patch('src.bot.handlers.route_handlers.threading.Timer') as mock_timer:
+            handlers._throttled_render(chat_id, 55, "Заказ №1", '{"inline_keyboard": []}')
+        
+        # Сразу ничего не отправлено - отрисовка ждет таймера
+        mock_telegram_bot.edit_message_text.assert_not_called()
+        assert mock_timer.call_count == 1
+        flush, args = mock_timer.call_args[0][1], mock_timer.call_args[1]['args']
+        
+        flush(*args)
+        
+        mock_telegram_bot.edit_message_text.assert_called_once()
+        call_args = mock_telegram_bot.edit_message_text.call_args
+        assert call_args[0][:3] == ("Заказ №1", chat_id, 55)
+        assert call_args[1]['reply_markup'] == '{"inline_keyboard": []}'
+        assert chat_id not in handlers._pending_render
+    
+    def test_newer_render_is_not_overwritten_by_timer(self, handlers, mock_telegram_bot):
+        """Карточка, пришедшая при взведенном таймере, не затирается отложенной старой"""
+        chat_id = 100
+        now = route_handlers.time_module.monotonic()
+        handlers._chat_bucket[chat_id] = now + CHAT_THROTTLE_MAX_SLEEP + 10
+        
+        with patch('src.bot.handlers.route_handlers.threading.Timer') as mock_timer, \
+                patch('src.bot.handlers.route_handlers.time_module.sleep'):
+            # Первое нажатие откладывается до таймера
+            handlers._throttled_render(chat_id, 55, "Заказ №1", '{}')
+            # Второе нажатие пришло, когда ждать осталось меньше CHAT_THROTTLE_MAX_SLEEP
+            handlers._chat_bucket[chat_id] = now
+            handlers._throttled_render(chat_id, 55, "Заказ №2", '{}')
+        
+        # Таймер один, и он отрисовывает последнюю карточку
+        assert mock_timer.call_count == 1
+        mock_telegram_bot.edit_message_text.assert_not_called()
+        flush, args = mock_timer.call_args[0][1], mock_timer.call_args[1]['args']
+        flush(*args)
+        
+        mock_telegram_bot.edit_message_text.assert_called_once()
+        assert mock_telegram_bot.edit_message_text.call_args[0][0] == "Заказ №2"
+
+
+@pytest.mark.unit
+class TestStatusThrottler:
+    """Тесты статусного сообщения оптимизации"""
+    
+    def test_parked_text_is_sent_by_timer(self, mock_telegram_bot):
+        """Текст, пришедший раньше интервала, отправляется таймером, а не теряется"""
+        status = _StatusThrottler(mock_telegram_bot, 100, 55, "старт")
+        
+        with patch('src.bot.handlers.route_handlers.threading.Timer') as mock_timer:
+            status.update("этап 1")
+            status.update("этап 2")
+        
+        mock_telegram_bot.edit_message_text.assert_not_called()
+        assert mock_timer.call_count == 1
+        on_timer = mock_timer.call_args[0][1]
+        
+        with patch('src.bot.handlers.route_handlers.time_module.monotonic', return_value=status._last_edit_ts + 10):
+            on_timer()
+        
+        mock_telegram_bot.edit_message_text.assert_called_once()
+        assert mock_telegram_bot.edit_message_text.call_args[0][0] == "этап 2"
+    
+    def test_close_drops_parked_text(self, mock_telegram_bot):
+        """После close() отложенный текст не затирает итоговое сообщение"""
+        status = _StatusThrottler(mock_telegram_bot, 100, 55, "старт")
+        
+        with patch('src.bot.handlers.route_handlers.threading.Timer') as mock_timer:
+            status.update("этап 1")
+            status.close()
+        
+        mock_timer.return_value.cancel.assert_called_once()
+        with patch('src.bot.handlers.route_handlers.time_module.monotonic', return_value=status._last_edit_ts + 10):
+            status.flush()
+        mock_telegram_bot.edit_message_text.assert_not_called()
+
+
+@pytest.mark.unit
+class TestLastRender:
+    """Тесты памяти последних отрисованных карточек"""
+    
+    def test_last_render_is_bounded(self, handlers):
+        """Старые карточки вытесняются, недавно обновленные остаются"""
+        with patch('src.bot.handlers.route_handlers.LAST_RENDER_CACHE_SIZE', 2):
+            handlers._store_render((1, 10), "a", "{}")
+            handlers._store_render((2, 20), "b", "{}")
+            handlers._store_render((1, 10), "a2", "{}")
+            handlers._store_render((3, 30), "c", "{}")
+        
+        assert list(handlers._last_render) == [(1, 10), (3, 30)]
+        assert handlers._last_render[(1, 10)] == ("a2", "{}")
+
+
+@pytest.mark.unit
+class TestRouteSignature:
+    """Тесты пропуска повторной оптимизации"""
+    
+    def test_signature_changes_with_manual_call_time(self):
+        """Ручное время звонка входит в подпись входных данных"""
+        orders = [Order(address="Москва", order_number="1")]
+        start = datetime(2025, 12, 15, 9, 0)
+        user_settings = UserSettings(user_id=1)
+        
+        base = RouteHandlers._route_signature(orders, frozenset(), (55.7, 37.6), None, start, user_settings, {})
+        edited = RouteHandlers._route_signature(orders, frozenset(), (55.7, 37.6), None, start, user_settings,
+                                                {"1": datetime(2025, 12, 15, 10, 0)})
+        
+        assert base != edited
+        assert base == RouteHandlers._route_signature(orders, frozenset(), (55.7, 37.6), None, start,
+                                                      user_settings, {})
+    
+    def test_optimized_route_from_db(self):
+        """Маршрут для мониторинга собирается из сохраненных точек, подтвержденные пропускаются"""
+        orders = [Order(address="Москва", order_number="2", latitude=55.7, longitude=37.6)]
+        route_data = {
+            'route_points_data': [
+                {"order_number": "1", "estimated_arrival": "2025-12-15T09:30:00"},
+                {"order_number": "2", "estimated_arrival": "2025-12-15T10:00:00",
+                 "distance_from_previous": 3.5, "time_from_previous": 12.0},
+            ],
+            'total_distance': 3.5,
+            'total_time': 12.0,
+            'estimated_completion': "2025-12-15T10:10:00",
+        }
+        
+        route = RouteHandlers._optimized_route_from_db(route_data, orders)
+        
+        assert [point.order.order_number for point in route.points] == ["2"]
+        assert route.points[0].estimated_arrival == datetime(2025, 12, 15, 10, 0)
+        assert route.points[0].time_from_previous == 12.0
+        assert route.estimated_completion == datetime(2025, 12, 15, 10, 10)
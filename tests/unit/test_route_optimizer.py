@@ -312,7 +312,7 @@ class TestRouteOptimizerEdgeCases:
         )
         
         # Мок геокодирования
-        mock_maps_service.geocode_address_sync.return_value = (55.7558, 37.6173, "gis_123")
+        mock_maps_service.geocode_batch_sync.return_value = [(55.7558, 37.6173, "gis_123")]
         mock_maps_service.get_route_distance_matrix_sync.return_value = (
             [[0, 1000], [1000, 0]],
             [[0, 10], [10, 0]]
@@ -326,7 +326,7 @@ class TestRouteOptimizerEdgeCases:
         )
         
         # Проверяем, что геокодирование было вызвано
-        assert mock_maps_service.geocode_address_sync.called
+        mock_maps_service.geocode_batch_sync.assert_called_once_with(["Москва, Тверская 1"])
         
         # Проверяем, что координаты установлены
         assert result.points[0].order.latitude == 55.7558
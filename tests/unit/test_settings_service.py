@@ -82,6 +82,65 @@ class TestUserSettingsService:
             assert updated.call_advance_minutes == 25
             assert updated.service_time_minutes == 20
 
+    def test_settings_cache_invalidated_on_update(self, test_db_session):
+        """Настройки кэшируются и сбрасываются при обновлении через любой экземпляр сервиса"""
+        user_id = 1004
+        
+        with patch('src.services.user_settings_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            first = UserSettingsService().get_settings(user_id)
+            with patch.object(UserSettingsService, '_load_settings') as mock_load:
+                second = UserSettingsService().get_settings(user_id)
+            mock_load.assert_not_called()
+            assert second == first
+            # Вызывающий получает копию, а не общий объект из кэша
+            assert second is not first
+            
+            UserSettingsService().update_setting(user_id, 'call_advance_minutes', 42)
+            
+            assert UserSettingsService().get_settings(user_id).call_advance_minutes == 42
+
+    def test_settings_not_cached_when_invalidated_during_load(self, test_db_session):
+        """Настройки, загруженные до сброса кэша, не попадают в кэш"""
+        user_id = 1006
+        service = UserSettingsService()
+        
+        with patch('src.services.user_settings_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            stale = service._load_settings(user_id)
+            
+            def load_with_concurrent_update(uid):
+                # Пока шла загрузка, настройки обновили в другом потоке
+                service.invalidate_cache(uid)
+                return stale
+            
+            with patch.object(service, '_load_settings', side_effect=load_with_concurrent_update):
+                service.get_settings(user_id)
+            
+            assert user_id not in UserSettingsService._cache
+
+    def test_get_settings_bundle(self, test_db_session):
+        """Настройки и наличие учетных данных одним запросом"""
+        from src.models.order import UserCredentialsDB
+        user_id = 1005
+        test_db_session.add_all([
+            UserSettingsDB(user_id=user_id, call_advance_minutes=15),
+            UserCredentialsDB(user_id=user_id, site="chefmarket", encrypted_login="l", encrypted_password="p"),
+        ])
+        test_db_session.commit()
+        
+        with patch('src.services.user_settings_service.get_db_session') as mock_session:
+            mock_session.return_value.__enter__.return_value = test_db_session
+            
+            settings, has_credentials = UserSettingsService().get_settings_bundle(user_id)
+            assert settings.call_advance_minutes == 15
+            assert has_credentials is True
+            
+            settings, has_credentials = UserSettingsService().get_settings_bundle(user_id + 1)
+            assert settings.call_advance_minutes == 10
+            assert has_credentials is False
+
 
 @pytest.mark.unit
 class TestUserSettingsMultipleUsers: